@@ -0,0 +1,240 @@
+import os
+import json
+import hashlib
+import numpy as np
+import xml.etree.ElementTree as ElementTree
+
+def ComputeFileChecksum( FileName ):
+  '''function ComputeFileChecksum( FileName ):
+  This function computes the SHA-256 checksum of a file,
+  reading it in blocks of 1 MB.
+
+  Args:
+    FileName (str): Name of file.
+  Returns:
+    str: Hex digest of SHA-256 checksum.
+  '''
+  Digest = hashlib.sha256()
+  with open( FileName,'rb' ) as InputFile:
+    for Block in iter( lambda: InputFile.read(1048576), b'' ):
+      Digest.update( Block )
+  return Digest.hexdigest()
+
+def ComputeArrayChecksum( DataArray ):
+  '''function ComputeArrayChecksum( DataArray ):
+  This function computes the SHA-256 checksum of the
+  data in a NumPy array (i.e. a classified strip).
+
+  Args:
+    DataArray (numpy.ndarray): Input NumPy array.
+  Returns:
+    str: Hex digest of SHA-256 checksum.
+  '''
+  return hashlib.sha256( np.ascontiguousarray(DataArray).tobytes() ).hexdigest()
+
+def GetVirtualDatasetSources( FileName ):
+  '''function GetVirtualDatasetSources( FileName ):
+  This function returns the files that a GDAL virtual dataset (VRT,
+  i.e. a band of the input, a mosaic or a warped Pan band) refers to,
+  following VRTs that refer to other VRTs. Other files have no sources.
+
+  Args:
+    FileName (str): Name of file.
+  Returns:
+    list: List[] of source filenames (absolute), or an empty list[].
+  '''
+  if not FileName.lower().endswith('.vrt') or not os.path.isfile( FileName ):
+    return []
+  try:
+    Root = ElementTree.parse( FileName ).getroot()
+  except ( ElementTree.ParseError,OSError ):
+    return []
+  SourceFileNames = []
+  for Element in list( Root.iter('SourceFilename') )+list( Root.iter('SourceDataset') ):
+    if Element.text is None: continue
+    SourceFileName = Element.text.strip()
+    if Element.get('relativeToVRT') == '1':
+      SourceFileName = os.path.join( os.path.dirname( os.path.abspath( FileName ) ),SourceFileName )
+    SourceFileName = os.path.abspath( SourceFileName )
+    if SourceFileName in SourceFileNames: continue
+    SourceFileNames.append( SourceFileName )
+    SourceFileNames += [ Name for Name in GetVirtualDatasetSources( SourceFileName ) if Name not in SourceFileNames ]
+  return SourceFileNames
+
+def GetFileStamp( FileName ):
+  '''function GetFileStamp( FileName ):
+  This function returns the size and modification time of a
+  file, which change when the file is replaced or rewritten.
+
+  Args:
+    FileName (str): Name of file.
+  Returns:
+    list: Size (bytes) and modification time (ns), or None if the file is missing.
+  '''
+  try:
+    FileStat = os.stat( FileName )
+  except OSError:
+    return None
+  return [ FileStat.st_size,FileStat.st_mtime_ns ]
+
+def OpenCheckpoint( OutDir,Signature,Resume ):
+  '''function OpenCheckpoint( OutDir,Signature,Resume ):
+  This function opens the checkpoint (checkpoint.json) of a run in
+  the output directory. The checkpoint records the stages that were
+  completed (with checksums of the files they wrote, and sizes and
+  modification times of the input files those refer to) and the output
+  strips that were completed (with checksums of their data). If
+  Resume is False, or the checkpoint was written for a run with a
+  different signature (i.e. different command-line arguments), a
+  new, empty checkpoint is started.
+
+  Args:
+    OutDir (str): Output directory.
+    Signature (str): Signature of run (i.e. its command-line arguments).
+    Resume (bool): Continue from the checkpoint of a previous run.
+  Returns:
+    dict: Dictionary{} holding checkpoint.
+  '''
+  CheckpointFileName = os.path.join( OutDir,'checkpoint.json' )
+  Checkpoint = None
+  if Resume and os.path.isfile( CheckpointFileName ):
+    try:
+      with open( CheckpointFileName,'r' ) as CheckpointFile:
+        Checkpoint = json.load( CheckpointFile )
+    except Exception as e:
+      print( 'WARNING: unable to read checkpoint: ' , str(e) )
+    if Checkpoint is not None and Checkpoint.get('signature') != Signature:
+      print( 'WARNING: checkpoint is for a run with different arguments. Starting over.' )
+      Checkpoint = None
+  if Checkpoint is None:
+    Checkpoint = { 'signature' : Signature, 'stages' : {}, 'strips' : {} }
+  Checkpoint['file'] = CheckpointFileName
+  Checkpoint['verified'] = []
+  WriteCheckpoint( Checkpoint )
+  return Checkpoint
+
+def WriteCheckpoint( Checkpoint ):
+  '''function WriteCheckpoint( Checkpoint ):
+  This function writes a checkpoint to disk (JSON). It is written
+  under a temporary name and then moved into place, so that an
+  interrupted run never leaves a half-written checkpoint. The
+  stages verified by this run (see GetCompletedStage()) are not 
+  written.
+
+  Args:
+    Checkpoint (dict): Dictionary{} holding checkpoint (see OpenCheckpoint()).
+  '''
+  with open( Checkpoint['file']+'.tmp','w' ) as CheckpointFile:
+    json.dump( dict( ( Key,Value ) for Key,Value in Checkpoint.items() if Key != 'verified' ),
+      CheckpointFile,indent=1 )
+  os.replace( Checkpoint['file']+'.tmp',Checkpoint['file'] )
+
+def RecordStage( Checkpoint,StageName,FileNames,Result=None,SourceFileNames=[] ):
+  '''function RecordStage( Checkpoint,StageName,FileNames,Result,SourceFileNames ):
+  This function records a completed stage in the checkpoint,
+  along with the checksums of the files the stage wrote and
+  an (optional) result that can be stored in JSON. Input files
+  that the stage read (SourceFileNames), and the files that the 
+  virtual datasets (VRTs) among the files written refer to, are
+  recorded with their size and modification time, so that the 
+  stage is run again if an input is replaced at the same path.
+
+  Args:
+    Checkpoint (dict): Dictionary{} holding checkpoint (see OpenCheckpoint()), or None.
+    StageName (str): Name of stage (i.e. "imagery").
+    FileNames (list): List[] of files written by the stage.
+    Result (object): Optional result of stage (i.e. dict{} of filenames).
+    SourceFileNames (list): Optional list[] of input files read by the stage.
+  '''
+  if Checkpoint is None: return
+  Sources = {}
+  for SourceFileName in [ os.path.abspath( FileName ) for FileName in SourceFileNames ]+\
+      [ Name for FileName in list(SourceFileNames)+list(FileNames) for Name in GetVirtualDatasetSources( FileName ) ]:
+    Sources[SourceFileName] = GetFileStamp( SourceFileName )
+  Checkpoint['stages'][StageName] = {
+    'files'   : dict( (FileName,ComputeFileChecksum(FileName)) for FileName in FileNames ),
+    'sources' : Sources,
+    'result'  : Result
+  }
+  if StageName not in Checkpoint['verified']:
+    Checkpoint['verified'].append( StageName )
+  WriteCheckpoint( Checkpoint )
+
+def IsStageCurrent( StageName,Stage ):
+  '''function IsStageCurrent( StageName,Stage ):
+  This function checks that the files a recorded stage wrote still
+  exist with the same checksums, and that its input files (sources)
+  still have the same size and modification time.
+
+  Args:
+    StageName (str): Name of stage (i.e. "imagery").
+    Stage (dict): Recorded stage (see RecordStage()).
+  Returns:
+    bool: True if the stage is current.
+  '''
+  for FileName,Checksum in Stage['files'].items():
+    if not os.path.isfile( FileName ) or ComputeFileChecksum( FileName ) != Checksum:
+      print( 'WARNING: output of stage "'+StageName+'" changed or missing: '+FileName )
+      return False
+  for SourceFileName,FileStamp in Stage.get('sources',{}).items():
+    if FileStamp is None or GetFileStamp( SourceFileName ) != FileStamp:
+      print( 'WARNING: input of stage "'+StageName+'" changed or missing: '+SourceFileName )
+      return False
+  return True
+
+def GetCompletedStage( Checkpoint,StageName ):
+  '''function GetCompletedStage( Checkpoint,StageName ):
+  This function checks whether a stage was completed in a previous
+  run: the stage must be recorded in the checkpoint, and it and all
+  stages recorded before it (whose output it depends on) must still
+  be current (see IsStageCurrent()). Each stage is verified once per
+  run. If a stage is out of date, it and all later stages (and the 
+  completed strips) are removed from the checkpoint, to be run again.
+
+  Args:
+    Checkpoint (dict): Dictionary{} holding checkpoint (see OpenCheckpoint()), or None.
+    StageName (str): Name of stage (i.e. "imagery").
+  Returns:
+    dict: Recorded stage (files and result), or None if stage must be run (again).
+  '''
+  if Checkpoint is None or StageName not in Checkpoint['stages']:
+    return None
+  StageNames = list( Checkpoint['stages'].keys() )
+  for Position,Name in enumerate( StageNames ):
+    if Name not in Checkpoint['verified']:
+      if not IsStageCurrent( Name,Checkpoint['stages'][Name] ):
+        for LaterName in StageNames[Position:]:
+          del Checkpoint['stages'][LaterName]
+        Checkpoint['strips'] = {}
+        WriteCheckpoint( Checkpoint )
+        return None
+      Checkpoint['verified'].append( Name )
+    if Name == StageName: break
+  print( 'resuming: stage "'+StageName+'" already completed.' )
+  return Checkpoint['stages'][StageName]
+
+def RecordStrip( Checkpoint,StripKey,Checksum ):
+  '''function RecordStrip( Checkpoint,StripKey,Checksum ):
+  This function records a completed output strip (or tile) in
+  the checkpoint, along with the checksum of its data.
+
+  Args:
+    Checkpoint (dict): Dictionary{} holding checkpoint (see OpenCheckpoint()), or None.
+    StripKey (str): Key of strip (i.e. its window).
+    Checksum (str): Checksum of classified strip (see ComputeArrayChecksum()).
+  '''
+  if Checkpoint is None: return
+  Checkpoint['strips'][StripKey] = Checksum
+  WriteCheckpoint( Checkpoint )
+
+def ClearStrips( Checkpoint ):
+  '''function ClearStrips( Checkpoint ):
+  This function removes all completed strips from the checkpoint
+  (i.e. when the partial output they were written to is gone).
+
+  Args:
+    Checkpoint (dict): Dictionary{} holding checkpoint (see OpenCheckpoint()), or None.
+  '''
+  if Checkpoint is None: return
+  Checkpoint['strips'] = {}
+  WriteCheckpoint( Checkpoint )
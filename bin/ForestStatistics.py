@@ -0,0 +1,190 @@
+import os
+import csv
+import numpy as np
+from osgeo import gdal,ogr
+
+def OpenZones( ZoneFileName,ReferenceDataset,ZoneField=None ):
+  '''function OpenZones( ZoneFileName,ReferenceDataset,ZoneField ):
+  This function opens a zone layer (i.e. administrative units) for
+  forest statistics. A zone layer is either a raster of integer zone
+  ids, or a POLYGON shapefile whose integer attribute ZoneField holds
+  the zone ids. A raster on a different grid is warped (in a virtual
+  dataset, nearest neighbour) onto the grid of the imagery. Shapefile
+  polygons are rasterized one strip at a time (see ReadZones()), so a
+  zone raster of the whole image is never held in memory. Pixels
+  outside all zones get zone id 0.
+
+  Args:
+    ZoneFileName (str): Name of zone raster, or POLYGON shapefile (.shp).
+    ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset of imagery (i.e. Panchromatic band).
+    ZoneField (str): Integer attribute holding zone ids (shapefiles only).
+  Returns:
+    dict: Dictionary{} holding zone dataset or layer, or None on failure.
+  '''
+  NRows,NCols  = ReferenceDataset.RasterYSize,ReferenceDataset.RasterXSize
+  Geotransform = ReferenceDataset.GetGeoTransform()
+
+  if ZoneFileName.endswith('.shp'):
+    ShapeFileObject = ogr.Open( ZoneFileName )
+    if ShapeFileObject is None or ZoneField is None: return None
+    return { 'shapefile' : ShapeFileObject, 'layer' : ShapeFileObject.GetLayer(), 'field' : ZoneField,
+      'geotransform' : Geotransform, 'projection' : ReferenceDataset.GetProjectionRef() }
+
+  ZoneDataset = gdal.Open( ZoneFileName )
+  if ZoneDataset is None: return None
+  if ( ZoneDataset.RasterYSize,ZoneDataset.RasterXSize ) != ( NRows,NCols ) or \
+      ZoneDataset.GetGeoTransform() != Geotransform:
+    ZoneDataset = gdal.Warp( '',ZoneDataset,format='VRT',width=NCols,height=NRows,
+      outputBounds=( Geotransform[0],Geotransform[3]+Geotransform[5]*NRows,
+        Geotransform[0]+Geotransform[1]*NCols,Geotransform[3] ),
+      dstSRS=ReferenceDataset.GetProjectionRef(),resampleAlg=gdal.GRA_NearestNeighbour,
+      dstNodata=0 )
+  return { 'dataset' : ZoneDataset }
+
+def ReadZones( Zones,StartRow,StartColumn,NRows,NCols ):
+  '''function ReadZones( Zones,StartRow,StartColumn,NRows,NCols ):
+  This function returns the zone ids of one strip (or tile) of the
+  imagery, reading them from the zone raster, or rasterizing the zone
+  polygons into an in-memory dataset covering the strip only.
+
+  Args:
+    Zones (dict): Dictionary{} holding zone dataset or layer (see OpenZones()).
+    StartRow (int): Row of strip in imagery.
+    StartColumn (int): Column of strip in imagery.
+    NRows (int): Number of rows of strip.
+    NCols (int): Number of columns of strip.
+  Returns:
+    numpy.ndarray: 2D array of zone ids.
+  '''
+  if 'dataset' in Zones:
+    return Zones['dataset'].GetRasterBand(1).ReadAsArray( StartColumn,StartRow,NCols,NRows )
+  Geotransform = list( Zones['geotransform'] )
+  Geotransform[0] += StartColumn*Geotransform[1]+StartRow*Geotransform[2]
+  Geotransform[3] += StartColumn*Geotransform[4]+StartRow*Geotransform[5]
+  StripDataset = gdal.GetDriverByName('MEM').Create( '',NCols,NRows,1,gdal.GDT_Int32 )
+  StripDataset.SetGeoTransform( Geotransform )
+  StripDataset.SetProjection( Zones['projection'] )
+  gdal.RasterizeLayer( StripDataset,[1],Zones['layer'],options=[ 'ATTRIBUTE='+Zones['field'] ] )
+  return StripDataset.GetRasterBand(1).ReadAsArray()
+
+def CreateForestStatistics( ReferenceDataset,GridCellSize=None,ZoneFileName=None,ZoneField=None ):
+  '''function CreateForestStatistics( ReferenceDataset,GridCellSize,ZoneFileName,ZoneField ):
+  This function creates (empty) accumulators for forest statistics:
+  the number of tree pixels and of all pixels per grid cell (of
+  GridCellSize x GridCellSize pixels) and per zone (see OpenZones()).
+  The accumulators are updated strip by strip while the imagery is
+  classified (see UpdateForestStatistics()), so that the statistics
+  are complete when the run finishes, without reading the output again.
+
+  Args:
+    ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset of imagery (i.e. Panchromatic band).
+    GridCellSize (int): Optional size (pixels) of grid cells.
+    ZoneFileName (str): Optional zone raster or POLYGON shapefile.
+    ZoneField (str): Integer attribute holding zone ids (shapefiles only).
+  Returns:
+    dict: Dictionary{} holding accumulators, or None if no statistics were requested.
+  '''
+  if GridCellSize is None and ZoneFileName is None: return None
+  Geotransform = ReferenceDataset.GetGeoTransform()
+  NRows,NCols  = ReferenceDataset.RasterYSize,ReferenceDataset.RasterXSize
+  Statistics = {
+    'geotransform' : Geotransform,
+    'pixel_area'   : abs( Geotransform[1]*Geotransform[5]-Geotransform[2]*Geotransform[4] ),
+    'cell_size'    : GridCellSize,
+    'zones'        : None,
+    'zone_counts'  : None
+  }
+  if GridCellSize is not None:
+    Statistics['grid_shape']  = ( int(np.ceil( NRows/float(GridCellSize) )),int(np.ceil( NCols/float(GridCellSize) )) )
+    Statistics['grid_trees']  = np.zeros( Statistics['grid_shape'][0]*Statistics['grid_shape'][1],dtype=np.int64 )
+    Statistics['grid_pixels'] = np.zeros( Statistics['grid_shape'][0]*Statistics['grid_shape'][1],dtype=np.int64 )
+  if ZoneFileName is not None:
+    Statistics['zones'] = OpenZones( ZoneFileName,ReferenceDataset,ZoneField )
+    if Statistics['zones'] is None:
+      print( 'WARNING: unable to read zones: ' , ZoneFileName )
+    else:
+      Statistics['zone_counts'] = {}
+  return Statistics
+
+def UpdateForestStatistics( Statistics,ClassifiedDataStrip,StartRow,StartColumn ):
+  '''function UpdateForestStatistics( Statistics,ClassifiedDataStrip,StartRow,StartColumn ):
+  This function adds one classified strip (or tile) to the forest
+  statistics accumulators (see CreateForestStatistics()), counting
+  tree pixels (1s) and all pixels per grid cell and per zone with
+  np.bincount().
+
+  Args:
+    Statistics (dict): Dictionary{} holding accumulators, or None.
+    ClassifiedDataStrip (numpy.ndarray): 2D array of 1s and 0s (trees/non-trees).
+    StartRow (int): Row of strip in imagery.
+    StartColumn (int): Column of strip in imagery.
+  '''
+  if Statistics is None: return
+  NRows,NCols = ClassifiedDataStrip.shape
+  IsTree = ( ClassifiedDataStrip == 1 ).ravel()
+
+  if Statistics['cell_size'] is not None:
+    CellSize = Statistics['cell_size']
+    CellRows = ( np.arange( StartRow,StartRow+NRows )//CellSize )
+    CellCols = ( np.arange( StartColumn,StartColumn+NCols )//CellSize )
+    Cells = ( CellRows[:,None]*Statistics['grid_shape'][1]+CellCols[None,:] ).ravel()
+    NumCells = Statistics['grid_trees'].size
+    Statistics['grid_trees']  += np.bincount( Cells,weights=IsTree,minlength=NumCells ).astype(np.int64)
+    Statistics['grid_pixels'] += np.bincount( Cells,minlength=NumCells )
+
+  if Statistics['zones'] is not None:
+    Zones = ReadZones( Statistics['zones'],StartRow,StartColumn,NRows,NCols ).ravel()
+    ZoneIds,ZoneIndex = np.unique( Zones,return_inverse=True )
+    ZoneTrees  = np.bincount( ZoneIndex,weights=IsTree,minlength=ZoneIds.size )
+    ZonePixels = np.bincount( ZoneIndex,minlength=ZoneIds.size )
+    for ZoneId,Trees,Pixels in zip( ZoneIds,ZoneTrees,ZonePixels ):
+      Counts = Statistics['zone_counts'].setdefault( int(ZoneId),[0,0] )
+      Counts[0] += int(Trees)
+      Counts[1] += int(Pixels)
+
+def WriteForestStatistics( Statistics,OutDir ):
+  '''function WriteForestStatistics( Statistics,OutDir ):
+  This function writes the forest statistics (see CreateForestStatistics())
+  as CSV tables: ForestStatisticsGrid.csv (one row per grid cell, with
+  the map coordinates of its upper-left corner) and ForestStatisticsZones.csv
+  (one row per zone id). Each row holds the number of tree pixels, the
+  number of pixels, the tree area (in map units, i.e. square meters)
+  and the fraction of tree pixels.
+
+  Args:
+    Statistics (dict): Dictionary{} holding accumulators, or None.
+    OutDir (str): Output directory.
+  Returns:
+    list: List[] of CSV filenames written.
+  '''
+  if Statistics is None: return []
+  OutFileNames = []
+  PixelArea    = Statistics['pixel_area']
+  Geotransform = Statistics['geotransform']
+
+  if Statistics['cell_size'] is not None:
+    OutFileName = os.path.join( OutDir,'ForestStatisticsGrid.csv' )
+    with open( OutFileName,'w',newline='' ) as OutFile:
+      CSVWriter = csv.writer( OutFile )
+      CSVWriter.writerow( [ 'cell_row','cell_column','x','y','tree_pixels','pixels','tree_area','tree_fraction' ] )
+      for Cell in range( Statistics['grid_trees'].size ):
+        CellRow,CellColumn = divmod( Cell,Statistics['grid_shape'][1] )
+        Trees,Pixels = int(Statistics['grid_trees'][Cell]),int(Statistics['grid_pixels'][Cell])
+        CSVWriter.writerow( [ CellRow,CellColumn,
+          Geotransform[0]+CellColumn*Statistics['cell_size']*Geotransform[1],
+          Geotransform[3]+CellRow*Statistics['cell_size']*Geotransform[5],
+          Trees,Pixels,Trees*PixelArea,Trees/float(Pixels) if Pixels>0 else 0.0 ] )
+    OutFileNames.append( OutFileName )
+
+  if Statistics['zone_counts'] is not None:
+    OutFileName = os.path.join( OutDir,'ForestStatisticsZones.csv' )
+    with open( OutFileName,'w',newline='' ) as OutFile:
+      CSVWriter = csv.writer( OutFile )
+      CSVWriter.writerow( [ 'zone','tree_pixels','pixels','tree_area','tree_fraction' ] )
+      for ZoneId,( Trees,Pixels ) in sorted( Statistics['zone_counts'].items() ):
+        CSVWriter.writerow( [ ZoneId,Trees,Pixels,Trees*PixelArea,Trees/float(Pixels) if Pixels>0 else 0.0 ] )
+    OutFileNames.append( OutFileName )
+
+  for OutFileName in OutFileNames:
+    print( 'forest statistics: ' , OutFileName )
+  return OutFileNames
@@ -1,33 +1,53 @@
 import os
 import sys
 import csv
+import time
+import json
+import pickle
+import hashlib
 import pandas
 import numpy as np
+import warnings as warn
 import sklearn
 from matplotlib.pylab import *
 from osgeo import osr,gdal
 from osgeo.gdalnumeric import ravel
 from sklearn.ensemble import ExtraTreesClassifier
 from sklearn.model_selection import cross_val_score
-from Misc import WriteGeotiff,WritePNG
+from joblib import Parallel,delayed
+from collections import deque,OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from Misc import WriteGeotiff,WritePNG,CreateGeotiff,GetFeatureImageryKeys,WriteFeatureList,ReadBandArray
+from Misc import SetWriteProfile,ActiveWriteProfile,SensorStackKeys,ReadSensorStack
+from Checkpoint import GetCompletedStage,RecordStage,RecordStrip,ClearStrips,ComputeArrayChecksum
+from TileQueue import GetImageWindows,WriteTileJobPlan,ReadTileJobPlan,ClaimTile,ReleaseTile
+from ForestStatistics import CreateForestStatistics,UpdateForestStatistics,WriteForestStatistics
 
-def ExtractSpectralValues( ImageDataset,BandNumber,StartRow,EndRow ):
-  '''function ExtractSpectralValues( ImageDataset,BandNumber,StartRow,Endrow ):
+def ExtractSpectralValues( ImageDataset,BandNumber,StartRow,EndRow,StartColumn=0,EndColumn=None ):
+  '''function ExtractSpectralValues( ImageDataset,BandNumber,StartRow,Endrow,StartColumn,EndColumn ):
   
   This function reads a GDAL image dataset and returns a portion of 
   one of its bands (2D numpy arrays) as a 1D array. This subset 
-  includes all columns and those rows starting and ending with 
-  the input parameters StartRow and EndRow.
+  includes those rows starting and ending with the input parameters 
+  StartRow and EndRow, and those columns starting and ending with 
+  StartColumn and EndColumn (by default, all columns). Only this 
+  window is read from disk. Quantized imagery (i.e. int16 NDVI) is 
+  returned as its original values (see Misc.ReadBandArray()).
 
   Args:
     ImageDataset (osgeo.gdal.Dataset): GDAL Image dataset.
     BandNumber (int): NumPy array. Should be greater than or equal to 1.
     StartRow (int): Start row. Should be greater than or equal to 0.
     EndRow (int): End row to extract. Should be less than number of columns.
+    StartColumn (int): Start column (optional, default 0).
+    EndColumn (int): End column to extract (optional, default None for all columns).
   Returns:
     numpy.ndarray: A flattened (1D) array of the array data.
   '''
-  raster = ImageDataset.GetRasterBand(BandNumber+1).ReadAsArray()[StartRow:EndRow,:]
+  if EndColumn is None: EndColumn = ImageDataset.RasterXSize
+  raster = ReadBandArray( ImageDataset.GetRasterBand(BandNumber+1),
+    StartColumn,StartRow,EndColumn-StartColumn,EndRow-StartRow )
   return raster.flatten()
 
 def PrepareTrainingDataFromCSV( TrainingPixelValueDataCSV ):
@@ -63,15 +83,39 @@ def PrepareTrainingDataFromCSV( TrainingPixelValueDataCSV ):
   TrainingDataframe.rename(columns={'Label' : 'tree_binary'},inplace=True)
 
   # Read the following into two SEPARATE pandas dataframes:
-  #   (1) First 22 columns containing spectral pixel values
+  #   (1) All columns containing spectral pixel values 
+  #       (22, or fewer if a subset of variables was selected)
   #   (2) Final column (tree/non-tree) that is 1 or 0
   # Return these two dataframes.
   # ---------------------------------------------------------
-  TrainingSpectralValuesDataframe = TrainingDataframe.iloc[:,0:22]#ix[:,0:22]
+  TrainingSpectralValuesDataframe = TrainingDataframe.drop(columns=['tree_binary'])
   TrainingTreeNonTreeDataframe = TrainingDataframe['tree_binary']
   return ( TrainingSpectralValuesDataframe,TrainingTreeNonTreeDataframe )
 
-def BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame ):
+def CreateRandomForestClassifier( NTrees,MaxDepth=None,Bootstrap=False ):
+  '''function CreateRandomForestClassifier( NTrees,MaxDepth,Bootstrap ):
+  This function initializes (but does not fit) the sklearn.ensemble 
+  ExtraTreesClassifier() object used for vegetation classification. 
+  It is used both to build the final model and to evaluate candidate 
+  settings when tuning, so that both use the same configuration.
+
+  Args:
+    NTrees (int): Number of trees (n_estimators) in ensemble.
+    MaxDepth (int): Maximum depth of each tree. None for no limit.
+    Bootstrap (bool): Use bootstrap samples (needed for out-of-bag scores).
+  Returns:
+    sklearn.ensemble.ExtraTreesClassifier: Initialized (unfitted) classifier.
+  '''
+  return ExtraTreesClassifier( 
+    n_estimators=NTrees,
+    max_depth=MaxDepth,
+    min_samples_split=1.0,
+    bootstrap=Bootstrap,
+    oob_score=Bootstrap,
+    random_state=0 
+  )
+
+def BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame,MaxDepth=None ):
   '''function BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame ):
   This function takes in two dataframes and builds a random-forest 
   model using sklearn.ensemble's ExtraTreesClassifier() function. 
@@ -82,9 +126,10 @@ def BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame
   and fits this to the two input dataframes.
 
   Args: 
-    NTrees (int): 
-    SpectralValuesDataFrame : 
-    TreeNonTreeDataFrame : 
+    NTrees (int): Number of trees in ensemble.
+    SpectralValuesDataFrame (pandas.core.frame.DataFrame): Spectral pixel values.
+    TreeNonTreeDataFrame (pandas.core.series.Series): Tree/non-tree labels (1 or 0).
+    MaxDepth (int): Maximum depth of each tree (optional, default None for no limit).
   Returns: 
     sklearn.ensemble.forest.ExtraTreesClassifier: Output fitted classifier. 
   '''
@@ -92,12 +137,7 @@ def BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame
   # Initialize ExtraTreesClassifer()
   # --------------------------------
 
-  ClassifierRandomForest = ExtraTreesClassifier( 
-    n_estimators=NTrees,
-    max_depth=None,
-    min_samples_split=1.0,
-    random_state=0 
-  )
+  ClassifierRandomForest = CreateRandomForestClassifier( NTrees,MaxDepth )
 
   # Fit ExtraTreesClassifier() object to both input 
   # dataframes and return this object.
@@ -108,21 +148,310 @@ def BuildRandomForestModel( NTrees,SpectralValuesDataFrame,TreeNonTreeDataFrame
     TreeNonTreeDataFrame
   )
 
-def ReadPixelDataIntoRandomForestModel(SpectralImageryDict,StartRow,EndRow):
+def WriteTrainingChunks( TrainingPixelValueDataCSV,OutDir,ChunkRows,RandomSeed=0 ):
+  '''function WriteTrainingChunks( TrainingPixelValueDataCSV,OutDir,ChunkRows,RandomSeed ):
+  This function splits the training data CSV into chunk CSVs of about
+  ChunkRows rows each (in OutDir/TrainingChunks), without reading it
+  into memory at once. The CSV is streamed in blocks of ChunkRows rows,
+  and each row is sent to a chunk chosen at random (seeded by 
+  RandomSeed), so that every chunk is a random mix of tree and 
+  non-tree samples (the CSV lists all tree samples first).
+
+  Args:
+    TrainingPixelValueDataCSV (str): Filename string containing training pixel value data.
+    OutDir (str): Output directory.
+    ChunkRows (int): Number of rows per chunk (about).
+    RandomSeed (int): Seed for random assignment of rows to chunks (default 0).
+  Returns:
+    list: List[] of chunk CSV filenames.
+  '''
+  with open( TrainingPixelValueDataCSV,'r' ) as TrainingFile:
+    NumRows = sum( 1 for Line in TrainingFile )-1
+  NumChunks = max( 1,int(np.ceil( NumRows/float(ChunkRows) )) )
+
+  ChunkDirectory = os.path.join( OutDir,'TrainingChunks' )
+  if not os.path.isdir( ChunkDirectory ): os.makedirs( ChunkDirectory )
+  ChunkFileNames = [ os.path.join( ChunkDirectory,'chunk_%04d.csv' % Chunk ) for Chunk in range(NumChunks) ]
+  for ChunkFileName in ChunkFileNames:
+    if os.path.isfile( ChunkFileName ): os.remove( ChunkFileName )
+
+  RandomState = np.random.RandomState( RandomSeed )
+  for Block in pandas.read_csv( TrainingPixelValueDataCSV,header=0,chunksize=ChunkRows ):
+    Assignment = RandomState.randint( 0,NumChunks,size=Block.shape[0] )
+    for Chunk,Rows in Block.groupby( Assignment ):
+      ChunkFileName = ChunkFileNames[Chunk]
+      Rows.to_csv( ChunkFileName,mode='a',index=False,header=not os.path.isfile(ChunkFileName) )
+  return [ ChunkFileName for ChunkFileName in ChunkFileNames if os.path.isfile(ChunkFileName) ]
+
+def FitRandomForestChunk( ChunkFileName,NTrees,MaxDepth,RandomSeed ):
+  '''function FitRandomForestChunk( ChunkFileName,NTrees,MaxDepth,RandomSeed ):
+  This function fits a subset of NTrees trees of the ensemble on 
+  one chunk of the training data (see WriteTrainingChunks()). It is
+  run in a worker process, so only this chunk is held in memory.
+
+  Args:
+    ChunkFileName (str): Name of chunk CSV.
+    NTrees (int): Number of trees to fit on this chunk.
+    MaxDepth (int): Maximum depth of each tree. None for no limit.
+    RandomSeed (int): Seed (random_state) for trees of this chunk.
+  Returns:
+    sklearn.ensemble.ExtraTreesClassifier: Classifier fitted on chunk.
+  '''
+  ( SpectralValuesDataFrame,TreeNonTreeDataFrame ) = PrepareTrainingDataFromCSV( ChunkFileName )
+  ClassifierRandomForest = CreateRandomForestClassifier( NTrees,MaxDepth )
+  ClassifierRandomForest.set_params( random_state=RandomSeed )
+  return ClassifierRandomForest.fit( SpectralValuesDataFrame,TreeNonTreeDataFrame )
+
+def BuildRandomForestModelOutOfCore( NTrees,TrainingPixelValueDataCSV,OutDir,ChunkRows,
+    MaxDepth=None,NJobs=-1,RandomSeed=0 ):
+  '''function BuildRandomForestModelOutOfCore( NTrees,TrainingPixelValueDataCSV,OutDir,ChunkRows,
+    MaxDepth,NJobs,RandomSeed ):
+  This function builds the ExtraTreesClassifier ensemble without 
+  reading all training data into memory. The training data CSV is 
+  split into random chunks of about ChunkRows rows (see 
+  WriteTrainingChunks()). A subset of the trees is fitted on each 
+  chunk in parallel worker processes (see FitRandomForestChunk()), 
+  and the trees of all chunks are merged into one ensemble. Peak 
+  memory is thus bounded by NJobs chunks, not the full training 
+  data. Every chunk gets at least one tree, so the ensemble has at 
+  least as many trees as chunks. Trees fitted on a chunk that lacks 
+  one of the classes are left out.
+
+  Args:
+    NTrees (int): Number of trees in ensemble (at least one per chunk).
+    TrainingPixelValueDataCSV (str): Filename string containing training pixel value data.
+    OutDir (str): Output directory (for chunk CSVs, removed afterwards).
+    ChunkRows (int): Number of rows per chunk (about).
+    MaxDepth (int): Maximum depth of each tree (optional, default None for no limit).
+    NJobs (int): Number of worker processes (default -1, all cores).
+    RandomSeed (int): Seed for chunks and trees (default 0).
+  Returns: 
+    sklearn.ensemble.ExtraTreesClassifier: Fitted (merged) classifier, or None.
+  '''
+  ChunkFileNames = WriteTrainingChunks( TrainingPixelValueDataCSV,OutDir,ChunkRows,RandomSeed )
+  if len( ChunkFileNames )<1:
+    return None
+  TreesPerChunk = [ len(Trees) for Trees in np.array_split( np.arange(max(NTrees,len(ChunkFileNames))),
+    len(ChunkFileNames) ) ]
+
+  # Fit trees on each chunk in worker processes
+  # -------------------------------------------
+  Classifiers = Parallel( n_jobs=NJobs )(
+    delayed(FitRandomForestChunk)( ChunkFileName,NumTrees,MaxDepth,RandomSeed+Chunk )
+    for Chunk,(ChunkFileName,NumTrees) in enumerate( zip(ChunkFileNames,TreesPerChunk) ) )
+  for ChunkFileName in ChunkFileNames:
+    os.remove( ChunkFileName )
+
+  # Merge trees of all chunks into first classifier. 
+  # All chunks must hold both classes (1 and 0).
+  # -------------------------------------------------
+  ClassifierRandomForestFit = max( Classifiers,key=lambda Classifier: len(Classifier.classes_) )
+  Estimators = []
+  for ChunkFileName,Classifier in zip( ChunkFileNames,Classifiers ):
+    if not np.array_equal( Classifier.classes_,ClassifierRandomForestFit.classes_ ):
+      print( 'WARNING: leaving out trees of chunk without all classes: ' , ChunkFileName )
+      continue
+    Estimators.extend( Classifier.estimators_ )
+  ClassifierRandomForestFit.estimators_  = Estimators
+  ClassifierRandomForestFit.n_estimators = len( Estimators )
+  print( 'trees fitted on ' , str(len(ChunkFileNames)) , ' chunks: ' , str(len(Estimators)) )
+  return ClassifierRandomForestFit
+
+def EstimateInferenceCost( ClassifierFitRandomForest,SpectralValuesDataFrame,NumPixels=200000 ):
+  '''function EstimateInferenceCost( ClassifierFitRandomForest,SpectralValuesDataFrame,NumPixels ):
+  This function estimates how fast a fitted classifier predicts, in 
+  pixels per second. To this end, the training pixel values are 
+  repeated to form a block of (about) NumPixels rows, and the time 
+  to call predict() on this block is measured.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+    SpectralValuesDataFrame (pandas.core.frame.DataFrame): Spectral pixel values.
+    NumPixels (int): Number of pixels to predict for timing.
+  Returns:
+    float: Prediction throughput in pixels per second.
+  '''
+  NumRepeats = max( 1, int(np.ceil( NumPixels / float(SpectralValuesDataFrame.shape[0]) )) )
+  PixelBlock = pandas.concat( [SpectralValuesDataFrame]*NumRepeats, ignore_index=True )
+  StartTime  = time.perf_counter()
+  ClassifierFitRandomForest.predict( PixelBlock )
+  ElapsedTime = max( time.perf_counter()-StartTime, 1e-9 )
+  return PixelBlock.shape[0] / ElapsedTime
+
+def EvaluateRandomForestSettings( NTrees,MaxDepth,SpectralValuesDataFrame,TreeNonTreeDataFrame,NFolds ):
+  '''function EvaluateRandomForestSettings( NTrees,MaxDepth,SpectralValuesDataFrame,TreeNonTreeDataFrame,NFolds ):
+  This function scores one candidate setting (number of trees and 
+  maximum depth) of the ExtraTreesClassifier. It computes the mean 
+  k-fold cross-validation accuracy (using cross_val_score) of the 
+  classifier as it is built for classification, as well as the 
+  out-of-bag (OOB) accuracy of the same setting fitted with bootstrap 
+  samples. It then fits the candidate on all training data.
+
+  Args:
+    NTrees (int): Number of trees in ensemble.
+    MaxDepth (int): Maximum depth of each tree. None for no limit.
+    SpectralValuesDataFrame (pandas.core.frame.DataFrame): Spectral pixel values.
+    TreeNonTreeDataFrame (pandas.core.series.Series): Tree/non-tree labels (1 or 0).
+    NFolds (int): Number of folds for cross-validation.
+  Returns:
+    dict: Dictionary{} with settings, scores and fitted classifier.
+  '''
+  CrossValidationScores = cross_val_score( 
+    CreateRandomForestClassifier( NTrees,MaxDepth ),
+    SpectralValuesDataFrame,
+    TreeNonTreeDataFrame,
+    cv=NFolds
+  )
+
+  # OOB scores need bootstrap samples. With very few trees some
+  # samples are never out-of-bag, and sklearn warns about this.
+  # -----------------------------------------------------------
+  with warn.catch_warnings():
+    warn.filterwarnings('ignore',category=UserWarning)
+    ClassifierOOB = CreateRandomForestClassifier( NTrees,MaxDepth,Bootstrap=True ).fit( 
+      SpectralValuesDataFrame,TreeNonTreeDataFrame )
+
+  return {
+    'ntrees'     : NTrees,
+    'max_depth'  : MaxDepth,
+    'cv_score'   : float( np.mean(CrossValidationScores) ),
+    'oob_score'  : float( ClassifierOOB.oob_score_ ),
+    'classifier' : BuildRandomForestModel( NTrees,
+      SpectralValuesDataFrame,TreeNonTreeDataFrame,MaxDepth )
+  }
+
+def TuneRandomForestModel( SpectralValuesDataFrame,TreeNonTreeDataFrame,NTreesGrid,MaxDepthGrid,
+    NFolds=5,Tolerance=0.01,NJobs=-1 ):
+  '''function TuneRandomForestModel( SpectralValuesDataFrame,TreeNonTreeDataFrame,NTreesGrid,MaxDepthGrid,
+    NFolds,Tolerance,NJobs ):
+  This function evaluates a grid of ExtraTreesClassifier settings 
+  (number of trees x maximum depth) in parallel across cores. For each
+  setting, it reports the k-fold cross-validation accuracy, the OOB 
+  accuracy, and the predicted inference cost (pixels/s). Since every 
+  extra tree slows prediction over the whole scene, the cheapest 
+  (fastest) setting whose cross-validation accuracy is within 
+  Tolerance of the best accuracy is chosen.
+
+  Args:
+    SpectralValuesDataFrame (pandas.core.frame.DataFrame): Spectral pixel values.
+    TreeNonTreeDataFrame (pandas.core.series.Series): Tree/non-tree labels (1 or 0).
+    NTreesGrid (list): Candidate numbers of trees.
+    MaxDepthGrid (list): Candidate maximum depths (None for no limit).
+    NFolds (int): Number of folds for cross-validation (default 5).
+    Tolerance (float): Accuracy tolerance below best accuracy (default 0.01).
+    NJobs (int): Number of parallel jobs (default -1, all cores).
+  Returns:
+    dict: Dictionary{} with chosen settings, scores and fitted classifier.
+  '''
+
+  # Score all candidate settings in parallel 
+  # ----------------------------------------
+  Candidates = Parallel( n_jobs=NJobs )( 
+    delayed(EvaluateRandomForestSettings)( NTrees,MaxDepth,
+      SpectralValuesDataFrame,TreeNonTreeDataFrame,NFolds )
+    for NTrees in NTreesGrid for MaxDepth in MaxDepthGrid )
+
+  # Measure inference cost one candidate at a time, so
+  # that timings are not distorted by other jobs.
+  # ---------------------------------------------------
+  for Candidate in Candidates:
+    Candidate['pixels_per_second'] = EstimateInferenceCost( 
+      Candidate['classifier'],SpectralValuesDataFrame )
+
+  # Choose cheapest candidate within tolerance of best 
+  # --------------------------------------------------
+  BestScore = max( Candidate['cv_score'] for Candidate in Candidates )
+  Eligible  = [ Candidate for Candidate in Candidates 
+    if Candidate['cv_score'] >= BestScore-Tolerance ]
+  Chosen    = max( Eligible, key=lambda Candidate: Candidate['pixels_per_second'] )
+
+  print( '  ntrees  max_depth  cv_accuracy  oob_accuracy  pixels/s' )
+  for Candidate in Candidates:
+    print( '  %6d  %9s  %11.4f  %12.4f  %10.0f %s' % ( Candidate['ntrees'],
+      str(Candidate['max_depth']),Candidate['cv_score'],Candidate['oob_score'],
+      Candidate['pixels_per_second'],'*' if Candidate is Chosen else '' ) )
+  print( 'chosen ntrees: ' , str(Chosen['ntrees']) , ', max_depth: ' , str(Chosen['max_depth']) )
+  return Chosen
+
+def SelectFeatureSubset( SpectralValuesDataFrame,TreeNonTreeDataFrame,NTrees,NFolds=5,Tolerance=0.01 ):
+  '''function SelectFeatureSubset( SpectralValuesDataFrame,TreeNonTreeDataFrame,NTrees,NFolds,Tolerance ):
+  This function selects the smallest subset of variables (NDVI,SAVI,
+  RGB,...) that classifies about as well as all of them. To this end,
+  a model is fitted on all variables and the variables are ranked by 
+  its feature importances. Subsets of the 1,2,3,... most important 
+  variables are then scored with k-fold cross-validation, and the 
+  first subset whose accuracy is within Tolerance of the accuracy of
+  all variables is chosen. Fewer variables mean less imagery to 
+  compute, store and read for each scene.
+
+  Args:
+    SpectralValuesDataFrame (pandas.core.frame.DataFrame): Spectral pixel values.
+    TreeNonTreeDataFrame (pandas.core.series.Series): Tree/non-tree labels (1 or 0).
+    NTrees (int): Number of trees in ensemble.
+    NFolds (int): Number of folds for cross-validation (default 5).
+    Tolerance (float): Accuracy tolerance below accuracy of all variables (default 0.01).
+  Returns:
+    list: List[] of selected variable names, in the column order of the input dataframe.
+  '''
+  Columns = list( SpectralValuesDataFrame.columns )
+  Importances = BuildRandomForestModel( NTrees,
+    SpectralValuesDataFrame,TreeNonTreeDataFrame ).feature_importances_
+  RankedColumns = [ Columns[Index] for Index in np.argsort( -Importances,kind='stable' ) ]
+
+  FullScore = float( np.mean( cross_val_score( CreateRandomForestClassifier( NTrees ),
+    SpectralValuesDataFrame,TreeNonTreeDataFrame,cv=NFolds ) ) )
+
+  print( '  variables  cv_accuracy  added variable (importance)' )
+  Selected = Columns
+  for NumColumns in range( 1,len(RankedColumns)+1 ):
+    Score = float( np.mean( cross_val_score( CreateRandomForestClassifier( NTrees ),
+      SpectralValuesDataFrame[RankedColumns[:NumColumns]],TreeNonTreeDataFrame,cv=NFolds ) ) )
+    AddedColumn = RankedColumns[NumColumns-1]
+    print( '  %9d  %11.4f  %s (%.4f)' % ( NumColumns,Score,AddedColumn,
+      Importances[Columns.index(AddedColumn)] ) )
+    if Score >= FullScore-Tolerance:
+      Selected = [ Column for Column in Columns if Column in RankedColumns[:NumColumns] ]
+      break
+  print( 'selected variables: ' , ','.join(Selected) , 
+    ' (cv accuracy with all ' , str(len(Columns)) , ': %.4f)' % FullScore )
+  return Selected
+
+def GetClassifierFeatures( ClassifierFitRandomForest ):
+  '''function GetClassifierFeatures( ClassifierFitRandomForest ):
+  This function returns the names of the variables (CSV columns) 
+  a classifier was fitted on, so that only their imagery is read.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+  Returns:
+    list: List[] of variable names, or None if unknown (all variables are read).
+  '''
+  FeatureNames = getattr( ClassifierFitRandomForest,'feature_names_in_',None )
+  if FeatureNames is None: return None
+  return [ str(FeatureName) for FeatureName in FeatureNames ]
+
+def ReadPixelDataIntoRandomForestModel(SpectralImageryDict,StartRow,EndRow,StartColumn=0,EndColumn=None,Features=None):
   '''ReadPixelDataIntoRandomForestModel(
   This function matches the image filename containing pixel data with 
   its corresponding column name in the input CSV (dataframe) used for 
   vegetation (woods/trees) classification. To this end, this function
-  iterates through all the image filenames and creates a list[] of the 
-  matching variable names that match that filename. This list[] of 
-  variable names is used to gather a strip of pixel data confined between
-  a starting and ending row (StartRow,EndRow inputs). This pixel data 
-  becomes part of the output Dataframe of this function.
+  iterates through all the variable names (in the same order as the 
+  columns in the CSV) and the keys of their imagery in the input 
+  dictionary{}. For each variable, a window of pixel data confined 
+  between a starting and ending row (StartRow,EndRow inputs) and 
+  starting and ending column (StartColumn,EndColumn) is read. This 
+  pixel data becomes part of the output Dataframe of this function.
+  If a subset of variables is given, only their imagery is read.
+  If the dictionary holds a sensor stack (key 'stack', see --sensor),
+  the Red,Green,Blue and NIR bands are read from it in a single read.
 
   Args:
     SpectralImageryDict (dict): Dictionary holding names of imagery (i.e. NDVI,SAVI,RGB,...)
     StartRow (int): Starting row in imagery, greater than or equal to 0. 
     EndRow (int): Ending row in imagery.
+    StartColumn (int): Starting column in imagery (optional, default 0).
+    EndColumn (int): Ending column in imagery (optional, default None for all columns).
+    Features (list): Optional list[] of variable names to read (default None, all).
   Returns:
     pandas.core.frame.DataFrame: Output dataframe containing pixel values and variable names.
   '''
@@ -132,75 +461,35 @@ def ReadPixelDataIntoRandomForestModel(SpectralImageryDict,StartRow,EndRow):
   # for a strip of data in input imagery
   # ------------------------------------------------------------
   OutDataFrame = pandas.DataFrame()
+  VariableImageryKeys = GetFeatureImageryKeys( SpectralImageryDict,Features )
 
-  for EachFile in SpectralImageryDict.values(): 
+  # read window of all bands of sensor stack (if any) at once
+  # ----------------------------------------------------------
+  StackBands = {}
+  if 'stack' in SpectralImageryDict and any( ImageryKey in SensorStackKeys for 
+      VariableName,ImageryKey in VariableImageryKeys ):
+    StackDataset = gdal.Open(SpectralImageryDict['stack'])
+    if EndColumn is None: EndColumn = StackDataset.RasterXSize
+    StackBands = ReadSensorStack( StackDataset,StartColumn,StartRow,EndColumn-StartColumn,EndRow-StartRow )
+    StackDataset = None
 
-    # Based on filename string, create list[] of appropriate 
-    # variable name string(s) that will be column names in output
-    # dataframe.
-    # ------------------------------------------------------------
+  for VariableName,ImageryKey in VariableImageryKeys: 
 
-    if EachFile.endswith('Red.tif')     and 'Background' not in EachFile: 
-      VariableNames = ['R']
-    elif EachFile.endswith('Green.tif') and 'Background' not in EachFile: 
-      VariableNames = ['G']
-    elif EachFile.endswith('Blue.tif')  and 'Background' not in EachFile: 
-      VariableNames = ['B']
-    elif EachFile.endswith('NDVI.tif')  and 'Background' not in EachFile: 
-      VariableNames = ['NDVI']
-    elif EachFile.endswith('NIR.tif')   and 'Background' not in EachFile: 
-      VariableNames = ['NIR']
-    elif EachFile.endswith('SAVI_01.tif'): 
-      VariableNames = ['SAVI01']
-    elif EachFile.endswith('SAVI_02.tif'): 
-      VariableNames = ['SAVI02']
-    elif EachFile.endswith('SAVI_03.tif'): 
-      VariableNames = ['SAVI03']
-    elif EachFile.endswith('SAVI_04.tif'): 
-      VariableNames = ['SAVI04']
-    elif EachFile.endswith('SAVI_05.tif'): 
-      VariableNames = ['SAVI05']
-    elif EachFile.endswith('SAVI_06.tif'): 
-      VariableNames = ['SAVI06']
-    elif EachFile.endswith('SAVI_07.tif'): 
-      VariableNames = ['SAVI07']
-    elif EachFile.endswith('SAVI_08.tif'): 
-      VariableNames = ['SAVI08']
-    elif EachFile.endswith('SAVI_09.tif'): 
-      VariableNames = ['SAVI09']
-    elif EachFile.endswith('SAVI_10.tif'): 
-      VariableNames = ['SAVI10']
-    elif EachFile.endswith('BackgroundBlue.tif')  : 
-      VariableNames = ['Background_Blue']
-    elif EachFile.endswith('BackgroundGreen.tif') : 
-      VariableNames = ['Background_Green']
-    elif EachFile.endswith('BackgroundNDVI.tif')  : 
-      VariableNames = ['Background_NDVI']
-    elif EachFile.endswith('BackgroundNIR.tif')   : 
-      VariableNames = ['Background_NIR']
-    elif EachFile.endswith('BackgroundPan.tif')   : 
-      VariableNames = ['Background_Pan']
-    elif EachFile.endswith('BackgroundRed.tif')   : 
-      VariableNames = ['Background_Red']
-    elif EachFile.endswith('Pan.tif') and 'background' not in EachFile: 
-      VariableNames = ['Pan']
-    else: continue
+    if ImageryKey in StackBands:
+      OutDataFrame[VariableName] = StackBands[ImageryKey].flatten()
+      continue
 
     # OPEN current Geotiff/JPEG in imagery dataset
     # (for current iteration)
     # --------------------------------------------
-    RasterImageDataset = gdal.Open(EachFile)
+    RasterImageDataset = gdal.Open(SpectralImageryDict[ImageryKey])
 
-    # Iterate through all bands in image dataset, as well
-    # as variable names from if-statement above , and 
     # append output Pandas dataframe with variable column
     # name string and an array (1D) of pixel values
     # ---------------------------------------------------
-
-    for Band,VariableName in enumerate(VariableNames):
-      OutDataFrame[VariableName] = ExtractSpectralValues(
-        RasterImageDataset,Band,StartRow,EndRow
-      )
+    OutDataFrame[VariableName] = ExtractSpectralValues(
+      RasterImageDataset,0,StartRow,EndRow,StartColumn,EndColumn
+    )
 
     # CLOSE current Geotiff/JPEG in imagery dataset
     # (for current iteration)
@@ -210,7 +499,166 @@ def ReadPixelDataIntoRandomForestModel(SpectralImageryDict,StartRow,EndRow):
 
   return OutDataFrame
 
-def GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims):
+def PredictEarlyExit( ClassifierFitRandomForest,FeatureDataFrame,BatchSize=8 ):
+  '''function PredictEarlyExit( ClassifierFitRandomForest,FeatureDataFrame,BatchSize ):
+  This function predicts classes (i.e. tree/non-tree) with a fitted 
+  binary ExtraTreesClassifier, giving exactly the same output as its 
+  predict() method, but without evaluating every tree for every pixel.
+  predict() sums the class probabilities of all trees and takes the 
+  class with largest sum. Here, trees are evaluated in batches of 
+  BatchSize, and once the sum for one class leads the other by more 
+  than the number of trees left (each tree adds at most 1), the class 
+  of that pixel can no longer change, and the pixel is frozen. Only 
+  undecided pixels are passed to the next batch. Since most pixels 
+  (water, bare soil, dense canopy) are unanimous, most trees are only
+  evaluated for a small fraction of pixels when NTrees is large. 
+  Pixels still undecided after the last tree get their class from the 
+  same sums (in the same order) and division as predict() uses.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted binary classifier.
+    FeatureDataFrame (pandas.core.frame.DataFrame): Input dataframe with pixel values.
+    BatchSize (int): Number of trees evaluated between checks (default 8).
+  Returns:
+    np.ndarray: Predicted class of every pixel (row).
+  '''
+  Classes = ClassifierFitRandomForest.classes_
+  if ClassifierFitRandomForest.n_outputs_ != 1 or len(Classes) != 2:
+    return ClassifierFitRandomForest.predict( FeatureDataFrame )
+
+  # Trees are called directly, so put columns in same order as 
+  # during fitting and convert to float32 (as predict() does)
+  # ----------------------------------------------------------
+  if hasattr( ClassifierFitRandomForest,'feature_names_in_' ):
+    FeatureDataFrame = FeatureDataFrame[ list(ClassifierFitRandomForest.feature_names_in_) ]
+  FeatureArray = np.ascontiguousarray( FeatureDataFrame.values,dtype=np.float32 )
+
+  Estimators  = ClassifierFitRandomForest.estimators_
+  NTrees      = len(Estimators)
+  NPixels     = FeatureArray.shape[0]
+  ProbaSums   = np.zeros( (NPixels,2),dtype=np.float64 )
+  ClassIndex  = np.zeros( NPixels,dtype=np.intp )
+  Undecided   = np.arange( NPixels )
+
+  # Margin well above floating-point error of the sums, so
+  # that a frozen pixel can never flip
+  # -------------------------------------------------------
+  Margin = 1e-6
+
+  for StartTree in range( 0,NTrees,BatchSize ):
+    UndecidedFeatures = FeatureArray[Undecided]
+    UndecidedSums     = ProbaSums[Undecided]
+    for Tree in Estimators[StartTree:StartTree+BatchSize]:
+      UndecidedSums += Tree.predict_proba( UndecidedFeatures,check_input=False )
+    ProbaSums[Undecided] = UndecidedSums
+
+    TreesLeft = NTrees-min( StartTree+BatchSize,NTrees )
+    if TreesLeft == 0: break
+
+    # Freeze pixels whose class can no longer change
+    # ----------------------------------------------
+    Lead    = UndecidedSums[:,1]-UndecidedSums[:,0]
+    Decided = np.abs(Lead) > TreesLeft+Margin
+    ClassIndex[Undecided[Decided]] = ( Lead[Decided] > 0 ).astype(np.intp)
+    Undecided = Undecided[~Decided]
+    if Undecided.size == 0: break
+
+  # Pixels not frozen: same arithmetic as predict()
+  # -----------------------------------------------
+  ClassIndex[Undecided] = np.argmax( ProbaSums[Undecided]/NTrees,axis=1 )
+  return Classes.take( ClassIndex,axis=0 )
+
+def CreatePredictionCache( MaxEntries=100000 ):
+  '''function CreatePredictionCache( MaxEntries ):
+  This function creates a (bounded) cache of predictions for 
+  PredictMemoized(): the classes of the MaxEntries most recently 
+  used feature vectors (least recently used first), and counters
+  of rows, unique rows, cache hits and rows predicted.
+
+  Args:
+    MaxEntries (int): Maximum number of cached feature vectors (default 100000, 0 for none).
+  Returns:
+    dict: Dictionary{} holding prediction cache and counters.
+  '''
+  return { 'entries':OrderedDict(),'max_entries':MaxEntries,'rows':0,'unique':0,'hits':0,'predicted':0 }
+
+def PredictMemoized( ClassifierFitRandomForest,FeatureDataFrame,Cache,EarlyExit=False ):
+  '''function PredictMemoized( ClassifierFitRandomForest,FeatureDataFrame,Cache,EarlyExit ):
+  This function predicts classes with a fitted classifier, giving 
+  exactly the same output as its predict() method, but running the
+  ensemble only once per distinct feature vector. Water, NoData fill
+  and saturated areas give long runs of identical rows. Rows are 
+  compared as float32 (as predict() converts them), and deduplicated 
+  with np.unique(). Unique rows are then looked up in a bounded LRU 
+  cache of recent results (see CreatePredictionCache()), shared 
+  across strips or tiles, and only the remaining rows are predicted.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+    FeatureDataFrame (pandas.core.frame.DataFrame): Input dataframe with pixel values.
+    Cache (dict): Prediction cache and counters (see CreatePredictionCache()), updated here.
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+  Returns:
+    np.ndarray: Predicted class of every pixel (row).
+  '''
+  FeatureArray = np.ascontiguousarray( FeatureDataFrame.values,dtype=np.float32 )
+  NRows = FeatureArray.shape[0]
+  if NRows == 0:
+    return ClassifierFitRandomForest.predict( FeatureDataFrame )
+
+  # One opaque (bytes) key per row, so that rows are 
+  # deduplicated and looked up by their exact bits
+  # -------------------------------------------------
+  RowKeys = FeatureArray.view( np.dtype( ( np.void,FeatureArray.dtype.itemsize*FeatureArray.shape[1] ) ) ).ravel()
+  UniqueKeys,UniqueIndex,Inverse = np.unique( RowKeys,return_index=True,return_inverse=True )
+  UniqueClasses = np.empty( UniqueKeys.size,dtype=ClassifierFitRandomForest.classes_.dtype )
+
+  Entries = Cache['entries']
+  Missing = []
+  for Position,Key in enumerate( UniqueKeys ):
+    Key = Key.tobytes()
+    if Key in Entries:
+      UniqueClasses[Position] = Entries[Key]
+      Entries.move_to_end( Key )
+    else:
+      Missing.append( Position )
+
+  if len(Missing)>0:
+    Missing = np.asarray( Missing,dtype=np.intp )
+    MissingDataFrame = pandas.DataFrame( FeatureArray[UniqueIndex[Missing]],columns=FeatureDataFrame.columns )
+    if EarlyExit:
+      UniqueClasses[Missing] = PredictEarlyExit( ClassifierFitRandomForest,MissingDataFrame )
+    else:
+      UniqueClasses[Missing] = ClassifierFitRandomForest.predict( MissingDataFrame )
+    if Cache['max_entries']>0:
+      for Position in Missing[-Cache['max_entries']:]:
+        Entries[ UniqueKeys[Position].tobytes() ] = UniqueClasses[Position]
+      while len(Entries) > Cache['max_entries']:
+        Entries.popitem( last=False )
+
+  Cache['rows']      += NRows
+  Cache['unique']    += int(UniqueKeys.size)
+  Cache['hits']      += int(UniqueKeys.size-len(Missing))
+  Cache['predicted'] += int(len(Missing))
+  return UniqueClasses[ Inverse.ravel() ]
+
+def PrintPredictionCacheReport( Cache ):
+  '''function PrintPredictionCacheReport( Cache ):
+  This function prints the counters of a prediction cache (see 
+  PredictMemoized()): the fraction of rows that were duplicates 
+  within their strip, the hit rate of the LRU cache (of unique
+  rows), and the fraction of rows for which the ensemble ran.
+
+  Args:
+    Cache (dict): Prediction cache and counters, or None.
+  '''
+  if Cache is None or Cache['rows'] == 0: return
+  print( 'memoization, duplicate rows (per strip): ' , '%.4f' % ( 1.0-Cache['unique']/float(Cache['rows']) ) )
+  print( 'memoization, cache hit rate (unique rows): ' , '%.4f' % ( Cache['hits']/float(max(Cache['unique'],1)) ) )
+  print( 'memoization, rows predicted: ' , '%.4f' % ( Cache['predicted']/float(Cache['rows']) ) ,
+    ' (' , str(Cache['predicted']) , ' of ' , str(Cache['rows']) , ')' )
+
+def GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims,EarlyExit=False,Cache=None):
   '''function GetClassification( FullVariablesDataFrame,
   For the entire image area, or a strip of it, this function performs 
   the actual classification, returning a 2D array of 1s and 0s marking
@@ -225,6 +673,8 @@ def GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims):
     ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Classifier object.
     dims (tuple): number of rows and columns of image area or strip.
     dims (tuple): 2D dimensions of image domain or subset (strip).
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+    Cache (dict): Optional prediction cache (see PredictMemoized()). Same output.
   Returns:
     np.ndarray: Output vegetation classification.
   '''
@@ -239,12 +689,523 @@ def GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims):
   # or sub-array (strip) of 1s and 0s. Return the 
   # reshaped array (1D to 2D) 
   # -----------------------------------------------------
-  classifierPredictRandomForest = ClassifierFitRandomForest.predict(FullVariablesDataFrame)
+  if Cache is not None:
+    classifierPredictRandomForest = PredictMemoized(ClassifierFitRandomForest,FullVariablesDataFrame,Cache,EarlyExit)
+  elif EarlyExit:
+    classifierPredictRandomForest = PredictEarlyExit(ClassifierFitRandomForest,FullVariablesDataFrame)
+  else:
+    classifierPredictRandomForest = ClassifierFitRandomForest.predict(FullVariablesDataFrame)
   classifierPredictRandomForest = np.array(classifierPredictRandomForest,dtype=np.int8)
   return np.reshape(classifierPredictRandomForest,dims)
 
-def RandomForestClassification( ImgDict,CSV,OutDir,NTrees ):
-  '''function RandomForestClassification( ImgDict,CSV,OutDir,NTrees ):
+def ClassifyCoarseToFine( FullVariablesDataFrame,ClassifierFitRandomForest,dims,BlockSize=8,
+    Confidence=0.95,NumCheckPixels=1000,EarlyExit=False,RandomSeed=0,Cache=None ):
+  '''function ClassifyCoarseToFine( FullVariablesDataFrame,ClassifierFitRandomForest,dims,BlockSize,
+    Confidence,NumCheckPixels,EarlyExit,RandomSeed,Cache ):
+  This function classifies an image area (or strip) coarse-to-fine.
+  The pixel values are first averaged over blocks of BlockSize x BlockSize
+  pixels, and the block averages are classified (one row per block).
+  A block is uniform if the fraction of trees voting for its class
+  is at least Confidence, and all 8 neighbouring blocks have the same 
+  class (so that boundaries are never taken from the coarse level).
+  All pixels of a uniform block get the class of the block, and only 
+  the pixels of mixed or boundary blocks are classified at full 
+  resolution (see GetClassification()). To measure the agreement with
+  a full-resolution classification, up to NumCheckPixels pixels of 
+  uniform blocks are drawn at random and classified at full resolution.
+
+  Args:
+    FullVariablesDataFrame (pandas.core.frame.DataFrame): Input dataframe with pixel values.
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted binary classifier.
+    dims (tuple): 2D dimensions of image domain or subset (strip).
+    BlockSize (int): Number of rows and columns of each block (default 8).
+    Confidence (float): Minimum fraction of trees voting for class of uniform block (default 0.95).
+    NumCheckPixels (int): Number of pixels of uniform blocks checked at full resolution (default 1000).
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+    RandomSeed (int): Seed for drawing check pixels (default 0).
+    Cache (dict): Optional prediction cache for full-resolution pixels (see PredictMemoized()).
+  Returns:
+    tuple: Output vegetation classification (np.ndarray), and dict{} with number of
+      'pixels', 'skipped' pixels (uniform blocks), 'checked' pixels and 'agreed' pixels.
+  '''
+  NRows,NCols = dims
+  Report = { 'pixels':NRows*NCols,'skipped':0,'checked':0,'agreed':0 }
+  Classes = list( ClassifierFitRandomForest.classes_ )
+  if len(Classes) != 2 or 1 not in Classes:
+    return ( GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims,EarlyExit,Cache ),Report )
+
+  # Average pixel values over blocks (edge blocks 
+  # are padded with NaN, which is ignored)
+  # ---------------------------------------------
+  NBlockRows = int(np.ceil( NRows/float(BlockSize) ))
+  NBlockCols = int(np.ceil( NCols/float(BlockSize) ))
+  NFeatures  = FullVariablesDataFrame.shape[1]
+  PaddedFeatures = np.full( (NBlockRows*BlockSize,NBlockCols*BlockSize,NFeatures),np.nan,dtype=np.float32 )
+  PaddedFeatures[:NRows,:NCols] = np.asarray( FullVariablesDataFrame.values,dtype=np.float32 ).reshape( NRows,NCols,NFeatures )
+  with warn.catch_warnings():
+    warn.simplefilter( 'ignore',category=RuntimeWarning )
+    BlockFeatures = np.nanmean( PaddedFeatures.reshape( NBlockRows,BlockSize,NBlockCols,BlockSize,NFeatures ),
+      axis=(1,3) ).reshape( NBlockRows*NBlockCols,NFeatures )
+  PaddedFeatures = None
+  ValidBlocks = np.all( np.isfinite( BlockFeatures ),axis=1 )
+
+  # Classify block averages, and find uniform blocks whose
+  # 8 neighbours (edges repeated) have the same class
+  # ------------------------------------------------------
+  TreeProbability = np.zeros( NBlockRows*NBlockCols,dtype=np.float64 )
+  if np.any( ValidBlocks ):
+    TreeProbability[ValidBlocks] = ClassifierFitRandomForest.predict_proba( pandas.DataFrame( 
+      BlockFeatures[ValidBlocks],columns=FullVariablesDataFrame.columns ) )[:,Classes.index(1)]
+  BlockClass = ( TreeProbability >= 0.5 ).reshape( NBlockRows,NBlockCols )
+  Uniform    = ( ValidBlocks & ( ( TreeProbability >= Confidence ) | ( TreeProbability <= 1.0-Confidence ) ) 
+    ).reshape( NBlockRows,NBlockCols )
+  PaddedClass = np.pad( BlockClass,1,mode='edge' )
+  Neighbours  = np.stack( [ PaddedClass[RowShift:RowShift+NBlockRows,ColumnShift:ColumnShift+NBlockCols]
+    for RowShift in range(3) for ColumnShift in range(3) ] )
+  Uniform &= ( Neighbours.min(axis=0) == Neighbours.max(axis=0) )
+
+  # Pixels of uniform blocks take the class of their block,
+  # all other pixels are classified at full resolution
+  # -------------------------------------------------------
+  SkippedPixels = np.repeat( np.repeat( Uniform,BlockSize,axis=0 ),BlockSize,axis=1 )[:NRows,:NCols].ravel()
+  ClassifiedData = np.repeat( np.repeat( BlockClass.astype(np.int8),BlockSize,axis=0 ),BlockSize,axis=1 )[:NRows,:NCols].ravel()
+  FinePixels = np.flatnonzero( ~SkippedPixels )
+  if FinePixels.size>0:
+    ClassifiedData[FinePixels] = GetClassification( FullVariablesDataFrame.iloc[FinePixels],
+      ClassifierFitRandomForest,(FinePixels.size,),EarlyExit,Cache )
+  Report['skipped'] = int( NRows*NCols-FinePixels.size )
+
+  # Check a random sample of skipped pixels 
+  # against full-resolution classification
+  # ---------------------------------------
+  if Report['skipped']>0 and NumCheckPixels>0:
+    CheckPixels = np.random.default_rng( RandomSeed ).choice( np.flatnonzero( SkippedPixels ),
+      min( NumCheckPixels,Report['skipped'] ),replace=False )
+    FullResolution = GetClassification( FullVariablesDataFrame.iloc[CheckPixels],
+      ClassifierFitRandomForest,(CheckPixels.size,),EarlyExit,Cache )
+    Report['checked'] = int(CheckPixels.size)
+    Report['agreed']  = int( np.count_nonzero( FullResolution == ClassifiedData[CheckPixels] ) )
+  return ( ClassifiedData.reshape( NRows,NCols ),Report )
+
+def ClassifyFeatures( FullVariablesDataFrame,ClassifierFitRandomForest,dims,EarlyExit=False,Cache=None,
+    Pyramid=None,RandomSeed=0 ):
+  '''function ClassifyFeatures( FullVariablesDataFrame,ClassifierFitRandomForest,dims,EarlyExit,Cache,
+    Pyramid,RandomSeed ):
+  This function classifies an image area (or strip or tile), either 
+  at full resolution (see GetClassification()) or, if pyramid options
+  are given, coarse-to-fine (see ClassifyCoarseToFine()).
+
+  Args:
+    FullVariablesDataFrame (pandas.core.frame.DataFrame): Input dataframe with pixel values.
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+    dims (tuple): 2D dimensions of image domain or subset (strip).
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+    Cache (dict): Optional prediction cache (see PredictMemoized()). Same output.
+    Pyramid (dict): Optional dict{} with keys 'block_size','confidence','check_pixels'.
+    RandomSeed (int): Seed for drawing check pixels in pyramid mode (default 0).
+  Returns:
+    tuple: Output vegetation classification (np.ndarray), and dict{} of pyramid counts 
+      (see ClassifyCoarseToFine()), or None at full resolution.
+  '''
+  if Pyramid is None:
+    return ( GetClassification( FullVariablesDataFrame,ClassifierFitRandomForest,dims,EarlyExit,Cache ),None )
+  return ClassifyCoarseToFine( FullVariablesDataFrame,ClassifierFitRandomForest,dims,Pyramid['block_size'],
+    Pyramid['confidence'],Pyramid['check_pixels'],EarlyExit,RandomSeed,Cache )
+
+def SaveRandomForestModel( ClassifierFitRandomForest,ModelFileName ):
+  '''function SaveRandomForestModel( ClassifierFitRandomForest,ModelFileName ):
+  This function saves (pickles) a fitted classifier to disk. The file 
+  is written under a temporary name and then moved into place.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+    ModelFileName (str): Output filename of pickled classifier.
+  '''
+  with open( ModelFileName+'.tmp','wb' ) as ModelFile:
+    pickle.dump( ClassifierFitRandomForest,ModelFile )
+  os.replace( ModelFileName+'.tmp',ModelFileName )
+
+def LoadRandomForestModel( ModelFileName ):
+  '''function LoadRandomForestModel( ModelFileName ):
+  This function loads a fitted classifier saved with SaveRandomForestModel().
+
+  Args:
+    ModelFileName (str): Filename of pickled classifier.
+  Returns:
+    sklearn.ensemble.ExtraTreesClassifier: Fitted classifier.
+  '''
+  with open( ModelFileName,'rb' ) as ModelFile:
+    return pickle.load( ModelFile )
+
+def ExportTileJobPlan( ImgDict,ModelFileName,OutDir,TileSize,EarlyExit=False,StatisticsOptions=None,
+    MemoizeEntries=None ):
+  '''function ExportTileJobPlan( ImgDict,ModelFileName,OutDir,TileSize,EarlyExit,StatisticsOptions,
+    MemoizeEntries ):
+  This function writes a tile job plan (tiles.json) to the output 
+  directory, so that the classification of a (large) image can be 
+  spread over independent worker processes, on one or more hosts 
+  with shared storage (see RunTileWorker() and MergeTileOutputs()).
+  The plan holds the imagery dictionary{}, a reference to the fitted 
+  (pickled) classifier, the directory for tile outputs, and the 
+  window of every tile.
+
+  Args:
+    ImgDict (dict): Dictionary{} containing imagery for vegetation classification.
+    ModelFileName (str): Filename of pickled classifier (see SaveRandomForestModel()).
+    OutDir (str): Output directory.
+    TileSize (int): Number of rows and columns of each tile.
+    EarlyExit (bool): Workers use early-exit ensemble voting (see PredictEarlyExit()).
+    StatisticsOptions (dict): Optional forest statistics computed on merge (see RandomForestClassification()).
+    MemoizeEntries (int): Optional size of prediction cache of each worker (see PredictMemoized()).
+  Returns:
+    str: Name of tile job plan (JSON).
+  '''
+  ds=gdal.Open(ImgDict['pan'])
+  NROWS,NCOLS = ds.RasterYSize,ds.RasterXSize
+  ds=None
+  del ds
+
+  TileDirectory = os.path.join( OutDir,'tiles' )
+  if not os.path.isdir( TileDirectory ): os.makedirs( TileDirectory )
+
+  Plan = {
+    'imagery'   : dict( (Key,os.path.abspath(FileName)) for Key,FileName in ImgDict.items() ),
+    'model'     : os.path.abspath( ModelFileName ),
+    'reference' : os.path.abspath( ImgDict['pan'] ),
+    'tile_dir'  : os.path.abspath( TileDirectory ),
+    'output'    : os.path.abspath( os.path.join( OutDir,'vegetation_forest_classification.tif' ) ),
+    'early_exit': EarlyExit,
+    'statistics': StatisticsOptions,
+    'memoize_entries': MemoizeEntries,
+    'write_profile': ActiveWriteProfile['name'],
+    'tiles'     : [ { 'id' : TileId, 'window' : Window } for TileId,Window in 
+                    enumerate( GetImageWindows( NROWS,NCOLS,TileSize ) ) ]
+  }
+  PlanFileName = os.path.join( OutDir,'tiles.json' )
+  WriteTileJobPlan( PlanFileName,Plan )
+  print( 'tile job plan: ' , PlanFileName , ' (' , str(len(Plan['tiles'])) , ' tiles)' )
+  return PlanFileName
+
+def GetTileFileNames( Plan,Tile ):
+  '''function GetTileFileNames( Plan,Tile ):
+  This function returns the filenames of the classified output 
+  (NumPy .npy file) and of the lock file of one tile in a tile job plan.
+
+  Args:
+    Plan (dict): Tile job plan (see ExportTileJobPlan()).
+    Tile (dict): One tile of the plan.
+  Returns:
+    tuple: Filenames of tile output and tile lock file.
+  '''
+  TileBaseName = os.path.join( Plan['tile_dir'],'tile_%06d' % Tile['id'] )
+  return ( TileBaseName+'.npy', TileBaseName+'.lock' )
+
+def RunTileWorker( PlanFileName,MaxRetries=3,RetryDelay=5.0,StaleLockSeconds=3600.0 ):
+  '''function RunTileWorker( PlanFileName,MaxRetries,RetryDelay,StaleLockSeconds ):
+  This function runs one tile worker. Any number of workers can be 
+  started (as separate processes, on any host that sees the output 
+  directory) for the same tile job plan. Each worker loads the fitted 
+  classifier, then repeatedly claims a tile that has no output yet 
+  (using a lock file, see TileQueue.ClaimTile()), classifies it, and
+  writes the classified tile (1s and 0s) to a NumPy .npy file. A tile 
+  that fails is released and retried up to MaxRetries times. The 
+  worker returns when no tile is left that it can claim.
+
+  Args:
+    PlanFileName (str): Name of tile job plan (see ExportTileJobPlan()).
+    MaxRetries (int): Number of times a failed tile (or lock) is retried (default 3).
+    RetryDelay (float): Seconds to wait before retrying (default 5).
+    StaleLockSeconds (float): Age (seconds) after which a tile lock is stale (default 3600).
+  Returns:
+    int: Number of tiles classified by this worker.
+  '''
+  Plan = ReadTileJobPlan( PlanFileName )
+  if Plan is None: return 0
+  ClassifierFitRandomForest = LoadRandomForestModel( Plan['model'] )
+  Cache = CreatePredictionCache( Plan['memoize_entries'] ) if Plan.get('memoize_entries') is not None else None
+
+  NumClassified = 0
+  Failures = {}
+  ClaimedAnyTile = True
+  while ClaimedAnyTile:
+    ClaimedAnyTile = False
+    for Tile in Plan['tiles']:
+
+      # Skip tiles that are done, or that failed too often
+      # --------------------------------------------------
+      ( TileFileName,LockFileName ) = GetTileFileNames( Plan,Tile )
+      if os.path.isfile( TileFileName ): continue
+      if Failures.get( Tile['id'],0 ) > MaxRetries: continue
+      Token = ClaimTile( LockFileName,StaleLockSeconds,MaxRetries,RetryDelay )
+      if Token is None: continue
+      ClaimedAnyTile = True
+
+      try:
+        # Another worker may have finished this tile just 
+        # before we claimed it.
+        # ------------------------------------------------
+        if not os.path.isfile( TileFileName ):
+          StartRow,EndRow,StartColumn,EndColumn = Tile['window']
+          DataFrameForImageTile = ReadPixelDataIntoRandomForestModel(
+            Plan['imagery'],StartRow,EndRow,StartColumn,EndColumn,
+            GetClassifierFeatures( ClassifierFitRandomForest ) )
+          ClassifiedDataTile = GetClassification( DataFrameForImageTile,
+            ClassifierFitRandomForest,(EndRow-StartRow,EndColumn-StartColumn),
+            Plan.get('early_exit',False),Cache )
+
+          # Write tile under a temporary name, then move it 
+          # into place, so a tile output is always complete
+          # -------------------------------------------------
+          with open( TileFileName+'.tmp','wb' ) as TileFile:
+            np.save( TileFile,ClassifiedDataTile )
+          os.replace( TileFileName+'.tmp',TileFileName )
+          NumClassified += 1
+      except Exception as e:
+        Failures[Tile['id']] = Failures.get( Tile['id'],0 )+1
+        print( 'WARNING: tile ' , str(Tile['id']) , ' failed: ' , str(e) )
+        time.sleep( RetryDelay )
+      finally:
+        ReleaseTile( LockFileName,Token )
+
+  print( 'number of tiles classified by worker: ' , str(NumClassified) )
+  PrintPredictionCacheReport( Cache )
+  return NumClassified
+
+def MergeTileOutputs( PlanFileName ):
+  '''function MergeTileOutputs( PlanFileName ):
+  This function assembles the classified tiles written by tile workers
+  (see RunTileWorker()) into the final output Geotiff, as well as a 
+  PNG "quick look", once all tiles in the tile job plan are done.
+  Forest statistics requested in the plan are accumulated tile by tile.
+  The output is written with the write profile of the plan, unless 
+  another one was selected (see Misc.SetWriteProfile()).
+
+  Args:
+    PlanFileName (str): Name of tile job plan (see ExportTileJobPlan()).
+  Returns:
+    str: Name of final classification Geotiff, or None if tiles are missing.
+  '''
+  Plan = ReadTileJobPlan( PlanFileName )
+  if Plan is None: return None
+
+  MissingTiles = [ Tile['id'] for Tile in Plan['tiles'] 
+    if not os.path.isfile( GetTileFileNames( Plan,Tile )[0] ) ]
+  if len(MissingTiles)>0:
+    print( '  \n    Unable to merge tiles, ' , str(len(MissingTiles)) , ' tile(s) not done yet.' )
+    return None
+
+  # Write each classified tile into its window in the 
+  # final output Geotiff
+  # -------------------------------------------------
+  if ActiveWriteProfile['name'] is None and Plan.get('write_profile') is not None:
+    SetWriteProfile( Plan['write_profile'] )
+  ReferenceDataset = gdal.Open( Plan['reference'] )
+  OutputDataset = CreateGeotiff( ReferenceDataset,Plan['output']+'.tmp' )
+  OutputBand    = OutputDataset.GetRasterBand(1)
+  NumTreePixels = 0
+  StatisticsOptions = Plan.get('statistics') or {}
+  Statistics = CreateForestStatistics( ReferenceDataset,StatisticsOptions.get('grid'),
+    StatisticsOptions.get('zones'),StatisticsOptions.get('zone_field') )
+  for Tile in Plan['tiles']:
+    StartRow,EndRow,StartColumn,EndColumn = Tile['window']
+    ClassifiedDataTile = np.load( GetTileFileNames( Plan,Tile )[0] )
+    OutputBand.WriteArray( ClassifiedDataTile,StartColumn,StartRow )
+    NumTreePixels += int( np.count_nonzero( ClassifiedDataTile == 1 ) )
+    UpdateForestStatistics( Statistics,ClassifiedDataTile,StartRow,StartColumn )
+  OutputBand,OutputDataset = None,None
+  os.replace( Plan['output']+'.tmp',Plan['output'] )
+  print( 'number of tree pixels: ' , str(NumTreePixels))
+  WriteForestStatistics( Statistics,os.path.dirname( Plan['output'] ) )
+
+  # Write PNG showing "quick look" of forest/woods/vegetation classification.
+  # -------------------------------------------------------------------------
+  OutNamePNG = os.path.splitext( Plan['output'] )[0]+'.png'
+  WritePNG( OutNamePNG, gdal.Open( Plan['output'] ).GetRasterBand(1).ReadAsArray() )
+  return Plan['output']
+
+def CompareClassifications( ClassificationFileName,ReferenceFileName,BlockRows=1024 ):
+  '''function CompareClassifications( ClassificationFileName,ReferenceFileName,BlockRows ):
+  This function compares a classification Geotiff (1s and 0s) with 
+  a reference classification of the same image (i.e. a run with exact
+  instead of fast "background" imagery), reading both in blocks of 
+  BlockRows rows. It prints the agreement (fraction of pixels with 
+  the same class), Cohen's kappa, and the number of tree pixels in each.
+
+  Args:
+    ClassificationFileName (str): Name of classification Geotiff.
+    ReferenceFileName (str): Name of reference classification Geotiff.
+    BlockRows (int): Number of rows read at once (default 1024).
+  Returns:
+    dict: Dictionary{} with 'agreement','kappa','trees','reference_trees', or None if grids differ.
+  '''
+  ClassificationDataset = gdal.Open( ClassificationFileName )
+  ReferenceDataset      = gdal.Open( ReferenceFileName )
+  if ClassificationDataset is None or ReferenceDataset is None or \
+      ( ClassificationDataset.RasterXSize,ClassificationDataset.RasterYSize ) != \
+      ( ReferenceDataset.RasterXSize,ReferenceDataset.RasterYSize ):
+    print( 'WARNING: unable to compare classifications (missing, or different grids): ' , ReferenceFileName )
+    return None
+
+  NROWS,NCOLS = ClassificationDataset.RasterYSize,ClassificationDataset.RasterXSize
+  NumPixels,NumAgreed,NumTrees,NumReferenceTrees = 0,0,0,0
+  for StartRow in range( 0,NROWS,BlockRows ):
+    NRows = min( BlockRows,NROWS-StartRow )
+    Classified = ClassificationDataset.GetRasterBand(1).ReadAsArray( 0,StartRow,NCOLS,NRows ) == 1
+    Reference  = ReferenceDataset.GetRasterBand(1).ReadAsArray( 0,StartRow,NCOLS,NRows ) == 1
+    NumPixels         += Classified.size
+    NumAgreed         += int( np.count_nonzero( Classified == Reference ) )
+    NumTrees          += int( np.count_nonzero( Classified ) )
+    NumReferenceTrees += int( np.count_nonzero( Reference ) )
+
+  # Cohen's kappa: agreement beyond that expected 
+  # by chance from the fraction of trees in each
+  # ---------------------------------------------
+  Agreement = NumAgreed/float(NumPixels)
+  ChanceAgreement = ( NumTrees*NumReferenceTrees+(NumPixels-NumTrees)*(NumPixels-NumReferenceTrees) )/float(NumPixels)**2
+  Kappa = ( Agreement-ChanceAgreement )/( 1.0-ChanceAgreement ) if ChanceAgreement < 1.0 else 1.0
+  print( 'agreement with reference classification: ' , '%.5f' % Agreement , ' (kappa ' , '%.5f' % Kappa , ')' )
+  print( 'number of tree pixels: ' , str(NumTrees) , ' (reference: ' , str(NumReferenceTrees) , ')' )
+  return { 'agreement':Agreement,'kappa':Kappa,'trees':NumTrees,'reference_trees':NumReferenceTrees }
+
+def RunStripPipeline( Windows,ReadStrip,ClassifyStrip,WriteStrip,PipelineDepth=1 ):
+  '''function RunStripPipeline( Windows,ReadStrip,ClassifyStrip,WriteStrip,PipelineDepth ):
+  This function reads, classifies and writes a list of strips (or
+  tiles) as a pipeline. While strip N is classified on the calling
+  thread, the pixel values of strip N+1 (up to N+PipelineDepth) are
+  read on an I/O thread, and strip N-1 (and earlier, up to 
+  PipelineDepth strips) is written on a writer thread. At most 
+  PipelineDepth strips wait to be classified and at most PipelineDepth
+  strips wait to be written, which bounds the memory in flight. 
+  Strips are written in order. With PipelineDepth 0, strips are 
+  read, classified and written one after another, without threads.
+
+  Args:
+    Windows (list): List[] of windows [StartRow,EndRow,StartColumn,EndColumn].
+    ReadStrip (function): Function( Window ) returning pixel values of a strip.
+    ClassifyStrip (function): Function( Window,PixelValues ) returning classified strip.
+    WriteStrip (function): Function( Window,ClassifiedStrip ) writing classified strip.
+    PipelineDepth (int): Number of strips read ahead and written behind (default 1).
+  '''
+  if PipelineDepth < 1:
+    for Window in Windows:
+      WriteStrip( Window,ClassifyStrip( Window,ReadStrip( Window ) ) )
+    return
+
+  with ThreadPoolExecutor( max_workers=1 ) as Reader, ThreadPoolExecutor( max_workers=1 ) as Writer:
+    PendingReads,PendingWrites = deque(),deque()
+    RemainingWindows = iter( Windows )
+    for Window in islice( RemainingWindows,PipelineDepth ):
+      PendingReads.append( ( Window,Reader.submit( ReadStrip,Window ) ) )
+
+    while len( PendingReads ) > 0:
+
+      # Take pixel values of next strip, and start 
+      # reading the one after it
+      # --------------------------------------------
+      ( Window,ReadFuture ) = PendingReads.popleft()
+      PixelValues = ReadFuture.result()
+      NextWindow  = next( RemainingWindows,None )
+      if NextWindow is not None:
+        PendingReads.append( ( NextWindow,Reader.submit( ReadStrip,NextWindow ) ) )
+
+      ClassifiedStrip = ClassifyStrip( Window,PixelValues )
+      PixelValues = None
+
+      # Wait for the oldest write if too many 
+      # classified strips are waiting to be written
+      # -------------------------------------------
+      while len( PendingWrites ) >= PipelineDepth:
+        PendingWrites.popleft().result()
+      PendingWrites.append( Writer.submit( WriteStrip,Window,ClassifiedStrip ) )
+
+    while len( PendingWrites ) > 0:
+      PendingWrites.popleft().result()
+
+def ComputeFeatureFingerprint( FeatureDataFrame ):
+  '''function ComputeFeatureFingerprint( FeatureDataFrame ):
+  This function computes a fingerprint (SHA-1 hex digest) of the 
+  input features (variable names and pixel values) of one tile.
+
+  Args:
+    FeatureDataFrame (pandas.core.frame.DataFrame): Pixel values of tile (see ReadPixelDataIntoRandomForestModel()).
+  Returns:
+    str: Hex digest fingerprint of tile features.
+  '''
+  Digest = hashlib.sha1()
+  for VariableName in FeatureDataFrame.columns:
+    Digest.update( VariableName.encode('utf-8') )
+    Digest.update( np.ascontiguousarray( FeatureDataFrame[VariableName].values ).tobytes() )
+  return Digest.hexdigest()
+
+def ComputeModelFingerprint( ClassifierFitRandomForest ):
+  '''function ComputeModelFingerprint( ClassifierFitRandomForest ):
+  This function computes a fingerprint (SHA-1 hex digest)
+  of a fitted classifier, from its pickled bytes.
+
+  Args:
+    ClassifierFitRandomForest (sklearn.ensemble.ExtraTreesClassifier): Fitted classifier.
+  Returns:
+    str: Hex digest fingerprint of classifier.
+  '''
+  return hashlib.sha1( pickle.dumps( ClassifierFitRandomForest ) ).hexdigest()
+
+def WriteTileFingerprints( OutDir,ModelFingerprint,TileFingerprints ):
+  '''function WriteTileFingerprints( OutDir,ModelFingerprint,TileFingerprints ):
+  This function writes the fingerprints of the classifier and of the
+  input features of every tile (tile_fingerprints.json) next to the 
+  classification output, for use by the next change-aware run.
+
+  Args:
+    OutDir (str): Output directory.
+    ModelFingerprint (str): Fingerprint of classifier (see ComputeModelFingerprint()).
+    TileFingerprints (dict): Dictionary{} of tile fingerprints, keyed by window.
+  '''
+  FingerprintFileName = os.path.join( OutDir,'tile_fingerprints.json' )
+  with open( FingerprintFileName+'.tmp','w' ) as FingerprintFile:
+    json.dump( { 'model' : ModelFingerprint, 'tiles' : TileFingerprints },FingerprintFile )
+  os.replace( FingerprintFileName+'.tmp',FingerprintFileName )
+
+def OpenPreviousRun( PreviousRunDir,ImgDict,ModelFingerprint ):
+  '''function OpenPreviousRun( PreviousRunDir,ImgDict,ModelFingerprint ):
+  This function opens the output (classification Geotiff and tile 
+  fingerprints) of a previous change-aware run. Tiles of the previous 
+  output can only be re-used if it was classified with the same 
+  classifier, and on the same grid (dimensions and geotransform).
+
+  Args:
+    PreviousRunDir (str): Output directory of previous run.
+    ImgDict (dict): Dictionary{} containing imagery for vegetation classification.
+    ModelFingerprint (str): Fingerprint of current classifier (see ComputeModelFingerprint()).
+  Returns:
+    tuple: Dictionary{} of previous tile fingerprints, and GDAL dataset of previous output (or None).
+  '''
+  FingerprintFileName = os.path.join( PreviousRunDir,'tile_fingerprints.json' )
+  PreviousGeotiff     = os.path.join( PreviousRunDir,'vegetation_forest_classification.tif' )
+  if not os.path.isfile( FingerprintFileName ) or not os.path.isfile( PreviousGeotiff ):
+    print( 'WARNING: no previous change-aware run found in: ' , PreviousRunDir )
+    return ( {},None )
+
+  with open( FingerprintFileName,'r' ) as FingerprintFile:
+    PreviousFingerprints = json.load( FingerprintFile )
+  if PreviousFingerprints.get('model') != ModelFingerprint:
+    print( 'WARNING: classifier changed since previous run, classifying all tiles.' )
+    return ( {},None )
+
+  PreviousDataset  = gdal.Open( PreviousGeotiff )
+  ReferenceDataset = gdal.Open( ImgDict['pan'] )
+  if ( PreviousDataset.RasterXSize,PreviousDataset.RasterYSize,PreviousDataset.GetGeoTransform() ) != \
+     ( ReferenceDataset.RasterXSize,ReferenceDataset.RasterYSize,ReferenceDataset.GetGeoTransform() ):
+    print( 'WARNING: previous output is on a different grid, classifying all tiles.' )
+    return ( {},None )
+
+  return ( PreviousFingerprints.get('tiles',{}),PreviousDataset )
+
+def RandomForestClassification( ImgDict,CSV,OutDir,NTrees,TuningGrid=None,TileSize=None,Checkpoint=None,
+    ChangeTileSize=None,PreviousRunDir=None,EarlyExit=False,SelectFeatures=None,PipelineDepth=1,
+    TrainChunkRows=None,TrainJobs=-1,StatisticsOptions=None,Pyramid=None,MemoizeEntries=None,SaveModel=False ):
+  '''function RandomForestClassification( ImgDict,CSV,OutDir,NTrees,TuningGrid,TileSize,Checkpoint,
+    ChangeTileSize,PreviousRunDir,EarlyExit,SelectFeatures,PipelineDepth,TrainChunkRows,TrainJobs,
+    StatisticsOptions,Pyramid,MemoizeEntries,SaveModel ):
   This is the primary method for creating our final output Geotiff image 
   that contains our vegetation/forest classification. To this end, it does
   the following:
@@ -257,6 +1218,40 @@ def RandomForestClassification( ImgDict,CSV,OutDir,NTrees ):
     CSV (str): Name of CSV containing all relevant pixel value training data.
     OutDir (str): Output directory.
     NTrees (int): Number of trees for ExtraTreesClassifier() object. For classification.
+    TuningGrid (dict): Optional dict{} with keys 'ntrees','max_depth','folds','tolerance'.
+      If given, NTrees is ignored and the cheapest model within tolerance is used.
+    TileSize (int): Optional tile size. If given, the fitted classifier is saved and a 
+      tile job plan is exported for tile workers, instead of classifying here.
+    Checkpoint (dict): Optional checkpoint (see Checkpoint.OpenCheckpoint()). The fitted 
+      classifier and every completed strip are recorded, and re-used when resuming.
+    ChangeTileSize (int): Optional tile size for change-aware mode. If given, the image is 
+      classified in tiles, and tiles whose input features and classifier did not change 
+      since the previous run are copied from its output.
+    PreviousRunDir (str): Output directory of previous run (default: OutDir).
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+    SelectFeatures (float): Optional accuracy tolerance. If given, the smallest subset of 
+      variables within tolerance is selected (see SelectFeatureSubset()), written to 
+      SelectedFeatures.txt, and the model is fitted on those variables only.
+    PipelineDepth (int): Number of strips read ahead (and written behind) on I/O threads 
+      while a strip is classified (see RunStripPipeline()). 0 for no threads (default 1).
+    TrainChunkRows (int): Optional number of training rows per chunk. If given, the model is 
+      built out-of-core (see BuildRandomForestModelOutOfCore()), and tuning and feature 
+      selection (which need all training data in memory) are not used.
+    TrainJobs (int): Number of worker processes for out-of-core training (default -1, all cores).
+    StatisticsOptions (dict): Optional dict{} with keys 'grid' (grid cell size, pixels), 'zones' 
+      (zone raster or POLYGON shapefile) and 'zone_field'. If given, tree pixels, tree area and 
+      tree fraction per grid cell and/or zone are accumulated strip by strip while classifying, 
+      and written as CSV tables (see ForestStatistics.WriteForestStatistics()).
+    Pyramid (dict): Optional dict{} with keys 'block_size','confidence','check_pixels'. If given,
+      strips are classified coarse-to-fine (see ClassifyCoarseToFine()), and the fraction of 
+      pixels skipped and the agreement with full resolution (of checked pixels) are reported.
+    MemoizeEntries (int): Optional size of prediction cache. If given, the ensemble runs only 
+      once per distinct feature vector of a strip, and not for vectors among the MemoizeEntries 
+      most recently predicted (see PredictMemoized()). Same output; the hit rate is reported.
+    SaveModel (bool): Save the fitted classifier (ExtraTreesClassifier.pkl) even without tiles 
+      or checkpoint (i.e. to classify a time series with it, default False).
+  Returns:
+    str: Name of final classification Geotiff (or of tile job plan).
   '''
 
   # Open up panchromatic image file 
@@ -268,27 +1263,101 @@ def RandomForestClassification( ImgDict,CSV,OutDir,NTrees ):
   ds=None
   del ds
 
-  # create SEPARATE randomized pandas data-frames containing:
-  #   (1) 22 columns for spectral values (NDVI,SAVI,RGB,...) with data from input CSV
-  #   (2) 1 column for tree/nontree (woods/non-woods) 1 or 0 label with data from CSV
-  # ---------------------------------------------------------------------------------
-  ( TrainingSpectralValueDataframe,TrainingTreeValueDataframe ) = PrepareTrainingDataFromCSV( CSV )
+  # On resume, re-use the classifier that was fitted 
+  # (and saved) by a previous run.
+  # -------------------------------------------------
+  ModelFileName = os.path.join( OutDir,'ExtraTreesClassifier.pkl' )
+  ClassifierRandomForestFit = None
+  if GetCompletedStage( Checkpoint,'model' ) is not None:
+    ClassifierRandomForestFit = LoadRandomForestModel( ModelFileName )
+
+  if ClassifierRandomForestFit is None and TrainChunkRows is not None:
+
+    # Build model out-of-core, on random chunks 
+    # of the training data in worker processes
+    # -----------------------------------------
+    if TuningGrid is not None or SelectFeatures is not None:
+      print( 'WARNING: tuning and feature selection are not used with out-of-core training.' )
+    ClassifierRandomForestFit = BuildRandomForestModelOutOfCore( NTrees,CSV,OutDir,
+      TrainChunkRows,NJobs=TrainJobs )
+    if ClassifierRandomForestFit is None:
+      print( '  \n    No training data in: '+CSV )
+      return None
+    if TileSize is not None or Checkpoint is not None or SaveModel:
+      SaveRandomForestModel( ClassifierRandomForestFit,ModelFileName )
+      RecordStage( Checkpoint,'model',[ModelFileName] )
+
+  if ClassifierRandomForestFit is None:
+
+    # create SEPARATE randomized pandas data-frames containing:
+    #   (1) 22 columns for spectral values (NDVI,SAVI,RGB,...) with data from input CSV
+    #   (2) 1 column for tree/nontree (woods/non-woods) 1 or 0 label with data from CSV
+    # ---------------------------------------------------------------------------------
+    ( TrainingSpectralValueDataframe,TrainingTreeValueDataframe ) = PrepareTrainingDataFromCSV( CSV )
+
+    # If requested, select the smallest subset of variables that
+    # is within tolerance of all of them. Later runs can pass 
+    # SelectedFeatures.txt (--features) to only compute, store 
+    # and read the imagery for those variables.
+    # -----------------------------------------------------------
+    if SelectFeatures is not None:
+      SelectedFeatures = SelectFeatureSubset( 
+        TrainingSpectralValueDataframe,
+        TrainingTreeValueDataframe,
+        NTrees,
+        Tolerance=SelectFeatures
+      )
+      WriteFeatureList( os.path.join( OutDir,'SelectedFeatures.txt' ),SelectedFeatures )
+      TrainingSpectralValueDataframe = TrainingSpectralValueDataframe[SelectedFeatures]
   
-  # Create ExtraTreesClassifier() object from sklearn.ensemble
-  # using two input dataframes.
+    # Create ExtraTreesClassifier() object from sklearn.ensemble
+    # using two input dataframes. In tuning mode, the number of
+    # trees and maximum depth are chosen using OOB and k-fold 
+    # cross-validation scores and predicted inference cost.
+    # ----------------------------------------------------------
+
+    if TuningGrid is not None:
+      ClassifierRandomForestFit = TuneRandomForestModel( 
+        TrainingSpectralValueDataframe,
+        TrainingTreeValueDataframe,
+        TuningGrid['ntrees'],
+        TuningGrid['max_depth'],
+        TuningGrid['folds'],
+        TuningGrid['tolerance']
+      )['classifier']
+    else:
+      ClassifierRandomForestFit = BuildRandomForestModel( NTrees,
+        TrainingSpectralValueDataframe,
+        TrainingTreeValueDataframe
+      )
+
+    # Save the fitted classifier if it is needed by tile 
+    # workers, to resume an interrupted run, or by the caller
+    # -------------------------------------------------------
+    if TileSize is not None or Checkpoint is not None or SaveModel:
+      SaveRandomForestModel( ClassifierRandomForestFit,ModelFileName )
+      RecordStage( Checkpoint,'model',[ModelFileName] )
+
+  # If requested, export a tile job plan. Tiles are then 
+  # classified by worker processes (RunTileWorker()) and 
+  # assembled by MergeTileOutputs().
   # ----------------------------------------------------------
+  if TileSize is not None:
+    return ExportTileJobPlan( ImgDict,ModelFileName,OutDir,TileSize,EarlyExit,StatisticsOptions,MemoizeEntries )
 
-  ClassifierRandomForestFit = BuildRandomForestModel( NTrees,
-    TrainingSpectralValueDataframe,
-    TrainingTreeValueDataframe
-  )
+  # Only read the imagery of the variables the 
+  # classifier was fitted on (see --features).
+  # ------------------------------------------
+  ClassifierFeatures = GetClassifierFeatures( ClassifierRandomForestFit )
 
   # get a list of all rows ( 0 .. .. nrows-1 ) and 
   # divide it into 20 chunks ... hence we are cutting 
   # each file in our image dataset into strips. This is
   # so that the ReadPixelDataIntoRandomForestMode() 
   # function does not have to return ALL pixel values
-  # at once. This would cause a MemoryError.
+  # at once. This would cause a MemoryError. In 
+  # change-aware mode, the image is cut into square 
+  # tiles instead, so that unchanged areas are smaller.
   # ---------------------------------------------------
 
   if NROWS>3000: # pretty arbitrary ... 
@@ -296,64 +1365,177 @@ def RandomForestClassification( ImgDict,CSV,OutDir,NTrees ):
   else: 
     NStrips = 1
 
-  AllRowIndices = np.arange( 0,NROWS,step=1 )
-  RowChunks     = np.array_split( AllRowIndices, NStrips )
+  if ChangeTileSize is not None:
+    Windows = GetImageWindows( NROWS,NCOLS,ChangeTileSize )
+  else:
+    AllRowIndices = np.arange( 0,NROWS,step=1 )
+    RowChunks     = np.array_split( AllRowIndices, NStrips )
+    Windows       = [ [ int(RowChunk[0]),int(RowChunk[-1]+1),0,NCOLS ] for RowChunk in RowChunks ]
+
+  # In change-aware mode, fingerprints of the input features of 
+  # every tile (and of the classifier) are compared against those
+  # of a previous run. Tiles whose inputs and classifier did not 
+  # change are copied from the previous output.
+  # ------------------------------------------------------------
+  TileFingerprints,PreviousFingerprints,PreviousDataset = None,{},None
+  if ChangeTileSize is not None:
+    TileFingerprints = {}
+    ModelFingerprint = ComputeModelFingerprint( ClassifierRandomForestFit )
+    ( PreviousFingerprints,PreviousDataset ) = OpenPreviousRun( 
+      PreviousRunDir if PreviousRunDir is not None else OutDir,
+      ImgDict,ModelFingerprint )
+  NumReusedTiles = 0
+  PyramidReport  = { 'pixels':0,'skipped':0,'checked':0,'agreed':0 }
 
-  # Create empty list[] that will hold strips containing 
-  # our final classification (1s and 0s) of trees/nontrees
-  # (that is, vegetation/non-vegetation).
+  # Classified strips (1s and 0s) of trees/nontrees are 
+  # written straight into a partial output Geotiff, which 
+  # is moved into place once all strips are done. When 
+  # resuming, strips completed by a previous run (and 
+  # recorded in the checkpoint) are kept.
   # -------------------------------------------------------
-  ImageStrips = []
+  OutNameGeotiffClassified = os.path.join( 
+    OutDir, 'vegetation_forest_classification.tif' )
+  PartialGeotiffClassified = OutNameGeotiffClassified+'.partial'
+  if Checkpoint is not None and len(Checkpoint['strips'])>0 and \
+      os.path.isfile( PartialGeotiffClassified ):
+    OutputDataset = gdal.Open( PartialGeotiffClassified,gdal.GA_Update )
+  else:
+    ClearStrips( Checkpoint )
+    OutputDataset = CreateGeotiff( gdal.Open(ImgDict['pan']),PartialGeotiffClassified )
+  OutputBand = OutputDataset.GetRasterBand(1)
+  NumTreePixels = 0
 
-  for RowChunk in RowChunks:
+  # Forest statistics (per grid cell and/or zone) are 
+  # accumulated from every strip as it is written (or 
+  # kept from a previous run), so the output is not read again.
+  # -----------------------------------------------------------
+  if StatisticsOptions is not None:
+    Statistics = CreateForestStatistics( OutputDataset,StatisticsOptions.get('grid'),
+      StatisticsOptions.get('zones'),StatisticsOptions.get('zone_field') )
+  else:
+    Statistics = None
+  Cache = CreatePredictionCache( MemoizeEntries ) if MemoizeEntries is not None else None
+
+  # Skip strips that were completed by a previous run,
+  # and whose data (checksum) in partial output is intact
+  # -----------------------------------------------------
+  PendingWindows = []
+  for StartImageRow,EndImageRow,StartImageColumn,EndImageColumn in Windows:
+    StripKey = '%d:%d:%d:%d' % ( StartImageRow,EndImageRow,StartImageColumn,EndImageColumn )
+    if Checkpoint is not None and StripKey in Checkpoint['strips']:
+      ClassifiedDataStrip = np.asarray( OutputBand.ReadAsArray( StartImageColumn,StartImageRow,
+        EndImageColumn-StartImageColumn,EndImageRow-StartImageRow ), dtype=np.int8 )
+      if ComputeArrayChecksum( ClassifiedDataStrip ) == Checkpoint['strips'][StripKey]:
+        NumTreePixels += int( np.count_nonzero( ClassifiedDataStrip == 1 ) )
+        UpdateForestStatistics( Statistics,ClassifiedDataStrip,StartImageRow,StartImageColumn )
+        continue
+      print( 'WARNING: checksum mismatch, classifying strip again: ' , StripKey )
+    PendingWindows.append( [ StartImageRow,EndImageRow,StartImageColumn,EndImageColumn ] )
+
+  def ReadStrip( Window ):
 
-    # Getting starting and ending row for strip in which
-    # we will proceed with vegetation (forest) classification.
-    # --------------------------------------------------------
-    StartImageRow = RowChunk[  0  ]
-    EndImageRow   = RowChunk[ -1  ]+1
- 
     # Get dataframe containing variable names and spectral 
     # pixel values for image area or sub-strip
     # --------------------------------------------------------
-
-    DataFrameForImageStrip = ReadPixelDataIntoRandomForestModel(
+    StartImageRow,EndImageRow,StartImageColumn,EndImageColumn = Window
+    return ReadPixelDataIntoRandomForestModel(
       ImgDict,
       StartImageRow,
-      EndImageRow
+      EndImageRow,
+      StartImageColumn,
+      EndImageColumn,
+      ClassifierFeatures
     )
 
+  def ClassifyStrip( Window,DataFrameForImageStrip ):
+    nonlocal NumReusedTiles
+    StartImageRow,EndImageRow,StartImageColumn,EndImageColumn = Window
+    StripDims = ( EndImageRow-StartImageRow,EndImageColumn-StartImageColumn )
+    StripKey  = '%d:%d:%d:%d' % ( StartImageRow,EndImageRow,StartImageColumn,EndImageColumn )
+
+    # In change-aware mode, copy tile from previous output
+    # if its input features did not change.
+    # ----------------------------------------------------
+    if TileFingerprints is not None:
+      TileFingerprints[StripKey] = ComputeFeatureFingerprint( DataFrameForImageStrip )
+      if PreviousDataset is not None and PreviousFingerprints.get(StripKey) == TileFingerprints[StripKey]:
+        NumReusedTiles += 1
+        return np.asarray( PreviousDataset.GetRasterBand(1).ReadAsArray( 
+          StartImageColumn,StartImageRow,StripDims[1],StripDims[0] ), dtype=np.int8 )
+
     # Create classified strip of 1s and 0s for 
-    # vegetation/non-vegetation.
-    # ----------------------------------------
-    ClassifiedDataStrip = GetClassification(
+    # vegetation/non-vegetation. In pyramid mode, only
+    # mixed or boundary blocks are classified at full
+    # resolution.
+    # ------------------------------------------------
+    ( ClassifiedDataStrip,StripReport ) = ClassifyFeatures(
       DataFrameForImageStrip,
       ClassifierRandomForestFit,
-      (EndImageRow-StartImageRow,NCOLS)
+      StripDims,
+      EarlyExit,
+      Cache,
+      Pyramid,
+      StartImageRow*NCOLS+StartImageColumn
     )
+    if StripReport is not None:
+      for Key in PyramidReport: PyramidReport[Key] += StripReport[Key]
+    return ClassifiedDataStrip
 
-    # Append list[] containing image data strips (2D NumPy arrays)
-    # each of which contains 1s and 0s for final classification.
+  def WriteStrip( Window,ClassifiedDataStrip ):
+    nonlocal NumTreePixels
+    StartImageRow,EndImageRow,StartImageColumn,EndImageColumn = Window
+    StripKey = '%d:%d:%d:%d' % ( StartImageRow,EndImageRow,StartImageColumn,EndImageColumn )
+
+    # Write strip (2D NumPy array of 1s and 0s) to partial 
+    # output, flush it to disk, then record it as completed.
     # ------------------------------------------------------------
-    ImageStrips.append(ClassifiedDataStrip)
+    OutputBand.WriteArray( ClassifiedDataStrip,StartImageColumn,StartImageRow )
+    OutputDataset.FlushCache()
+    RecordStrip( Checkpoint,StripKey,ComputeArrayChecksum( ClassifiedDataStrip ) )
+    NumTreePixels += int( np.count_nonzero( ClassifiedDataStrip == 1 ) )
+    UpdateForestStatistics( Statistics,ClassifiedDataStrip,StartImageRow,StartImageColumn )
+
+  # Read, classify and write all remaining strips. With a
+  # pipeline depth, strips are read ahead and written behind
+  # on their own threads while the current strip is classified.
+  # -----------------------------------------------------------
+  RunStripPipeline( PendingWindows,ReadStrip,ClassifyStrip,WriteStrip,PipelineDepth )
 
-  # Concatenate all strips of data containing 1s and 0s 
-  # to form final image of classifiaction of vegetation 
+  # Close partial output and (atomically) move it into
+  # place as final classification Geotiff
   # ---------------------------------------------------
-  FinalForestVegetationClassification = np.concatenate( ImageStrips,axis=0 )
+  OutputBand,OutputDataset,PreviousDataset = None,None,None
+  os.replace( PartialGeotiffClassified,OutNameGeotiffClassified )
+  print( 'number of tree pixels: ' , str(NumTreePixels))
+  PrintPredictionCacheReport( Cache )
+  WriteForestStatistics( Statistics,OutDir )
 
-  locs = np.where( FinalForestVegetationClassification == 1 )
-  print( 'number of tree pixels: ' , str(locs[0].shape[0]))
+  # In change-aware mode, save fingerprints of this run 
+  # for the next one, and report how many tiles were re-used
+  # --------------------------------------------------------
+  if TileFingerprints is not None:
+    WriteTileFingerprints( OutDir,ModelFingerprint,TileFingerprints )
+    print( 'number of tiles re-used from previous run: ' , str(NumReusedTiles) ,
+      ' of ' , str(len(Windows)) )
 
-  # Write final classification to Geotiff
-  # -------------------------------------
-  OutNameGeotiffClassified = os.path.join( 
-    OutDir, 'vegetation_forest_classification.tif' )
-  WriteGeotiff( gdal.Open(ImgDict['pan']),
-    OutNameGeotiffClassified,FinalForestVegetationClassification ) 
+  # In pyramid mode, report the fraction of pixels taken from
+  # uniform blocks, and how many checked pixels agree with the 
+  # full-resolution classification
+  # ----------------------------------------------------------
+  if Pyramid is not None and PyramidReport['pixels']>0:
+    print( 'fraction of pixels skipped (uniform blocks): ' , 
+      '%.4f' % ( PyramidReport['skipped']/float(PyramidReport['pixels']) ) )
+    if PyramidReport['checked']>0:
+      SkippedAgreement = PyramidReport['agreed']/float(PyramidReport['checked'])
+      print( 'agreement with full resolution (skipped pixels): ' , '%.4f' % SkippedAgreement ,
+        ' (' , str(PyramidReport['checked']) , ' pixels checked)' )
+      print( 'estimated agreement with full resolution (all pixels): ' , '%.4f' % ( 1.0-
+        ( 1.0-SkippedAgreement )*PyramidReport['skipped']/float(PyramidReport['pixels']) ) )
 
   # Write PNG showing "quick look" of forest/woods/vegetation classification.
   # -------------------------------------------------------------------------
   OutNamePNG = os.path.join(
     OutDir,'vegetation_forest_classification.png')
-  WritePNG( OutNamePNG, FinalForestVegetationClassification ) 
+  WritePNG( OutNamePNG, gdal.Open( OutNameGeotiffClassified ).GetRasterBand(1).ReadAsArray() ) 
+  RecordStage( Checkpoint,'classification',[OutNameGeotiffClassified] )
+  return OutNameGeotiffClassified
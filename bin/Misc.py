@@ -1,63 +1,633 @@
 import os
+import re
+import time
+import fnmatch
 import subprocess
+import tracemalloc
+from contextlib import contextmanager
 import matplotlib.pyplot as plt
 import numpy as np
-from osgeo import osr,gdal,gdalconst
+from osgeo import osr,gdal,gdalconst,gdal_array
 from matplotlib.pylab import *
 
-def ResampleImage( SourceImageFilename, SourceDataset, DestinationDataset, OutFileName, Interp ):
-  '''function resample( srcImageFilename,sourceDataset,dstDataset,outname,interp):
-  This function resamples a low-resolution multispectral Geotiff to larger 
-  dimensions by means of the "interp" method (i.e. gdalconst.GRA_Cubic) passed
-  into this function. Ultimately, this function resamples or resizes the  
-  multispectral geotiff dataset, referred to by "sourceDataset" (and srcImageFilename)
-  to the same dimensions as the panchromatic Geotiff image Geotiff file by 
-  means of an interpolation method (i.e. bicubic resampling). 
+# Column names (as in the training points CSV) of the 22 
+# variables used for vegetation classification, in order, 
+# and the keys of their imagery in the imagery dictionary{}.
+# ----------------------------------------------------------
+FeatureImageryKeys = [
+  ('NDVI','ndvi'), ('Pan','pan'), ('R','red'), ('G','green'), ('B','blue'), ('NIR','nir'),
+  ('SAVI01','savi01'), ('SAVI02','savi02'), ('SAVI03','savi03'), ('SAVI04','savi04'),
+  ('SAVI05','savi05'), ('SAVI06','savi06'), ('SAVI07','savi07'), ('SAVI08','savi08'),
+  ('SAVI09','savi09'), ('SAVI10','savi10'),
+  ('Background_Red','bg_red'), ('Background_Green','bg_green'), ('Background_Blue','bg_blue'),
+  ('Background_NIR','bg_nir'), ('Background_Pan','bg_pan'), ('Background_NDVI','bg_ndvi')
+]
+
+# Quantized storage (see --quantize) of derived index imagery 
+# (NDVI,SAVI,Background NDVI): int16 with a scale of 1/10000,
+# i.e. -3.2767 ... 3.2767 (NDVI lies in [-1,1], SAVI in [-2,2]).
+# The smallest int16 value is kept as NoData (np.nan).
+# -------------------------------------------------------------
+QuantizationIndex = ( gdal.GDT_Int16,0.0001,0.0 )
+QuantizationNoData = { gdal.GDT_Int16:-32768 }
+
+def GetBandQuantization( DataArray,InputDataType ):
+  '''function GetBandQuantization( DataArray,InputDataType ):
+  This function returns the quantization (see WriteGeotiff()) to store
+  imagery derived from input bands (i.e. "background" imagery) in 
+  the bit depth of the input bands: the smallest of Byte, UInt16 or 
+  Int16 that holds the range of the data, without scale or offset.
+  Input bands of floating-point type are not quantized.
 
   Args:
-    SourceImageFilename (str): source (low-res.) multispectral Geotiff filename. 
-    sourceDataset (osgeo.gdal.Dataset): input multispectral GDAL dataset object.
-    dstDataset (osgeo.gdal.Dataset): destination (high-res.) panchromatic dataset object. 
-    outname (str): name of outputted resampled Geotiff
-    interp (int): GDAL interpolation method (i.e. gdalconst.GRA_Cubic) 
+    DataArray (numpy.ndarray): 2D NumPy array to be written.
+    InputDataType (int): GDAL data type of input bands (i.e. gdal.GDT_UInt16).
   Returns:
-    str: Name of resmapled image filename.
+    tuple: Quantization (GDAL data type,scale,offset), or None for float32.
   '''
+  if InputDataType not in ( gdal.GDT_Byte,gdal.GDT_UInt16,gdal.GDT_Int16,gdal.GDT_UInt32,gdal.GDT_Int32 ):
+    return None
+  MinValue,MaxValue = float(np.nanmin( DataArray )),float(np.nanmax( DataArray ))
+  for DataType,LowValue,HighValue in [ ( gdal.GDT_Byte,0,255 ),( gdal.GDT_UInt16,0,65535 ),
+      ( gdal.GDT_Int16,-32767,32767 ) ]:
+    if MinValue >= LowValue-0.5 and MaxValue <= HighValue+0.5:
+      return ( DataType,1.0,0.0 )
+  return None
 
-  # If output File dataset already exists, then remove it 
-  # from disk 
-  # --------------------------------------------------------
-  if os.path.isfile( OutFileName ):
-    os.remove( OutFileName )
+def QuantizeArray( DataArray,Quantization ):
+  '''function QuantizeArray( DataArray,Quantization ):
+  This function converts an array to integers: (value-offset)/scale,
+  rounded to the nearest integer and clipped to the range of the 
+  data type. NaN becomes the NoData value of the data type.
+
+  Args:
+    DataArray (numpy.ndarray): 2D NumPy array (float).
+    Quantization (tuple): GDAL data type, scale and offset.
+  Returns:
+    numpy.ndarray: 2D NumPy array of integers.
+  '''
+  DataType,Scale,Offset = Quantization
+  NumericType = np.dtype( gdal_array.GDALTypeCodeToNumericTypeCode( DataType ) )
+  NoData      = QuantizationNoData.get( DataType )
+  LowValue    = np.iinfo(NumericType).min+( 1 if NoData is not None else 0 )
+  QuantizedArray = np.asarray( DataArray,dtype=np.float32 )-np.float32(Offset)
+  QuantizedArray /= np.float32(Scale)
+  np.rint( QuantizedArray,out=QuantizedArray )
+  IsNaN = np.isnan( QuantizedArray )
+  np.clip( QuantizedArray,LowValue,np.iinfo(NumericType).max,out=QuantizedArray )
+  QuantizedArray[IsNaN] = 0
+  QuantizedArray = QuantizedArray.astype( NumericType )
+  if NoData is not None: QuantizedArray[IsNaN] = NoData
+  return QuantizedArray
+
+def RestoreQuantizedArray( QuantizedArray,Quantization ):
+  '''function RestoreQuantizedArray( QuantizedArray,Quantization ):
+  This function undoes QuantizeArray() as ReadBandArray() does for a
+  band written with that quantization (see WriteGeotiff()): without
+  scale and offset, integers are returned as stored; otherwise, as
+  float32 (value*scale+offset), with NoData as np.nan.
+
+  Args:
+    QuantizedArray (numpy.ndarray): 2D NumPy array of integers (see QuantizeArray()).
+    Quantization (tuple): GDAL data type, scale and offset.
+  Returns:
+    numpy.ndarray: 2D NumPy array of pixel values.
+  '''
+  DataType,Scale,Offset = Quantization
+  if Scale == 1.0 and Offset == 0.0:
+    return QuantizedArray
+  NoData = QuantizationNoData.get( DataType )
+  DataArray = QuantizedArray.astype( np.float32 )
+  if Scale != 1.0: DataArray *= np.float32(Scale)
+  if Offset != 0.0: DataArray += np.float32(Offset)
+  if NoData is not None: DataArray[QuantizedArray == NoData] = np.nan
+  return DataArray
+
+def ReadBandArray( Band,StartColumn=0,StartRow=0,NCols=None,NRows=None ):
+  '''function ReadBandArray( Band,StartColumn,StartRow,NCols,NRows ):
+  This function reads a window of a raster band, undoing quantization
+  (see WriteGeotiff()): if the band has a scale or offset, values are
+  returned as float32 (value*scale+offset), with NoData as np.nan.
+  Bands without scale and offset are returned as stored.
+
+  Args:
+    Band (osgeo.gdal.Band): GDAL raster band.
+    StartColumn (int): Start column (default 0).
+    StartRow (int): Start row (default 0).
+    NCols (int): Number of columns (default None, to last column).
+    NRows (int): Number of rows (default None, to last row).
+  Returns:
+    numpy.ndarray: 2D NumPy array of pixel values.
+  '''
+  if NCols is None: NCols = Band.XSize-StartColumn
+  if NRows is None: NRows = Band.YSize-StartRow
+  DataArray = Band.ReadAsArray( int(StartColumn),int(StartRow),int(NCols),int(NRows) )
+  Scale,Offset = Band.GetScale(),Band.GetOffset()
+  if Scale in ( None,1.0 ) and Offset in ( None,0.0 ):
+    return DataArray
+  NoData = Band.GetNoDataValue()
+  IsNoData = ( DataArray == NoData ) if NoData is not None else None
+  DataArray = DataArray.astype( np.float32 )
+  if Scale not in ( None,1.0 ): DataArray *= np.float32(Scale)
+  if Offset not in ( None,0.0 ): DataArray += np.float32(Offset)
+  if IsNoData is not None: DataArray[IsNoData] = np.nan
+  return DataArray
 
-  # Get source (i.e. source or low-resolution) image 
-  # projection, geotransfrom, and number of bands
-  # --------------------------------------------------------
-  SourceProjection        = SourceDataset.GetProjection()
-  SourceGeotransform      = SourceDataset.GetGeoTransform()
-  SourceNumRasters        = SourceDataset.RasterCount
+# "Background" imagery at further scales (see --background-sigmas)
+# is held under the names and keys of the 6 "background" variables
+# with the sigma appended (i.e. "Background_NDVI_S20","bg_ndvi_s20").
+# Sigma 5 is the "background" imagery above (no suffix).
+# ------------------------------------------------------------------
+BackgroundSigma = 5
+BackgroundImageryKeys = [ ( VariableName,ImageryKey ) for VariableName,ImageryKey in FeatureImageryKeys
+  if ImageryKey.startswith('bg_') ]
 
-  # Get Projection and Geotransform for "destination" image
-  # --------------------------------------------------------
+def GetBackgroundImageryKey( VariableName,ImageryKey,Sigma ):
+  '''function GetBackgroundImageryKey( VariableName,ImageryKey,Sigma ):
+  This function returns the variable name and imagery key of a
+  "background" variable (i.e. "Background_NDVI") at a given sigma.
+
+  Args:
+    VariableName (str): Name of "background" variable, as in FeatureImageryKeys.
+    ImageryKey (str): Imagery key of "background" variable, as in FeatureImageryKeys.
+    Sigma (int): Sigma (pixels) of Gaussian filter.
+  Returns:
+    tuple: Variable name and imagery key (i.e. "Background_NDVI_S20","bg_ndvi_s20").
+  '''
+  if Sigma == BackgroundSigma: return ( VariableName,ImageryKey )
+  return ( VariableName+'_S%d' % Sigma,ImageryKey+'_s%d' % Sigma )
+
+def IsFeatureSelected( Features, VariableName ):
+  '''function IsFeatureSelected( Features, VariableName ):
+  This function checks whether a variable (i.e. "SAVI03") is part 
+  of a selected subset of variables. If no subset was selected
+  (Features is None), all variables are used.
+
+  Args:
+    Features (list): List[] of selected variable names, or None for all variables.
+    VariableName (str): Variable (column) name, as in FeatureImageryKeys.
+  Returns:
+    bool: True if variable is used.
+  '''
+  return Features is None or VariableName in Features
+
+def GetFeatureImageryKeys( ImgDict,Features=None ):
+  '''function GetFeatureImageryKeys( ImgDict,Features ):
+  This function returns the (column name,imagery key) pairs from
+  FeatureImageryKeys for those variables that are selected and
+  whose imagery is held in the imagery dict{}, in canonical order,
+  followed by those of "background" imagery at further scales (by
+  increasing sigma, see GetBackgroundImageryKey()).
+
+  Args:
+    ImgDict (dict): Python dictionary{} with all satellite imagery (NDVI,RGB,Pan,SAVI,...)
+    Features (list): Optional list[] of selected variable names (default None, all).
+  Returns:
+    list: List[] of (column name,imagery key) tuples.
+  '''
+  Sigmas = sorted( set( int(Match.group(1)) for Match in 
+    [ re.match( r'^bg_[a-z]+_s(\d+)$',ImageryKey ) for ImageryKey in ImgDict ] if Match ) )
+  ScaleKeys = [ GetBackgroundImageryKey( VariableName,ImageryKey,Sigma ) for Sigma in Sigmas
+    for VariableName,ImageryKey in BackgroundImageryKeys ]
+  return [ ( VariableName,ImageryKey ) for VariableName,ImageryKey in FeatureImageryKeys+ScaleKeys
+    if ImageryKey in ImgDict and IsFeatureSelected( Features,VariableName ) ]
+
+def WriteFeatureList( OutFileName,Features ):
+  '''function WriteFeatureList( OutFileName,Features ):
+  This function writes a list of selected variable names
+  to a text file, one name per line (see ReadFeatureList()).
+
+  Args:
+    OutFileName (str): Name of output text file.
+    Features (list): List[] of selected variable names.
+  '''
+  with open( OutFileName,'w' ) as FeatureFile:
+    for VariableName in Features:
+      FeatureFile.write( '%s\n' % VariableName )
+
+def ReadFeatureList( FeatureArgument ):
+  '''function ReadFeatureList( FeatureArgument ):
+  This function reads a list of selected variable names, either
+  from a text file (one name per line, see WriteFeatureList()) or 
+  from a comma-separated string (i.e. "NDVI,SAVI05,Background_NDVI").
+
+  Args:
+    FeatureArgument (str): Name of text file, or comma-separated variable names.
+  Returns:
+    list: List[] of selected variable names, or None if any name is unknown.
+  '''
+  if os.path.isfile( FeatureArgument ):
+    with open( FeatureArgument,'r' ) as FeatureFile:
+      Features = [ Line.strip() for Line in FeatureFile if Line.strip() ]
+  else:
+    Features = [ Name.strip() for Name in FeatureArgument.split(',') if Name.strip() ]
+  VariableNames = [ VariableName for VariableName,ImageryKey in FeatureImageryKeys ]
+  for VariableName in Features:
+    if VariableName not in VariableNames and \
+        not re.match( r'^Background_(Red|Green|Blue|NIR|Pan|NDVI)_S\d+$',VariableName ):
+      print('  \n    Unknown variable: '+VariableName+' (use one of '+','.join(VariableNames)+')')
+      return None
+  if len( Features ) == 0: return None
+  return Features
+
+def ResampleImage( SourceImageFilename, SourceDataset, DestinationDataset, OutFileName, Interp,
+    NumThreads='ALL_CPUS', WarpMemoryMB=512 ):
+  '''function ResampleImage( SourceImageFilename,SourceDataset,DestinationDataset,OutFileName,Interp,
+    NumThreads,WarpMemoryMB ):
+  This function resamples an image (i.e. a high-resolution panchromatic 
+  band) to the grid (dimensions, geotransform and projection) of a 
+  destination dataset (i.e. the multispectral imagery) by means of the 
+  "Interp" method (i.e. gdalconst.GRA_NearestNeighbour, or GRA_Average 
+  and GRA_Mode for downsampling). It uses GDAL's warper (gdal.Warp), 
+  which processes the image in chunks of at most WarpMemoryMB of working
+  memory on NumThreads threads, and writes a tiled Float32 Geotiff (with
+  the options of the active write profile, see SetWriteProfile()). The
+  output may replace the source image file (it is written under a 
+  temporary name, then moved into place). The output dataset is 
+  returned open, instead of its full array.
+
+  Args:
+    SourceImageFilename (str): source image filename. 
+    SourceDataset (osgeo.gdal.Dataset): source GDAL dataset object.
+    DestinationDataset (osgeo.gdal.Dataset): dataset whose grid to resample to. 
+    OutFileName (str): name of outputted resampled Geotiff
+    Interp (int): GDAL interpolation method (i.e. gdalconst.GRA_Average) 
+    NumThreads (str): Number of warper threads (default "ALL_CPUS").
+    WarpMemoryMB (int): Working memory of warper in MB (default 512).
+  Returns:
+    tuple: Name of resampled image filename, and its (open) GDAL dataset.
+  '''
+
+  # Get Projection, Geotransform and dimensions for 
+  # "destination" image
+  # ------------------------------------------------
   DestinationProjection   = DestinationDataset.GetProjection()
   DestinationGeotransform = DestinationDataset.GetGeoTransform()
   DestinationNRows        = DestinationDataset.RasterYSize
   DestinationNCols        = DestinationDataset.RasterXSize
 
-  # remove output file if it already exists 
-  # ---------------------------------------
-  DestinationDataset = gdal.GetDriverByName('GTiff').Create( 
-    OutFileName, DestinationNCols,DestinationNRows,SourceNumRasters,gdalconst.GDT_Float32)
-  DestinationDataset.SetGeoTransform(DestinationGeotransform)
-  DestinationDataset.SetProjection(DestinationProjection)
-  
-  gdal.ReprojectImage(SourceDataset, 
-    DestinationDataset, SourceProjection, SourceProjection,Interp)
-  dst_ds=None
-  del dst_ds
-  
-  Pan = DestinationDataset.GetRasterBand(1).ReadAsArray()
-  return ( OutFileName, Pan ) 
+  # Warp source image onto destination grid. If the source has
+  # no projection, it is assumed to be in the destination's.
+  # ----------------------------------------------------------
+  TempFileName = OutFileName+'.tmp'
+  if os.path.isfile( TempFileName ):
+    os.remove( TempFileName )
+  ResampledDataset = gdal.Warp( TempFileName, SourceDataset, format='GTiff',
+    width=DestinationNCols, height=DestinationNRows,
+    outputBounds=( DestinationGeotransform[0], 
+      DestinationGeotransform[3]+DestinationGeotransform[5]*DestinationNRows,
+      DestinationGeotransform[0]+DestinationGeotransform[1]*DestinationNCols, 
+      DestinationGeotransform[3] ),
+    srcSRS=SourceDataset.GetProjection() or DestinationProjection,
+    dstSRS=DestinationProjection,
+    resampleAlg=Interp,
+    outputType=gdalconst.GDT_Float32,
+    multithread=True,
+    warpMemoryLimit=WarpMemoryMB*1048576.0,
+    warpOptions=[ 'NUM_THREADS='+str(NumThreads) ],
+    creationOptions=GetCreationOptions( gdalconst.GDT_Float32,[ 'TILED=YES','BIGTIFF=IF_SAFER' ] ) )
+  if ResampledDataset is None:
+    return ( None, None )
+  ResampledDataset = None
+  os.replace( TempFileName, OutFileName )
+  return ( OutFileName, gdal.Open( OutFileName ) ) 
+
+def CreateVirtualDataset( SourceImageFilename, OutFileName, ReferenceDataset=None, Interp=gdalconst.GRA_NearestNeighbour ):
+  '''function CreateVirtualDataset( SourceImageFilename,OutFileName,ReferenceDataset,Interp ):
+  This function creates a virtual dataset (GDAL VRT, a small XML file)
+  that refers to an input image file, instead of copying its pixel 
+  data. If a reference dataset is passed-in, the VRT also resamples 
+  (warps) the input image on-the-fly to the grid (dimensions, 
+  geotransform and projection) of the reference dataset, by means 
+  of the interpolation method "Interp". Pixel values are read from 
+  the input image file whenever the VRT is read.
+
+  Args:
+    SourceImageFilename (str): Input image filename (i.e. JPEG2000/Geotiff).
+    OutFileName (str): Name of output VRT (.vrt extension).
+    ReferenceDataset (osgeo.gdal.Dataset): Optional dataset whose grid to resample to.
+    Interp (int): GDAL interpolation method (default gdalconst.GRA_NearestNeighbour).
+  Returns:
+    str: Name of VRT, or None if it could not be created.
+  '''
+  if os.path.isfile( OutFileName ):
+    os.remove( OutFileName )
+
+  # Refer to input by its absolute path, so that 
+  # the VRT can be read from any working directory
+  # -----------------------------------------------
+  SourceImageFilename = os.path.abspath( SourceImageFilename )
+  if ReferenceDataset is None:
+    VirtualDataset = gdal.Translate( OutFileName, SourceImageFilename, format='VRT' )
+  else:
+    Geotransform = ReferenceDataset.GetGeoTransform()
+    NRows,NCols  = ReferenceDataset.RasterYSize,ReferenceDataset.RasterXSize
+    VirtualDataset = gdal.Warp( OutFileName, SourceImageFilename, format='VRT',
+      width=NCols, height=NRows,
+      outputBounds=( Geotransform[0], Geotransform[3]+Geotransform[5]*NRows,
+        Geotransform[0]+Geotransform[1]*NCols, Geotransform[3] ),
+      dstSRS=ReferenceDataset.GetProjection(),
+      resampleAlg=Interp )
+  if VirtualDataset is None:
+    return None
+  VirtualDataset = None
+  return OutFileName
+
+def ReadSceneList( SceneListFileName ):
+  '''function ReadSceneList( SceneListFileName ):
+  This function reads a list of scenes (for mosaic mode) from a text
+  file, one scene per line: the Red, Green, Blue and NIR (and, 
+  optionally, Panchromatic) image filenames, separated by commas. 
+  Relative filenames are relative to the directory of the list. 
+  Empty lines and lines starting with "#" are skipped.
+
+  Args:
+    SceneListFileName (str): Name of text file listing scenes.
+  Returns:
+    list: List[] of scenes, each a list[] of 4 or 5 filenames, or None if invalid.
+  '''
+  ListDirectory = os.path.dirname( os.path.abspath( SceneListFileName ) )
+  Scenes = []
+  with open( SceneListFileName,'r' ) as SceneListFile:
+    for Line in SceneListFile:
+      if Line.strip() == '' or Line.strip().startswith('#'): continue
+      FileNames = [ os.path.join( ListDirectory,FileName.strip() ) for FileName in Line.split(',') ]
+      if len(FileNames) not in (4,5):
+        print('  \n    Scene should list Red,Green,Blue,NIR[,Pan] filenames: '+Line.strip())
+        return None
+      for FileName in FileNames:
+        if not os.path.isfile( FileName ):
+          print('  \n    Not an existing file: '+FileName)
+          return None
+      Scenes.append( FileNames )
+  if len(Scenes) == 0 or len( set( len(FileNames) for FileNames in Scenes ) ) > 1:
+    print('  \n    Scene list should hold scenes, all with (or all without) Panchromatic band.')
+    return None
+  return Scenes
+
+def CreateMosaic( SourceImageFilenames, OutFileName, OverlapRule='last', NoDataValue=None ):
+  '''function CreateMosaic( SourceImageFilenames, OutFileName, OverlapRule, NoDataValue ):
+  This function combines one band of several (adjacent or overlapping)
+  scenes into a virtual mosaic (VRT) on one grid, which covers all 
+  scenes at the highest resolution among them. No pixel data is 
+  copied. Where scenes overlap, the pixel of the first or of the last 
+  scene in the list is used (OverlapRule "first" or "last"), except 
+  where that pixel is NoData. All scenes must be in the same projection.
+
+  Args:
+    SourceImageFilenames (list): List[] of image filenames (one band of each scene).
+    OutFileName (str): Name of output virtual dataset (.vrt).
+    OverlapRule (str): "first" or "last" scene wins in overlaps (default "last").
+    NoDataValue (float): Optional NoData value of scenes (default None).
+  Returns:
+    str: Name of virtual mosaic, or None if it could not be created.
+  '''
+  SourceImageFilenames = [ os.path.abspath( FileName ) for FileName in SourceImageFilenames ]
+
+  # Make sure all scenes are in the same projection
+  # ------------------------------------------------
+  Projections = []
+  for FileName in SourceImageFilenames:
+    SourceDataset = gdal.Open( FileName )
+    if SourceDataset is None:
+      print('  \n    Not a valid GDAL image (raster) dataset or file: '+FileName)
+      return None
+    Projection = osr.SpatialReference( wkt=SourceDataset.GetProjectionRef() )
+    if len(Projections)>0 and not Projection.IsSame( Projections[0] ):
+      print('  \n    Scenes are in different projections (reproject first): '+FileName)
+      return None
+    Projections.append( Projection )
+
+  # Later sources take priority in a VRT, so for the
+  # "first" rule the list of scenes is reversed.
+  # -------------------------------------------------
+  if OverlapRule == 'first':
+    SourceImageFilenames = SourceImageFilenames[::-1]
+  if os.path.isfile( OutFileName ): os.remove( OutFileName )
+  MosaicDataset = gdal.BuildVRT( OutFileName, SourceImageFilenames, resolution='highest',
+    srcNodata=NoDataValue, VRTNodata=NoDataValue )
+  if MosaicDataset is None:
+    return None
+  MosaicDataset = None
+  return OutFileName
+
+# Sensor profiles (see --sensor): where the Red,Green,Blue and NIR
+# bands (and a Panchromatic band, if any) are found in a multi-band 
+# stack ('bands' by index, or 'names' matched with band descriptions)
+# or in a product directory ('files', filename patterns, first match).
+# The bands are held, in SensorStackKeys order, in one 4-band stack 
+# (see CreateSensorStack()), so that a window of all four is read at
+# once (see ReadSensorStack()).
+# -------------------------------------------------------------------
+SensorStackKeys = [ 'red','green','blue','nir' ]
+SensorProfiles = {
+  'stack'     : { 'bands' : [1,2,3,4], 'names' : None, 'files' : None, 'pan' : None },
+  'sentinel2' : { 'bands' : [4,3,2,8], 'names' : [ 'B4','B3','B2','B8' ],
+                  'files' : [ [ '*_B04_10m.jp2','*_B04.jp2' ],[ '*_B03_10m.jp2','*_B03.jp2' ],
+                              [ '*_B02_10m.jp2','*_B02.jp2' ],[ '*_B08_10m.jp2','*_B08.jp2' ] ],
+                  'pan'   : None },
+  'landsat8'  : { 'bands' : [4,3,2,5], 'names' : [ 'B4','B3','B2','B5' ],
+                  'files' : [ [ '*_B4.tif' ],[ '*_B3.tif' ],[ '*_B2.tif' ],[ '*_B5.tif' ] ],
+                  'pan'   : [ '*_B8.tif' ] },
+  'landsat7'  : { 'bands' : [3,2,1,4], 'names' : [ 'B3','B2','B1','B4' ],
+                  'files' : [ [ '*_B3.tif' ],[ '*_B2.tif' ],[ '*_B1.tif' ],[ '*_B4.tif' ] ],
+                  'pan'   : [ '*_B8.tif' ] }
+}
+
+def FindSensorFile( ProductDirectory,Patterns ):
+  '''function FindSensorFile( ProductDirectory,Patterns ):
+  This function returns the first file (in sorted order) anywhere
+  in a product directory whose name matches one of the filename 
+  patterns (case-insensitive), trying the patterns in order.
+
+  Args:
+    ProductDirectory (str): Product directory (i.e. Sentinel-2 .SAFE).
+    Patterns (list): List[] of filename patterns (i.e. "*_B04_10m.jp2").
+  Returns:
+    str: Name of matching file, or None if no file matches.
+  '''
+  FileNames = sorted( os.path.join( Directory,FileName ) 
+    for Directory,SubDirectories,FileNames in os.walk( ProductDirectory ) for FileName in FileNames )
+  for Pattern in Patterns:
+    for FileName in FileNames:
+      if fnmatch.fnmatch( os.path.basename( FileName ).lower(),Pattern.lower() ):
+        return FileName
+  return None
+
+def OpenSensorInput( InputName,ProfileName ):
+  '''function OpenSensorInput( InputName,ProfileName ):
+  This function finds the Red,Green,Blue and NIR bands (and the
+  Panchromatic band, if the sensor has one) of a multi-band stack
+  or of a product directory, following a sensor profile (see 
+  SensorProfiles). In a stack, bands are matched by description 
+  (i.e. "B4" or "B04") where the profile names them, else by index.
+
+  Args:
+    InputName (str): Multi-band image filename, or product directory.
+    ProfileName (str): Name of sensor profile (i.e. "sentinel2").
+  Returns:
+    dict: Dictionary{} of 'sources' (filename,band) in SensorStackKeys order and 'pan' filename, or None.
+  '''
+  Profile = SensorProfiles[ProfileName]
+  if os.path.isdir( InputName ):
+    if Profile['files'] is None:
+      print('  \n    Sensor profile '+ProfileName+' needs a multi-band image, not a directory.')
+      return None
+    Sources = []
+    for Key,Patterns in zip( SensorStackKeys,Profile['files'] ):
+      FileName = FindSensorFile( InputName,Patterns )
+      if FileName is None:
+        print('  \n    No '+Key+' band ('+','.join(Patterns)+') in: '+InputName)
+        return None
+      Sources.append( ( FileName,1 ) )
+    PanFileName = FindSensorFile( InputName,Profile['pan'] ) if Profile['pan'] else None
+    return { 'sources' : Sources, 'pan' : PanFileName or '' }
+
+  StackDataset = gdal.Open( InputName )
+  if StackDataset is None:
+    print('  \n    Not a valid GDAL image (raster) dataset or file: '+InputName)
+    return None
+  Descriptions = {}
+  for BandIndex in range( 1,StackDataset.RasterCount+1 ):
+    Match = re.search( r'B0*(\d+A?)$',StackDataset.GetRasterBand(BandIndex).GetDescription().split(',')[0].strip().upper() )
+    if Match: Descriptions[ 'B'+Match.group(1) ] = BandIndex
+  Sources = []
+  for Position,BandIndex in enumerate( Profile['bands'] ):
+    if Profile['names'] is not None and Profile['names'][Position] in Descriptions:
+      BandIndex = Descriptions[ Profile['names'][Position] ]
+    if BandIndex > StackDataset.RasterCount:
+      print('  \n    No band '+str(BandIndex)+' ('+SensorStackKeys[Position]+') in: '+InputName)
+      return None
+    Sources.append( ( os.path.abspath( InputName ),BandIndex ) )
+  return { 'sources' : Sources, 'pan' : '' }
+
+def CreateSensorStack( SensorInput,OutFileName ):
+  '''function CreateSensorStack( SensorInput,OutFileName ):
+  This function creates a virtual 4-band stack (VRT) of the Red,
+  Green,Blue and NIR bands found by OpenSensorInput(), in that order,
+  referring to (not copying) the input bands. Bands of one multi-band
+  image are selected from it; files of a product directory are 
+  stacked on one grid, at the highest resolution among them.
+
+  Args:
+    SensorInput (dict): Bands of sensor input (see OpenSensorInput()).
+    OutFileName (str): Name of output virtual dataset (.vrt).
+  Returns:
+    str: Name of virtual stack, or None if it could not be created.
+  '''
+  if os.path.isfile( OutFileName ): os.remove( OutFileName )
+  FileNames = [ FileName for FileName,BandIndex in SensorInput['sources'] ]
+  if len( set( FileNames ) ) == 1:
+    StackDataset = gdal.Translate( OutFileName,FileNames[0],format='VRT',
+      bandList=[ BandIndex for FileName,BandIndex in SensorInput['sources'] ] )
+  else:
+    StackDataset = gdal.BuildVRT( OutFileName,[ os.path.abspath( FileName ) for FileName in FileNames ],
+      separate=True,resolution='highest' )
+  if StackDataset is None:
+    return None
+  StackDataset = None
+  return OutFileName
+
+def CreateSensorBandDatasets( StackFileName,OutputDirectory,Prefix='Sensor' ):
+  '''function CreateSensorBandDatasets( StackFileName,OutputDirectory,Prefix ):
+  This function creates one single-band virtual dataset per band of 
+  a sensor stack (see CreateSensorStack()): SensorRed.vrt, SensorGreen.vrt,
+  SensorBlue.vrt and SensorNIR.vrt (for the default prefix), so that 
+  each band can be used wherever a band image filename is expected.
+
+  Args:
+    StackFileName (str): Name of 4-band sensor stack.
+    OutputDirectory (str): Output directory.
+    Prefix (str): Prefix of output filenames (default "Sensor").
+  Returns:
+    list: List[] of Red,Green,Blue,NIR filenames, or None on failure.
+  '''
+  OutFileNames = []
+  for BandIndex,BandName in enumerate( [ 'Red','Green','Blue','NIR' ] ):
+    OutFileName = os.path.join( OutputDirectory,Prefix+BandName+'.vrt' )
+    if os.path.isfile( OutFileName ): os.remove( OutFileName )
+    BandDataset = gdal.Translate( OutFileName,os.path.abspath( StackFileName ),format='VRT',bandList=[BandIndex+1] )
+    if BandDataset is None:
+      return None
+    BandDataset = None
+    OutFileNames.append( OutFileName )
+  return OutFileNames
+
+def ReadSensorStack( StackDataset,StartColumn=0,StartRow=0,NCols=None,NRows=None,BufferType=None ):
+  '''function ReadSensorStack( StackDataset,StartColumn,StartRow,NCols,NRows,BufferType ):
+  This function reads a window of all bands of a sensor stack (see
+  CreateSensorStack()) in a single (interleaved) read, instead of 
+  one read per band, and returns the bands by their imagery keys.
+  Quantization is undone as in ReadBandArray().
+
+  Args:
+    StackDataset (osgeo.gdal.Dataset): GDAL dataset of 4-band sensor stack.
+    StartColumn (int): Start column (default 0).
+    StartRow (int): Start row (default 0).
+    NCols (int): Number of columns (default None, to last column).
+    NRows (int): Number of rows (default None, to last row).
+    BufferType (int): Optional GDAL data type to read as (i.e. gdal.GDT_Float32).
+  Returns:
+    dict: Dictionary{} of 2D NumPy arrays, keyed as in SensorStackKeys.
+  '''
+  if NCols is None: NCols = StackDataset.RasterXSize-StartColumn
+  if NRows is None: NRows = StackDataset.RasterYSize-StartRow
+  DataArray = StackDataset.ReadAsArray( int(StartColumn),int(StartRow),int(NCols),int(NRows),
+    buf_type=BufferType,band_list=list( range( 1,len(SensorStackKeys)+1 ) ) )
+  Bands = {}
+  for BandIndex,Key in enumerate( SensorStackKeys ):
+    Band = StackDataset.GetRasterBand( BandIndex+1 )
+    Scale,Offset = Band.GetScale(),Band.GetOffset()
+    if Scale in ( None,1.0 ) and Offset in ( None,0.0 ):
+      Bands[Key] = DataArray[BandIndex]
+      continue
+    NoData = Band.GetNoDataValue()
+    IsNoData = ( DataArray[BandIndex] == NoData ) if NoData is not None else None
+    Bands[Key] = DataArray[BandIndex].astype( np.float32 )
+    if Scale not in ( None,1.0 ): Bands[Key] *= np.float32(Scale)
+    if Offset not in ( None,0.0 ): Bands[Key] += np.float32(Offset)
+    if IsNoData is not None: Bands[Key][IsNoData] = np.nan
+  return Bands
+
+@contextmanager
+def TrackAllocations( StageName, AllocationReport ):
+  '''function TrackAllocations( StageName, AllocationReport ):
+  This context manager records the peak memory allocated (in bytes, 
+  as traced by Python's tracemalloc module, which also traces NumPy 
+  arrays) while the code inside the "with" block runs. The peak, 
+  measured above the memory in use when the stage starts, is stored 
+  in the AllocationReport dict{} under StageName. If AllocationReport 
+  is None, nothing is traced (tracemalloc slows down Python).
+
+  Args:
+    StageName (str): Name of processing stage (i.e. "NDVI/SAVI").
+    AllocationReport (dict): Dictionary{} to hold peak allocation per stage, or None.
+  '''
+  if AllocationReport is None:
+    yield
+    return
+  if not tracemalloc.is_tracing():
+    tracemalloc.start()
+  tracemalloc.reset_peak()
+  StartMemory,_ = tracemalloc.get_traced_memory()
+  try:
+    yield
+  finally:
+    _,PeakMemory = tracemalloc.get_traced_memory()
+    AllocationReport[StageName] = max( AllocationReport.get(StageName,0), PeakMemory-StartMemory )
+
+def PrintAllocationReport( AllocationReport ):
+  '''function PrintAllocationReport( AllocationReport ):
+  This function prints the peak memory allocated (in MB) 
+  for each processing stage recorded with TrackAllocations().
+
+  Args:
+    AllocationReport (dict): Dictionary{} holding peak allocation (bytes) per stage.
+  '''
+  if not AllocationReport: return
+  print( '  peak allocations per stage (MB):' )
+  for StageName,PeakMemory in AllocationReport.items():
+    print( '    %-24s %10.1f' % ( StageName, PeakMemory/1048576.0 ) )
 
 def RunProcess( cmd ):
   '''function RunProcess( cmd ):
@@ -84,21 +654,66 @@ def WritePNG( OutFileName, OutDataArray ):
   plt.savefig( OutFileName, dpi=200 )
   plt.close()
 
-def WriteGeotiff( ReferenceDataset, OutFileName, OutDataArray ): 
+def WriteGeotiff( ReferenceDataset, OutFileName, OutDataArray, Quantization=None ): 
   '''function WriteGeotiff( 
   This function writes a Geotiff. To this end, it uses an input 
   GDAL dataset (as a reference) to get a projection string and
-  geotransform. It writes the output data as a float32 array.
+  geotransform. It writes the output data as a float32 array, or,
+  if a quantization is given, as integers (see QuantizeArray()) 
+  with the scale and offset (and NoData value) stored in the band, 
+  so that ReadBandArray() returns the original values.
+  The Geotiff is written under a temporary name, and then moved 
+  into place, so that a Geotiff is never left half-written.
 
   Args:
     ReferenceDataset (osgeo.gdal.Dataset): 
       Reference GDAL dataset to get projection and geostransform.
     OutFileName (str): output filename Geotiff string.
     OutArrayData (numpy.ndarray): 2D NumPy array to be written to Geotiff.
+    Quantization (tuple): Optional GDAL data type, scale and offset (default None, float32).
   Returns: 
     None
   '''
 
+  # Create output Geotiff dataset (with projection and 
+  # geotransform of reference dataset) and write array.
+  # -------------------------------------------------
+  if Quantization is None:
+    dst_ds = CreateGeotiff( ReferenceDataset, OutFileName+'.tmp' )
+    dst_ds.GetRasterBand(1).WriteArray( OutDataArray )
+  else:
+    DataType,Scale,Offset = Quantization
+    dst_ds = CreateGeotiff( ReferenceDataset, OutFileName+'.tmp', DataType )
+    OutBand = dst_ds.GetRasterBand(1)
+    if Scale != 1.0 or Offset != 0.0:
+      OutBand.SetScale( Scale )
+      OutBand.SetOffset( Offset )
+      if DataType in QuantizationNoData: OutBand.SetNoDataValue( QuantizationNoData[DataType] )
+    OutBand.WriteArray( QuantizeArray( OutDataArray,Quantization ) )
+    OutBand = None
+  dst_ds=None
+  del dst_ds
+  os.replace( OutFileName+'.tmp', OutFileName )
+
+def CreateGeotiff( ReferenceDataset, OutFileName, DataType=gdal.GDT_Float32, NumBands=1 ):
+  '''function CreateGeotiff( ReferenceDataset, OutFileName, DataType, NumBands ):
+  This function creates (but does not fill) a Geotiff (of 1 band, by
+  default) with the same dimensions, projection and geotransform as 
+  an input reference GDAL dataset, using the creation options of the
+  active write profile (see SetWriteProfile()). The open dataset is 
+  returned, so that it can be written window by window (i.e. strips 
+  or tiles).
+
+  Args:
+    ReferenceDataset (osgeo.gdal.Dataset): 
+      Reference GDAL dataset to get dimensions, projection and geostransform.
+    OutFileName (str): output filename Geotiff string.
+    DataType (int): GDAL data type of output (default gdal.GDT_Float32).
+    NumBands (int): Number of bands of output (default 1).
+  Returns: 
+    osgeo.gdal.Dataset: Open output Geotiff dataset.
+  '''
+
   # If output file already exists on-disk, remove it.
   # -------------------------------------------------
   if os.path.isfile(OutFileName): os.remove(OutFileName)
@@ -113,13 +728,103 @@ def WriteGeotiff( ReferenceDataset, OutFileName, OutDataArray ):
   # Create output Geotiff dataset. Set projection and 
   # geotransform. 
   # -------------------------------------------------
-  dst_ds = driver.Create( OutFileName,ncols,nrows,1,gdal.GDT_Float32 )
-
-  # Set projection and geotransform.
-  # --------------------------------
-
+  dst_ds = driver.Create( OutFileName,ncols,nrows,NumBands,DataType,
+    options=GetCreationOptions( DataType ) )
   dst_ds.SetGeoTransform( ReferenceDataset.GetGeoTransform() )
   dst_ds.SetProjection( ReferenceDataset.GetProjection() )
-  dst_ds.GetRasterBand(1).WriteArray( OutDataArray )
-  dst_ds=None
-  del dst_ds
+  return dst_ds
+
+# Named write profiles (see --write-profile) for all Geotiffs 
+# written (imagery, resampled Panchromatic band, copied bands, 
+# RGB composite and classification): tiling and block size, 
+# codec and its level, a predictor (horizontal differencing for
+# integers, floating-point predictor for float32), and the GDAL
+# block cache (GDAL_CACHEMAX, MB). Compression uses NUM_THREADS
+# threads. ZSTD falls back to DEFLATE if GDAL was built without it.
+# -----------------------------------------------------------------
+WriteProfiles = {
+  'speed'    : { 'block':512,'codec':'ZSTD'   ,'level':1,'predictor':False,'cachemax':1024 },
+  'balanced' : { 'block':256,'codec':'ZSTD'   ,'level':9,'predictor':True ,'cachemax':512  },
+  'small'    : { 'block':256,'codec':'DEFLATE','level':9,'predictor':True ,'cachemax':512  }
+}
+ActiveWriteProfile = { 'name':None,'num_threads':'ALL_CPUS' }
+
+def SetWriteProfile( ProfileName,NumThreads='ALL_CPUS' ):
+  '''function SetWriteProfile( ProfileName,NumThreads ):
+  This function selects the write profile (see WriteProfiles) used 
+  by all Geotiffs written from now on in this process, and sets the 
+  size of GDAL's block cache (GDAL_CACHEMAX) and the number of threads
+  GDAL may use (GDAL_NUM_THREADS) accordingly. With ProfileName None,
+  Geotiffs are written as before (see GetCreationOptions()).
+
+  Args:
+    ProfileName (str): "speed", "balanced", "small", or None.
+    NumThreads (str): Number of compression threads (default "ALL_CPUS").
+  '''
+  ActiveWriteProfile['name']        = ProfileName
+  ActiveWriteProfile['num_threads'] = str(NumThreads)
+  if ProfileName is None: return
+  gdal.SetCacheMax( WriteProfiles[ProfileName]['cachemax']*1048576 )
+  gdal.SetConfigOption( 'GDAL_NUM_THREADS',str(NumThreads) )
+
+def GetCreationOptions( DataType=gdal.GDT_Float32,DefaultOptions=[],ProfileName=None ):
+  '''function GetCreationOptions( DataType,DefaultOptions,ProfileName ):
+  This function returns the Geotiff creation options of a write 
+  profile (by default the active one, see SetWriteProfile()) for 
+  a given data type. If no profile is active, DefaultOptions (the 
+  options a writer used before profiles existed) are returned.
+
+  Args:
+    DataType (int): GDAL data type of output (default gdal.GDT_Float32).
+    DefaultOptions (list): List[] of options if no profile is active (default none).
+    ProfileName (str): Name of write profile (default None, active profile).
+  Returns:
+    list: List[] of Geotiff creation options (i.e. "COMPRESS=ZSTD").
+  '''
+  if ProfileName is None: ProfileName = ActiveWriteProfile['name']
+  if ProfileName is None: return list( DefaultOptions )
+  Profile = WriteProfiles[ProfileName]
+  Codec   = Profile['codec']
+  if Codec == 'ZSTD' and 'ZSTD' not in ( gdal.GetDriverByName('GTiff').GetMetadataItem('DMD_CREATIONOPTIONLIST') or '' ):
+    Codec = 'DEFLATE'
+  Options = [ 'TILED=YES','BLOCKXSIZE='+str(Profile['block']),'BLOCKYSIZE='+str(Profile['block']),
+    'COMPRESS='+Codec,( 'ZSTD_LEVEL=' if Codec == 'ZSTD' else 'ZLEVEL=' )+str(Profile['level']),
+    'NUM_THREADS='+ActiveWriteProfile['num_threads'],'BIGTIFF=IF_SAFER' ]
+  if Profile['predictor']:
+    Options.append( 'PREDICTOR='+( '3' if DataType in ( gdal.GDT_Float32,gdal.GDT_Float64 ) else '2' ) )
+  return Options
+
+def BenchmarkWriteProfiles( ReferenceDataset,DataArray,OutDir,Quantization=None ):
+  '''function BenchmarkWriteProfiles( ReferenceDataset,DataArray,OutDir,Quantization ):
+  This function writes one array (i.e. NDVI) as a Geotiff with every 
+  write profile (and without one), and reports write time (including
+  flushing to disk) against file size for each, so that the profile 
+  can be chosen for the storage and CPUs of a host. The Geotiffs are 
+  removed afterwards. The active write profile is kept.
+
+  Args:
+    ReferenceDataset (osgeo.gdal.Dataset): Reference GDAL dataset to get projection and geostransform.
+    DataArray (numpy.ndarray): 2D NumPy array to be written.
+    OutDir (str): Directory to write Geotiffs to.
+    Quantization (tuple): Optional GDAL data type, scale and offset (see WriteGeotiff()).
+  Returns:
+    list: List[] of dict{} with 'profile', 'seconds' and 'megabytes' per profile.
+  '''
+  PreviousProfile = ( ActiveWriteProfile['name'],ActiveWriteProfile['num_threads'] )
+  Results = []
+  for ProfileName in [ None ]+sorted( WriteProfiles.keys() ):
+    SetWriteProfile( ProfileName,PreviousProfile[1] )
+    OutFileName = os.path.join( OutDir,'WriteProfile_'+str(ProfileName).lower()+'.tif' )
+    StartTime = time.perf_counter()
+    WriteGeotiff( ReferenceDataset,OutFileName,DataArray,Quantization )
+    with open( OutFileName,'rb' ) as OutFile: os.fsync( OutFile.fileno() )
+    Seconds = time.perf_counter()-StartTime
+    Results.append( { 'profile':str(ProfileName),'seconds':Seconds,
+      'megabytes':os.path.getsize( OutFileName )/1048576.0 } )
+    os.remove( OutFileName )
+  SetWriteProfile( *PreviousProfile )
+
+  print( '  \n    write profile      seconds    size (MB)' )
+  for Result in Results:
+    print( '    %-16s %9.3f %12.2f' % ( Result['profile'],Result['seconds'],Result['megabytes'] ) )
+  return Results
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import socket
+
+def GetImageWindows( NRows,NCols,TileSize ):
+  '''function GetImageWindows( NRows,NCols,TileSize ):
+  This function divides an image domain of NRows x NCols pixels into
+  square tiles (windows) of TileSize x TileSize pixels. Tiles along
+  the last row and column of the image domain may be smaller.
+
+  Args:
+    NRows (int): Number of rows in image domain.
+    NCols (int): Number of columns in image domain.
+    TileSize (int): Number of rows and columns of each tile.
+  Returns:
+    list: List[] of windows [StartRow,EndRow,StartColumn,EndColumn].
+  '''
+  Windows = []
+  for StartRow in range( 0,NRows,TileSize ):
+    for StartColumn in range( 0,NCols,TileSize ):
+      Windows.append( [ StartRow, min(StartRow+TileSize,NRows),
+        StartColumn, min(StartColumn+TileSize,NCols) ] )
+  return Windows
+
+def WriteTileJobPlan( PlanFileName,Plan ):
+  '''function WriteTileJobPlan( PlanFileName,Plan ):
+  This function writes a tile job plan (a dictionary{} holding the
+  imagery, model reference and windows of all tiles) to a JSON file.
+  The file is written under a temporary name and moved into place,
+  so that workers never read a half-written plan.
+
+  Args:
+    PlanFileName (str): Name of JSON tile job plan.
+    Plan (dict): Dictionary{} holding tile job plan.
+  '''
+  TempPlanFileName = PlanFileName+'.tmp'
+  with open( TempPlanFileName,'w' ) as PlanFile:
+    json.dump( Plan,PlanFile,indent=1 )
+  os.replace( TempPlanFileName,PlanFileName )
+
+def ReadTileJobPlan( PlanFileName ):
+  '''function ReadTileJobPlan( PlanFileName ):
+  This function reads a tile job plan written by WriteTileJobPlan().
+
+  Args:
+    PlanFileName (str): Name of JSON tile job plan.
+  Returns:
+    dict: Dictionary{} holding tile job plan, or None if it cannot be read.
+  '''
+  try:
+    with open( PlanFileName,'r' ) as PlanFile:
+      return json.load( PlanFile )
+  except Exception as e:
+    print('  \n    Unable to read tile job plan: '+PlanFileName+' ('+str(e)+')')
+    return None
+
+def ReadTileLock( LockFileName ):
+  '''function ReadTileLock( LockFileName ):
+  This function returns the contents (token) of a tile lock file.
+
+  Args:
+    LockFileName (str): Name of lock file for tile.
+  Returns:
+    str: Token written by ClaimTile(), or None if the lock cannot be read.
+  '''
+  try:
+    with open( LockFileName,'r' ) as LockFile:
+      return LockFile.read()
+  except OSError:
+    return None
+
+def ClaimTile( LockFileName,StaleLockSeconds=3600.0,MaxRetries=3,RetryDelay=1.0 ):
+  '''function ClaimTile( LockFileName,StaleLockSeconds,MaxRetries,RetryDelay ):
+  This function tries to claim a tile for the current process by
+  atomically creating a lock file (O_CREAT|O_EXCL). This works between
+  processes on one host, and between hosts with shared storage,
+  without any external service. The lock file holds a token (host 
+  name, process id and time of the claim), which is returned, so that
+  ReleaseTile() only removes a lock that is still this claim's. A lock
+  older than StaleLockSeconds is assumed to belong to a worker that 
+  died, so that StaleLockSeconds should be longer than it takes to 
+  classify one tile. A stale lock is taken over by atomically renaming
+  it to a name unique to this process (only one worker can succeed),
+  and checking that the renamed file is still stale: if another worker
+  replaced the stale lock by a fresh one in the meantime, that lock is
+  put back, and the tile is left to it. Errors other than the lock 
+  already existing (i.e. on network file systems) are retried up to 
+  MaxRetries times.
+
+  Args:
+    LockFileName (str): Name of lock file for tile.
+    StaleLockSeconds (float): Age (seconds) after which a lock is considered stale.
+    MaxRetries (int): Number of times to retry on file-system errors.
+    RetryDelay (float): Seconds to wait between retries.
+  Returns:
+    str: Token of claim, or None if another worker holds the tile.
+  '''
+  for Attempt in range( MaxRetries+1 ):
+    Token = '%s %d %f\n' % ( socket.gethostname(),os.getpid(),time.time() )
+    try:
+      LockFile = os.open( LockFileName, os.O_CREAT|os.O_EXCL|os.O_WRONLY )
+      os.write( LockFile, Token.encode('utf-8') )
+      os.close( LockFile )
+      return Token
+    except FileExistsError:
+      try:
+        LockAge = time.time()-os.path.getmtime( LockFileName )
+      except OSError:
+        continue
+      if LockAge < StaleLockSeconds:
+        return None
+
+      # Take over stale lock: rename it (atomic, only one
+      # worker succeeds), then make sure it was still stale
+      # ----------------------------------------------------
+      StaleLockFileName = '%s.stale.%s.%d' % ( LockFileName,socket.gethostname(),os.getpid() )
+      try:
+        os.rename( LockFileName,StaleLockFileName )
+      except OSError:
+        continue
+      try:
+        StillStale = time.time()-os.path.getmtime( StaleLockFileName ) >= StaleLockSeconds
+      except OSError:
+        StillStale = False
+      if not StillStale:
+        try:
+          os.link( StaleLockFileName,LockFileName )
+        except OSError:
+          pass
+        try:
+          os.remove( StaleLockFileName )
+        except OSError:
+          pass
+        return None
+      print('WARNING: removing stale tile lock: ' , LockFileName)
+      try:
+        os.remove( StaleLockFileName )
+      except OSError:
+        pass
+    except OSError as e:
+      print('WARNING: unable to claim tile lock: ' , str(e))
+      time.sleep( RetryDelay )
+  return None
+
+def ReleaseTile( LockFileName,Token=None ):
+  '''function ReleaseTile( LockFileName,Token ):
+  This function releases a tile claimed with ClaimTile()
+  by removing its lock file, but only if the lock still 
+  holds the token of the claim: if it was taken over as 
+  stale by another worker, that worker's lock is kept.
+
+  Args:
+    LockFileName (str): Name of lock file for tile.
+    Token (str): Token returned by ClaimTile() (default None, remove any lock).
+  '''
+  if Token is not None and ReadTileLock( LockFileName ) != Token:
+    return
+  try:
+    os.remove( LockFileName )
+  except OSError:
+    pass
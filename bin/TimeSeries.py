@@ -0,0 +1,264 @@
+import os
+import re
+import time
+import pandas
+import numpy as np
+import warnings as warn
+from osgeo import gdal,gdalconst
+from Misc import CreateGeotiff,CreateVirtualDataset,GetFeatureImageryKeys,BackgroundSigma
+from Misc import QuantizeArray,RestoreQuantizedArray
+from TrainingImagery import CreateImageGaussianFiltered,CreateImageGaussianPyramid,GetGaussianPyramidExtent
+from TrainingImagery import GetBoxFilterWidths
+from TileQueue import GetImageWindows
+from ImageClassification import GetClassification,GetClassifierFeatures,LoadRandomForestModel
+from ImageClassification import CreatePredictionCache,PrintPredictionCacheReport
+
+def OpenTimeSeriesDates( Scenes,ReferenceDataset,OutDir,PanResampling=gdalconst.GRA_NearestNeighbour ):
+  '''function OpenTimeSeriesDates( Scenes,ReferenceDataset,OutDir,PanResampling ):
+  This function opens the Red,Green,Blue,NIR (and, optionally,
+  Panchromatic) bands of every date of a time series (see
+  Misc.ReadSceneList()). Bands on a different grid than the imagery
+  of the classification (ReferenceDataset) are warped onto it by
+  virtual datasets (VRTs) in OutDir/timeseries, so that all dates
+  are co-registered. The datasets stay open for all tiles.
+
+  Args:
+    Scenes (list): List[] of dates, each a list[] of 4 or 5 band filenames.
+    ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset of classification grid (i.e. Pan.vrt).
+    OutDir (str): Output directory.
+    PanResampling (int): GDAL method to resample Panchromatic bands (default GRA_NearestNeighbour).
+  Returns:
+    list: List[] of dates, each a dict{} of label and open GDAL datasets per band, or None on failure.
+  '''
+  Grid = ( ReferenceDataset.RasterXSize,ReferenceDataset.RasterYSize,
+    ReferenceDataset.GetGeoTransform(),ReferenceDataset.GetProjectionRef() )
+  WarpDirectory = os.path.join( OutDir,'timeseries' )
+  Dates = []
+  for DateIndex,Scene in enumerate( Scenes ):
+    Date = { 'label' : os.path.splitext( os.path.basename( Scene[0] ) )[0], 'Pan' : None }
+    for BandName,FileName in zip( [ 'Red','Green','Blue','NIR','Pan' ],Scene ):
+      Dataset = gdal.Open( FileName )
+      if Dataset is None:
+        print('  \n    Not a valid GDAL image (raster) dataset or file: '+FileName)
+        return None
+      if ( Dataset.RasterXSize,Dataset.RasterYSize,Dataset.GetGeoTransform(),Dataset.GetProjectionRef() ) != Grid:
+        if not os.path.isdir( WarpDirectory ): os.makedirs( WarpDirectory )
+        WarpFileName = CreateVirtualDataset( FileName,
+          os.path.join( WarpDirectory,'Date%03d%s.vrt' % ( DateIndex,BandName ) ),ReferenceDataset,
+          PanResampling if BandName == 'Pan' else gdalconst.GRA_NearestNeighbour )
+        if WarpFileName is None:
+          print('  \n    Unable to warp onto classification grid: '+FileName)
+          return None
+        Dataset = gdal.Open( WarpFileName )
+      Date[BandName] = Dataset
+    Dates.append( Date )
+  return Dates
+
+def UsesGaussianPyramid( Sigmas ):
+  '''function UsesGaussianPyramid( Sigmas ):
+  This function tells whether "background" imagery at these sigmas
+  is created by CreateImageGaussianPyramid() (several sigmas), as in
+  CreateImageryBackground(), rather than by one filter (sigma 5).
+
+  Args:
+    Sigmas (list): Optional list[] of sigmas of "background" imagery (None for 5 only).
+  Returns:
+    bool: True for a pyramid.
+  '''
+  return Sigmas is not None and list(Sigmas) != [ BackgroundSigma ]
+
+def GetTimeSeriesHalo( FeatureNames,Fast=False,Sigmas=None ):
+  '''function GetTimeSeriesHalo( FeatureNames,Fast,Sigmas ):
+  This function returns the number of pixels read around each tile
+  (halo), so that "background" (filtered) variables computed on a
+  tile equal those computed on the whole image: the radius of the
+  Gaussian kernel (4 sigma) or of the box filters at sigma 5, or,
+  for several sigmas, the radius of the cascade of the pyramid (see
+  TrainingImagery.GetGaussianPyramidExtent()), and the decimation
+  factor of the pyramid, on a multiple of which windows must start.
+  Without "background" variables, no halo is needed.
+
+  Args:
+    FeatureNames (list): List[] of variable names of classifier.
+    Fast (bool): Box filters instead of Gaussian filters (default False).
+    Sigmas (list): Optional list[] of sigmas of "background" imagery (default None, 5 only).
+  Returns:
+    tuple: Halo (pixels) and alignment (pixels) of windows.
+  '''
+  if not any( re.match( r'^Background_',VariableName ) for VariableName in FeatureNames ):
+    return ( 0,1 )
+  if UsesGaussianPyramid( Sigmas ):
+    return GetGaussianPyramidExtent( Sigmas,Fast=Fast )
+  Radius = sum( Width//2 for Width in GetBoxFilterWidths( BackgroundSigma ) ) if Fast else \
+    int( 4.0*BackgroundSigma+0.5 )
+  return ( Radius,1 )
+
+def GetTimeSeriesQuantizations( ImgDict,FeatureNames ):
+  '''function GetTimeSeriesQuantizations( ImgDict,FeatureNames ):
+  This function returns, per derived variable (NDVI, SAVI and
+  "background" imagery), the quantization its imagery of the run
+  was stored with (see --quantize and WriteGeotiff()), so that
+  ReadTileFeatures() rounds the variables of every date as the
+  classifier saw them. Input bands are read as they are stored.
+
+  Args:
+    ImgDict (dict): Dictionary{} containing imagery of the run.
+    FeatureNames (list): List[] of variable names of classifier.
+  Returns:
+    dict: Dictionary{} of quantization (GDAL data type,scale,offset) per variable name.
+  '''
+  Quantizations = {}
+  for VariableName,ImageryKey in GetFeatureImageryKeys( ImgDict,FeatureNames ):
+    if not re.match( r'^(ndvi|savi|bg_)',ImageryKey ): continue
+    Band = gdal.Open( ImgDict[ImageryKey] ).GetRasterBand(1)
+    if Band.DataType in ( gdal.GDT_Float32,gdal.GDT_Float64 ): continue
+    Quantizations[VariableName] = ( Band.DataType,Band.GetScale() or 1.0,Band.GetOffset() or 0.0 )
+  return Quantizations
+
+def ReadTileFeatures( Date,Window,Halo,FeatureNames,Fast=False,Sigmas=None,Quantizations={},Alignment=1 ):
+  '''function ReadTileFeatures( Date,Window,Halo,FeatureNames,Fast,Sigmas,Quantizations,Alignment ):
+  This function computes the variables of a classifier (NDVI, SAVI,
+  bands, Panchromatic band and "background" imagery) for one tile
+  of one date on-the-fly, from a single read of its bands (with a
+  halo, see GetTimeSeriesHalo()), as CreateClassificationImagery()
+  in VegetationClassification.py computes them for the whole image.
+  No imagery is written. Without a Panchromatic band, a simulated
+  one (the mean of Red,Green,Blue,NIR) is used. 
+
+  "Background" imagery at several sigmas comes from one pyramid per
+  band (see CreateImageGaussianPyramid()), read from a window that
+  starts on a multiple of the decimation factor (Alignment), so that
+  it is decimated on the grid of the whole image. Derived variables
+  are rounded as their imagery of the run was stored (Quantizations,
+  see GetTimeSeriesQuantizations()).
+
+  Args:
+    Date (dict): Label and open GDAL datasets of one date (see OpenTimeSeriesDates()).
+    Window (list): Tile [StartRow,EndRow,StartColumn,EndColumn].
+    Halo (int): Number of pixels read around tile.
+    FeatureNames (list): List[] of variable names, in order of classifier columns.
+    Fast (bool): Approximate Gaussian filters by box filters (default False).
+    Sigmas (list): Optional list[] of sigmas of "background" imagery (default None, 5 only).
+    Quantizations (dict): Quantization per variable name (default {}, none).
+    Alignment (int): Windows are read from a multiple of Alignment pixels (default 1).
+  Returns:
+    pandas.core.frame.DataFrame: Dataframe of pixel values of tile, one column per variable.
+  '''
+  StartRow,EndRow,StartColumn,EndColumn = Window
+  NRows,NCols = Date['Red'].RasterYSize,Date['Red'].RasterXSize
+  ReadStartRow,ReadEndRow = max( 0,StartRow-Halo ),min( NRows,EndRow+Halo )
+  ReadStartColumn,ReadEndColumn = max( 0,StartColumn-Halo ),min( NCols,EndColumn+Halo )
+  ReadStartRow,ReadStartColumn = ReadStartRow-ReadStartRow%Alignment,ReadStartColumn-ReadStartColumn%Alignment
+  Crop = ( slice( StartRow-ReadStartRow,EndRow-ReadStartRow ),
+    slice( StartColumn-ReadStartColumn,EndColumn-ReadStartColumn ) )
+
+  Bands = {}
+  for BandName in [ 'Red','Green','Blue','NIR','Pan' ]:
+    if Date[BandName] is None: continue
+    Bands[BandName] = Date[BandName].GetRasterBand(1).ReadAsArray( ReadStartColumn,ReadStartRow,
+      ReadEndColumn-ReadStartColumn,ReadEndRow-ReadStartRow,buf_type=gdal.GDT_Float32 )
+  if 'Pan' not in Bands:
+    Bands['Pan']  = np.add( Bands['Red'],Bands['Green'],dtype=np.float32 )
+    Bands['Pan'] += Bands['Blue']
+    Bands['Pan'] += Bands['NIR']
+    Bands['Pan'] /= 4.0
+  DifferenceNIRRed = np.subtract( Bands['NIR'],Bands['Red'],dtype=np.float32 )
+  SumNIRRed        = np.add( Bands['NIR'],Bands['Red'],dtype=np.float32 )
+  with warn.catch_warnings():
+    warn.filterwarnings('ignore',category=RuntimeWarning)
+    Bands['NDVI'] = np.divide( DifferenceNIRRed,SumNIRRed,dtype=np.float32 )
+  Bands['NDVI'][np.isnan(Bands['NDVI'])] = -1.0
+
+  # "Background" levels of each band, filtered once
+  # per tile for all variables at all sigmas
+  # -----------------------------------------------
+  Backgrounds = {}
+  OutDataFrame = pandas.DataFrame()
+  for VariableName in FeatureNames:
+    Match = re.match( r'^Background_(Red|Green|Blue|NIR|Pan|NDVI)(?:_S(\d+))?$',VariableName )
+    if Match:
+      BandName = Match.group(1)
+      if BandName not in Backgrounds:
+        if UsesGaussianPyramid( Sigmas ):
+          Backgrounds[BandName] = dict( CreateImageGaussianPyramid( Bands[BandName],Sigmas,Fast=Fast ) )
+        else:
+          Backgrounds[BandName] = { BackgroundSigma:CreateImageGaussianFiltered( Bands[BandName],BackgroundSigma,Fast ) }
+      FeatureArray = Backgrounds[BandName][ int( Match.group(2) or BackgroundSigma ) ][Crop]
+    elif VariableName.startswith('SAVI'):
+      L = int( VariableName[4:] )/10.0
+      with warn.catch_warnings():
+        warn.filterwarnings('ignore',category=RuntimeWarning)
+        FeatureArray = DifferenceNIRRed[Crop]/( SumNIRRed[Crop]+np.float32(L) )*np.float32(1+L)
+    else:
+      FeatureArray = Bands[ { 'R':'Red','G':'Green','B':'Blue' }.get( VariableName,VariableName ) ][Crop]
+    if VariableName in Quantizations:
+      FeatureArray = RestoreQuantizedArray( QuantizeArray( FeatureArray,Quantizations[VariableName] ),
+        Quantizations[VariableName] )
+    OutDataFrame[VariableName] = FeatureArray.flatten()
+  return OutDataFrame
+
+def ClassifyTimeSeries( Scenes,ImgDict,ModelFileName,OutDir,TileSize=512,EarlyExit=False,Fast=False,
+    PanResampling=gdalconst.GRA_NearestNeighbour,MemoizeEntries=None,Sigmas=None ):
+  '''function ClassifyTimeSeries( Scenes,ImgDict,ModelFileName,OutDir,TileSize,EarlyExit,Fast,PanResampling,
+    MemoizeEntries,Sigmas ):
+  This function classifies every date of a time series of
+  co-registered imagery in one tiled pass, with one (shared)
+  classifier fitted on the imagery of the run (ImgDict). Tile by
+  tile, the bands of each date are read once, the variables of the
+  classifier are computed on-the-fly (see ReadTileFeatures()), and
+  the classification is written to the band of that date of one
+  multi-band Geotiff (TimeSeriesClassification.tif, band descriptions
+  hold the date labels). No imagery is written per date. "Background"
+  variables (at Sigmas) and quantization follow the imagery of the run.
+
+  Args:
+    Scenes (list): List[] of dates, each a list[] of 4 or 5 band filenames (see Misc.ReadSceneList()).
+    ImgDict (dict): Dictionary{} containing imagery of the run (classification grid and variables).
+    ModelFileName (str): Filename of pickled classifier (see SaveRandomForestModel()).
+    OutDir (str): Output directory.
+    TileSize (int): Number of rows and columns of each tile (default 512).
+    EarlyExit (bool): Use early-exit ensemble voting (see PredictEarlyExit()). Same output.
+    Fast (bool): Approximate Gaussian filters by box filters (default False).
+    PanResampling (int): GDAL method to resample Panchromatic bands (default GRA_NearestNeighbour).
+    MemoizeEntries (int): Optional size of prediction cache, shared by all dates (see PredictMemoized()).
+    Sigmas (list): Optional list[] of sigmas of "background" imagery of the run (default None, 5 only).
+  Returns:
+    str: Name of multi-band classification Geotiff, or None on failure.
+  '''
+  ClassifierRandomForestFit = LoadRandomForestModel( ModelFileName )
+  FeatureNames = GetClassifierFeatures( ClassifierRandomForestFit )
+  if FeatureNames is None:
+    FeatureNames = [ VariableName for VariableName,ImageryKey in GetFeatureImageryKeys( ImgDict ) ]
+
+  ReferenceDataset = gdal.Open( ImgDict['pan'] )
+  Dates = OpenTimeSeriesDates( Scenes,ReferenceDataset,OutDir,PanResampling )
+  if Dates is None: return None
+  ( Halo,Alignment ) = GetTimeSeriesHalo( FeatureNames,Fast,Sigmas )
+  Quantizations = GetTimeSeriesQuantizations( ImgDict,FeatureNames )
+  Cache = CreatePredictionCache( MemoizeEntries ) if MemoizeEntries is not None else None
+
+  OutFileName = os.path.join( OutDir,'TimeSeriesClassification.tif' )
+  OutputDataset = CreateGeotiff( ReferenceDataset,OutFileName,gdal.GDT_Byte,len(Dates) )
+  for DateIndex,Date in enumerate( Dates ):
+    OutputDataset.GetRasterBand( DateIndex+1 ).SetDescription( Date['label'] )
+
+  # Tile by tile, classify all dates, so that each tile (and
+  # its halo) of every date is read once, in this process
+  # ---------------------------------------------------------
+  StartTime = time.time()
+  Windows = GetImageWindows( ReferenceDataset.RasterYSize,ReferenceDataset.RasterXSize,TileSize )
+  for Window in Windows:
+    StartRow,EndRow,StartColumn,EndColumn = Window
+    for DateIndex,Date in enumerate( Dates ):
+      DataFrameForTile = ReadTileFeatures( Date,Window,Halo,FeatureNames,Fast,Sigmas,Quantizations,Alignment )
+      ClassifiedTile = GetClassification( DataFrameForTile,ClassifierRandomForestFit,
+        ( EndRow-StartRow,EndColumn-StartColumn ),EarlyExit,Cache )
+      OutputDataset.GetRasterBand( DateIndex+1 ).WriteArray( ClassifiedTile,StartColumn,StartRow )
+  OutputDataset.FlushCache()
+  OutputDataset = None
+
+  print( 'time series dates: ' , len(Dates) , ' tiles: ' , len(Windows) , ' halo: ' , Halo )
+  print( 'time series seconds: ' , round( time.time()-StartTime,2 ) )
+  PrintPredictionCacheReport( Cache )
+  print( 'time series classification: ' , OutFileName )
+  return OutFileName
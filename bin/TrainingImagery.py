@@ -1,16 +1,67 @@
 import os
 import sys
+import time
 import numpy as np
 import warnings as warn
 import subprocess
 from Misc import RunProcess
 from distutils.spawn import find_executable 
-from Misc import WriteGeotiff
+from Misc import WriteGeotiff,IsFeatureSelected,QuantizationIndex,GetBandQuantization,GetCreationOptions
+from Misc import BackgroundSigma,GetBackgroundImageryKey
 from osgeo import osr,gdal
-from scipy.ndimage.filters import gaussian_filter
+from scipy.ndimage import gaussian_filter,uniform_filter1d
+from concurrent.futures import ThreadPoolExecutor
 
-def CreateImageGaussianFiltered(InputArray):
-  '''function GaussianFilter( arr ):
+def GetBoxFilterWidths(Sigma,Passes=3):
+  '''function GetBoxFilterWidths( Sigma,Passes ):
+  This function returns the (odd) widths of Passes box filters whose
+  repeated application approximates a Gaussian filter of a given
+  sigma: the variances of the boxes, (Width**2-1)/12, add up to about
+  Sigma**2 (using the smaller or the next larger odd width for each
+  pass, as in Kovesi, "Fast Almost-Gaussian Filtering").
+
+  Args:
+    Sigma (float): Sigma (pixels) of Gaussian filter.
+    Passes (int): Number of box filters (default 3).
+  Returns:
+    list: List[] of box widths (pixels).
+  '''
+  IdealWidth = np.sqrt( 12.0*Sigma**2/Passes+1.0 )
+  LowerWidth = int(np.floor(IdealWidth))
+  if LowerWidth%2 == 0: LowerWidth -= 1
+  NumLower = int(round( ( 12.0*Sigma**2-Passes*LowerWidth**2-4.0*Passes*LowerWidth-3.0*Passes )/
+    ( -4.0*LowerWidth-4.0 ) ))
+  return [ LowerWidth if Pass < NumLower else LowerWidth+2 for Pass in range(Passes) ]
+
+def CreateImageBoxFiltered(InputArray,Sigma=BackgroundSigma,Passes=3):
+  '''function CreateImageBoxFiltered( InputArray,Sigma,Passes ):
+  This function approximates CreateImageGaussianFiltered() (for the
+  fast "background" mode) by Passes box filters (see GetBoxFilterWidths())
+  along rows and columns. scipy.ndimage's uniform_filter1d computes a 
+  box filter with a running sum, so the cost does not depend on sigma
+  (a Gaussian kernel grows with sigma). Borders are handled as by 
+  CreateImageGaussianFiltered() (mode 'nearest'). With 3 passes, the 
+  result is a piecewise-quadratic kernel within a few percent of the
+  Gaussian weights.
+
+  Args:
+    InputArray (numpy.ndarray): Input NumPy array. Should be two-dimensional.
+    Sigma (float): Sigma (pixels) of Gaussian filter (default 5).
+    Passes (int): Number of box filters (default 3).
+  Returns: 
+    np.ndarray: Output filtered 2D NumPy array (float32).
+  '''
+  OutArray    = np.array(InputArray,dtype=np.float32)
+  BufferArray = np.empty_like(OutArray)
+  for Width in GetBoxFilterWidths(Sigma,Passes):
+    if Width < 2: continue
+    for Axis in (0,1):
+      uniform_filter1d(OutArray,Width,axis=Axis,mode='nearest',output=BufferArray)
+      OutArray,BufferArray = BufferArray,OutArray
+  return OutArray
+
+def CreateImageGaussianFiltered(InputArray,Sigma=BackgroundSigma,Fast=False):
+  '''function CreateImageGaussianFiltered( InputArray,Sigma,Fast ):
   This function calls scipy.ndimage's gaussian_filter 
   function. In particular, an array or 2D NumPy array 
   is passed-into this function, and the gaussian_filter 
@@ -24,59 +75,270 @@ def CreateImageGaussianFiltered(InputArray):
   Some of these metrics include background (moving average)
   for NDVI, Blue, Green, Red, and the Panchromatic image.
 
+  The input is converted to float32 (without a copy if it already 
+  is float32), and the filter writes straight into a float32 output,
+  so that no float64 temporaries are created. In fast mode, the 
+  Gaussian is approximated by box filters (see CreateImageBoxFiltered()).
+
   Args:
     InputArray (numpy.ndarray): Input NumPy array. Should be two-dimensional.
+    Sigma (float): Sigma (pixels) of Gaussian filter (default 5).
+    Fast (bool): Approximate Gaussian by box filters (default False).
   Returns: 
-    np.ndarray: Output filtered 2D NumPy array (float).
+    np.ndarray: Output filtered 2D NumPy array (float32).
   '''
-  return np.array(gaussian_filter(InputArray,sigma=5,mode='nearest'), dtype=np.float32)
+  if Fast: return CreateImageBoxFiltered(InputArray,Sigma)
+  return gaussian_filter(np.asarray(InputArray,dtype=np.float32),
+    sigma=Sigma,mode='nearest',output=np.float32)
 
-def CreateImageRGB(RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory):
-  '''function CreateImageRGB( RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory):
+def UpsampleLinear(CoarseArray,Factor,Shape):
+  '''function UpsampleLinear( CoarseArray,Factor,Shape ):
+  This function upsamples a 2D array that was decimated by Factor
+  (pixel j of the coarse array lies on pixel Factor*j of the full 
+  array) back to the full shape, by separable linear interpolation.
+  Pixels past the last coarse pixel take its value.
+
+  Args:
+    CoarseArray (numpy.ndarray): Decimated 2D NumPy array.
+    Factor (int): Decimation factor (power of 2).
+    Shape (tuple): Rows and columns of full array.
+  Returns:
+    np.ndarray: Upsampled 2D NumPy array (float32).
+  '''
+  OutArray = CoarseArray
+  for Axis in (0,1):
+    Coordinates = np.minimum( np.arange(Shape[Axis],dtype=np.float32)/Factor,OutArray.shape[Axis]-1 )
+    Lower  = np.floor(Coordinates).astype(np.intp)
+    Upper  = np.minimum( Lower+1,OutArray.shape[Axis]-1 )
+    Weight = ( Coordinates-Lower ).astype(np.float32)
+    if Axis == 0:
+      OutArray = OutArray[Lower]*(1-Weight)[:,None]+OutArray[Upper]*Weight[:,None]
+    else:
+      OutArray = OutArray[:,Lower]*(1-Weight)[None,:]+OutArray[:,Upper]*Weight[None,:]
+  return OutArray.astype(np.float32,copy=False)
+
+def CreateImageGaussianPyramid(InputArray,Sigmas,DecimateSigma=4.0,Fast=False):
+  '''function CreateImageGaussianPyramid( InputArray,Sigmas,DecimateSigma,Fast ):
+  This function creates "background" (Gaussian-filtered) imagery at 
+  several sigmas from one band, yielding ( Sigma,2D array ) in order 
+  of increasing sigma. Rather than filtering the band at full 
+  resolution for every sigma (cost growing with sigma), levels are 
+  cascaded: a Gaussian of sigma T equals a Gaussian of sigma S 
+  followed by one of sqrt(T**2-S**2), so each level is filtered from
+  the previous one with a small kernel. Once the accumulated blur is 
+  at least DecimateSigma pixels of the working grid (and the next 
+  sigma is at least DecimateSigma pixels of the decimated grid), the
+  working image is decimated by 2 (every other row and column) before
+  further filtering, and each level is upsampled to full resolution 
+  (see UpsampleLinear()). So every level costs about the same, whatever 
+  its sigma. The smallest sigma is filtered at full resolution and
+  is identical to CreateImageGaussianFiltered().
+
+  The band is first padded by 4 times the largest sigma (repeating 
+  its edge pixels, as mode 'nearest' does), and every level is cropped
+  back, so that decimation (which drops a trailing odd row or column)
+  and upsampling (which repeats the last coarse pixel) only distort 
+  the padding, and not the borders of the band.
+
+  Error bounds against gaussian_filter() (mode 'nearest') at full 
+  resolution, for a sinusoid of amplitude A, up to the image borders:
+    (1) cascading is exact, up to the kernel truncation (4 sigma) 
+        of gaussian_filter() (below 1e-4 A);
+    (2) decimation with blur >= DecimateSigma (4) working pixels 
+        leaves at most exp(-2*pi**2*4**2/16) = 3e-9 A to alias;
+    (3) linear upsampling of a signal blurred by sigma >= 4 working
+        pixels errs by at most A/(4*e*sigma**2) = 0.006 A.
+  So every level is within 0.6% of the local contrast. See 
+  MeasureGaussianPyramidError() to measure this on actual imagery.
+  In fast mode, every filter is approximated by box filters (see
+  CreateImageBoxFiltered()), and the bounds above do not hold.
+
+  Args:
+    InputArray (numpy.ndarray): Input 2D NumPy array.
+    Sigmas (list): List[] of sigmas (pixels) of Gaussian filters.
+    DecimateSigma (float): Blur (working pixels) before decimating by 2 (default 4).
+    Fast (bool): Approximate Gaussians by box filters (default False).
+  Yields:
+    tuple: Sigma, and filtered 2D NumPy array (float32) at full resolution.
+  '''
+  Shape = np.shape(InputArray)
+  Pad = int( 4.0*max(Sigmas)+0.5 )
+  WorkingArray = np.pad( np.asarray(InputArray,dtype=np.float32),Pad,mode='edge' )
+  PaddedShape = WorkingArray.shape
+  Crop = ( slice( Pad,Pad+Shape[0] ),slice( Pad,Pad+Shape[1] ) )
+  Factor,AccumulatedSigma = 1,0.0
+  for Sigma in sorted(Sigmas):
+
+    # Decimate while the blur so far, and this sigma on 
+    # the decimated grid, are wide enough (keeping at 
+    # least a few rows and columns)
+    # ------------------------------------------------
+    while AccumulatedSigma/Factor >= DecimateSigma and float(Sigma)/(2*Factor) >= DecimateSigma \
+        and min(WorkingArray.shape) >= 16:
+      WorkingArray = np.ascontiguousarray( WorkingArray[::2,::2] )
+      Factor *= 2
+
+    # Filter from previous level by the remaining 
+    # sigma (in working pixels)
+    # ------------------------------------------------
+    RemainingSigma = np.sqrt( max( float(Sigma)**2-AccumulatedSigma**2,0.0 ) )/Factor
+    if RemainingSigma > 0:
+      WorkingArray = CreateImageGaussianFiltered( WorkingArray,RemainingSigma,Fast )
+    AccumulatedSigma = max( float(Sigma),AccumulatedSigma )
+    Level = WorkingArray if Factor == 1 else UpsampleLinear( WorkingArray,Factor,PaddedShape )
+    yield ( Sigma,np.ascontiguousarray( Level[Crop] ) )
+
+def GetGaussianPyramidExtent(Sigmas,DecimateSigma=4.0,Fast=False):
+  '''function GetGaussianPyramidExtent( Sigmas,DecimateSigma,Fast ):
+  This function follows the cascade of CreateImageGaussianPyramid()
+  for a list of sigmas and returns its final decimation factor and
+  its radius: the distance (full-resolution pixels) from which input
+  pixels reach a level (the kernels of all cascaded filters, in
+  pixels of their working grid, plus one coarse pixel of upsampling).
+  A window of a band read with a halo of this radius, starting on a
+  multiple of the factor, gives the same levels (inside the halo) as
+  the whole band, since both are decimated on the same grid.
+
+  Args:
+    Sigmas (list): List[] of sigmas (pixels) of Gaussian filters.
+    DecimateSigma (float): Blur (working pixels) before decimating by 2 (default 4).
+    Fast (bool): Approximate Gaussians by box filters (default False).
+  Returns:
+    tuple: Radius (pixels) and decimation factor.
+  '''
+  Radius,Factor,AccumulatedSigma = 0,1,0.0
+  for Sigma in sorted(Sigmas):
+    while AccumulatedSigma/Factor >= DecimateSigma and float(Sigma)/(2*Factor) >= DecimateSigma:
+      Factor *= 2
+    RemainingSigma = np.sqrt( max( float(Sigma)**2-AccumulatedSigma**2,0.0 ) )/Factor
+    if RemainingSigma > 0:
+      KernelRadius = sum( Width//2 for Width in GetBoxFilterWidths( RemainingSigma ) ) if Fast else \
+        int( 4.0*RemainingSigma+0.5 )
+      Radius += KernelRadius*Factor
+    AccumulatedSigma = max( float(Sigma),AccumulatedSigma )
+  return ( Radius+Factor,Factor )
+
+def MeasureGaussianPyramidError(InputArray,Sigmas,DecimateSigma=4.0,Fast=False):
+  '''function MeasureGaussianPyramidError( InputArray,Sigmas,DecimateSigma,Fast ):
+  This function compares the levels of CreateImageGaussianPyramid() 
+  (in fast mode, if requested) with gaussian_filter() at full 
+  resolution, for one band (i.e. the Panchromatic band), and prints 
+  for every sigma the time taken by both, the maximum and RMS absolute
+  difference, and the maximum difference relative to the range of the
+  filtered band. With a single sigma, no pyramid is involved, so this
+  benchmarks the fast mode (box filters) against the exact filter.
+
+  Args:
+    InputArray (numpy.ndarray): Input 2D NumPy array.
+    Sigmas (list): List[] of sigmas (pixels) of Gaussian filters.
+    DecimateSigma (float): Blur (working pixels) before decimating by 2 (default 4).
+    Fast (bool): Measure fast mode (box filters) (default False).
+  Returns:
+    list: List[] of dict{} with 'sigma','seconds_pyramid','seconds_full','max_error','rms_error','relative_error'.
+  '''
+  InputArray = np.asarray(InputArray,dtype=np.float32)
+  Results = []
+  Pyramid = CreateImageGaussianPyramid(InputArray,Sigmas,DecimateSigma,Fast)
+  while True:
+    StartTime = time.perf_counter()
+    try:
+      Sigma,PyramidArray = next(Pyramid)
+    except StopIteration:
+      break
+    SecondsPyramid = time.perf_counter()-StartTime
+    StartTime = time.perf_counter()
+    FullArray = CreateImageGaussianFiltered(InputArray,Sigma)
+    SecondsFull = time.perf_counter()-StartTime
+    Difference = np.abs( PyramidArray-FullArray )
+    Range = float( np.nanmax(FullArray)-np.nanmin(FullArray) )
+    Results.append( { 'sigma':Sigma,'seconds_pyramid':SecondsPyramid,'seconds_full':SecondsFull,
+      'max_error':float(np.nanmax(Difference)),'rms_error':float(np.sqrt(np.nanmean(Difference**2))),
+      'relative_error':float(np.nanmax(Difference))/Range if Range>0 else 0.0 } )
+  print( '  \n    sigma   %s (s)   full (s)   max error   rms error   max error/range' % 
+    ( 'fast   ' if Fast else 'pyramid' ) )
+  for Result in Results:
+    print( '    %5g %13.3f %10.3f %11.4g %11.4g %17.4g' % ( Result['sigma'],Result['seconds_pyramid'],
+      Result['seconds_full'],Result['max_error'],Result['rms_error'],Result['relative_error'] ) )
+  return Results
+
+def CreateImageRGB(RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory,Format='VRT'):
+  '''function CreateImageRGB( RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory,Format):
   This function takes in filename strings for 
   Geotiffs that contain pixel data for the Red, 
   Green, and Blue channels for a set of satellite 
-  imagery. It calls the gdal_merge.py command-line tool 
-  (That comes with a standard GDAL installation) to 
-  merge these 3 Geotiffs into a single RGB mosaic. 
-  This 3-band RGB Geotiff filename string is returned.
+  imagery, and merges them (in-process, using GDAL) 
+  into a single 3-band RGB composite. The composite 
+  is either a virtual dataset (RGB.vrt), which only 
+  refers to the 3 bands and costs nothing to create, 
+  or a tiled, compressed Geotiff (RGB.tif, with the 
+  options of the active write profile, if any). This 
+  RGB filename string is returned.
 
   Args:
     RedGeotiff (str): Geotiff filename for Geotiff containing "Red" channel. 
     GreenGeotiff (str): Geotiff filename for Geotiff containing "Green" channel. 
     BlueGeotiff (str): Geotiff filename for Geotiff containing "Blue" channel. 
-    OutputDirectory (str): Geotiff string for Geotiff containing "Red" channel. 
+    OutputDirectory (str): Output directory.
+    Format (str): "VRT" (default) or "GTiff" (tiled, compressed).
   Returns:
-    str: Name of RGB-combination 3-band Geotiff.
+    str: Name of RGB-combination 3-band image, or None if it could not be created.
   '''
 
-  # get full path of gdal_merge.py ... if it is not installed,
-  # then we exit.
-  # ----------------------------------------------------------
-  GDAL_Merge_Path  = find_executable('gdal_merge.py')
-  if GDAL_Merge_Path is None:
-    print('  \n   GDAL gdal_merge.py script was not found. Exiting ... ')
-    return None
-  
-  # Create output filename for RGB Geotiff.
+  # Create output filename for RGB composite.
   # If the file already exists, then we remove it.
   # ----------------------------------------------
-  OutnameRGB = os.path.join( OutputDirectory , 'RGB.jp2' )
-  if os.path.isfile(OutnameRGB): os.remove(OutnameRGB)
+  OutnameVRT = os.path.join( OutputDirectory , 'RGB.vrt' )
+  OutnameRGB = OutnameVRT if Format == 'VRT' else os.path.join( OutputDirectory , 'RGB.tif' )
+  for OutFileName in set([ OutnameVRT,OutnameRGB ]):
+    if os.path.isfile(OutFileName): os.remove(OutFileName)
 
-  # Create command to create RGB mosaic (that will be run
-  # by the shell). Then we call misc.py's RunProcess command
-  # to create the file. We return output 
-  # RGB filename Geotiff string.
-  # ----------------------------------------------
-  GDAL_Merge_Command = ' '.join([GDAL_Merge_Path,' -q -separate -o ',
-    OutnameRGB, RedGeotiff,GreenGeotiff, BlueGeotiff ])
-  RunProcess( GDAL_Merge_Command )
+  # Stack the 3 bands (as separate bands) into a VRT. For a
+  # Geotiff, copy the VRT into a tiled, compressed Geotiff.
+  # --------------------------------------------------------
+  DatasetRGB = gdal.BuildVRT( OutnameVRT, 
+    [ os.path.abspath(RedGeotiff),os.path.abspath(GreenGeotiff),os.path.abspath(BlueGeotiff) ],
+    separate=True )
+  if DatasetRGB is None:
+    print('  \n   Unable to create RGB composite: '+OutnameRGB)
+    return None
+  if Format != 'VRT':
+    DatasetRGB = gdal.Translate( OutnameRGB, DatasetRGB, format='GTiff', 
+      creationOptions=GetCreationOptions( DatasetRGB.GetRasterBand(1).DataType,
+        [ 'TILED=YES','COMPRESS=DEFLATE','BIGTIFF=IF_SAFER' ] ) )
+    if os.path.isfile(OutnameVRT): os.remove(OutnameVRT)
+    if DatasetRGB is None:
+      print('  \n   Unable to create RGB composite: '+OutnameRGB)
+      return None
+  DatasetRGB = None
   return OutnameRGB
 
-def CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset ): 
+def StartImageRGB(RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory,Format='VRT'):
+  '''function StartImageRGB( RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory,Format):
+  This function starts creating the RGB composite (see CreateImageRGB())
+  on a background thread, so that sampling of training points and 
+  classification can continue meanwhile. Nothing downstream reads the 
+  RGB composite. Call result() on the returned future to wait for it.
+
+  Args:
+    RedGeotiff (str): Geotiff filename for Geotiff containing "Red" channel. 
+    GreenGeotiff (str): Geotiff filename for Geotiff containing "Green" channel. 
+    BlueGeotiff (str): Geotiff filename for Geotiff containing "Blue" channel. 
+    OutputDirectory (str): Output directory.
+    Format (str): "VRT" (default) or "GTiff" (tiled, compressed).
+  Returns:
+    concurrent.futures.Future: Future holding name of RGB composite (or None).
   '''
-  function CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset ):
+  Executor = ThreadPoolExecutor( max_workers=1 )
+  FutureRGB = Executor.submit( CreateImageRGB,
+    RedGeotiff,GreenGeotiff,BlueGeotiff,OutputDirectory,Format )
+  Executor.shutdown( wait=False )
+  return FutureRGB
+
+def CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset,Features=None,Quantize=False,
+    Sigmas=None,Fast=False ): 
+  '''
+  function CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset,Features,Quantize,Sigmas,
+    Fast ):
    This function creates "background" or gaussian-filtered imagery (Geotiffs) 
    for the following band(s) or band combinations: 
     (1) Red 
@@ -86,11 +348,24 @@ def CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset
     (5) Panchromatic (Red+Green+Blue+NIR/4.0)
     (6) NDVI (Normalized Difference Vegetation Index)
    To this end, this function calls CreateImageGaussianFiltered() above 
-   to compute this "blurred" imagery for these bands.
+   to compute this "blurred" imagery for these bands. If a subset of 
+   variables was selected, only their "background" imagery is created.
+   If Quantize is True, "background" bands are stored in the bit depth
+   of the input bands (of ReferenceDataset), and "background" NDVI as
+   scaled int16 (see Misc.WriteGeotiff()). If several sigmas are given,
+   the "background" imagery of each band is created at every sigma by
+   means of CreateImageGaussianPyramid(); imagery at sigmas other than 
+   5 is named with the sigma appended (i.e. BackgroundNDVI_S20.tif, see
+   Misc.GetBackgroundImageryKey()). In fast mode, Gaussian filters are
+   approximated by box filters (see CreateImageBoxFiltered()).
   Args: 
     FileArrayPointers (list): List of NumPy memory-map objects for bands listed above.
     OutputDirecotry (str): Output directory.
     ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset for reference.
+    Features (list): Optional list[] of selected variable names (default None, all).
+    Quantize (bool): Store imagery as integers instead of float32 (default False).
+    Sigmas (list): Optional list[] of sigmas (pixels) of Gaussian filters (default None, 5 only).
+    Fast (bool): Approximate Gaussian filters by box filters (default False).
   Returns: 
     dict: Python dictionary{} holding filenames for "background" imagery.
   '''
@@ -151,43 +426,55 @@ def CreateImageryBackground( FileArrayPointers,OutputDirectory,ReferenceDataset
   if os.path.isfile( BackgroundFileNameNDVI  ): os.remove( BackgroundFileNameNDVI )
 
   # Write Geotiffs for each of the 6 "background" image files
-  # named above 
-  # ---------------------------------------------------------
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNameRed   , CreateImageGaussianFiltered(FilePointerRed)   )
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNameGreen , CreateImageGaussianFiltered(FilePointerGreen) )
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNameBlue  , CreateImageGaussianFiltered(FilePointerBlue)  )
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNameNIR   , CreateImageGaussianFiltered(FilePointerNIR)   )
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNamePan   , CreateImageGaussianFiltered(FilePointerPan)   )
-  WriteGeotiff( ReferenceDataset, 
-    BackgroundFileNameNDVI  , CreateImageGaussianFiltered(FilePointerNDVI)  )
- 
-  # Append the output dict{} holding the "background" filenames
+  # named above (or those of them that were selected), and 
+  # append the output dict{} holding the "background" filenames
   # -----------------------------------------------------------
-  BackgroundImageryFilenameDict['bg_red']   = BackgroundFileNameRed 
-  BackgroundImageryFilenameDict['bg_green'] = BackgroundFileNameGreen 
-  BackgroundImageryFilenameDict['bg_blue']  = BackgroundFileNameBlue 
-  BackgroundImageryFilenameDict['bg_nir']   = BackgroundFileNameNIR
-  BackgroundImageryFilenameDict['bg_pan']   = BackgroundFileNamePan
-  BackgroundImageryFilenameDict['bg_ndvi']  = BackgroundFileNameNDVI
+  for VariableName,ImageryKey,FileName,FilePointer in [
+      ('Background_Red'  ,'bg_red'  ,BackgroundFileNameRed  ,FilePointerRed  ),
+      ('Background_Green','bg_green',BackgroundFileNameGreen,FilePointerGreen),
+      ('Background_Blue' ,'bg_blue' ,BackgroundFileNameBlue ,FilePointerBlue ),
+      ('Background_NIR'  ,'bg_nir'  ,BackgroundFileNameNIR  ,FilePointerNIR  ),
+      ('Background_Pan'  ,'bg_pan'  ,BackgroundFileNamePan  ,FilePointerPan  ),
+      ('Background_NDVI' ,'bg_ndvi' ,BackgroundFileNameNDVI ,FilePointerNDVI ) ]:
+    if Sigmas is None or list(Sigmas) == [ BackgroundSigma ]:
+      if not IsFeatureSelected( Features,VariableName ): continue
+      Levels = [ ( BackgroundSigma,CreateImageGaussianFiltered(FilePointer,BackgroundSigma,Fast) ) ]
+    else:
+      if not any( IsFeatureSelected( Features,GetBackgroundImageryKey( VariableName,ImageryKey,Sigma )[0] )
+        for Sigma in Sigmas ): continue
+      Levels = CreateImageGaussianPyramid( FilePointer,Sigmas,Fast=Fast )
+
+    for Sigma,BackgroundArray in Levels:
+      ( LevelVariableName,LevelImageryKey ) = GetBackgroundImageryKey( VariableName,ImageryKey,Sigma )
+      if not IsFeatureSelected( Features,LevelVariableName ): continue
+      LevelFileName = FileName if Sigma == BackgroundSigma else \
+        os.path.splitext( FileName )[0]+'_S%d.tif' % Sigma
+      Quantization = None
+      if Quantize and ImageryKey == 'bg_ndvi':
+        Quantization = QuantizationIndex
+      elif Quantize:
+        Quantization = GetBandQuantization( BackgroundArray,ReferenceDataset.GetRasterBand(1).DataType )
+      WriteGeotiff( ReferenceDataset, LevelFileName, BackgroundArray, Quantization )
+      BackgroundImageryFilenameDict[LevelImageryKey] = LevelFileName
   return BackgroundImageryFilenameDict
 
-def CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset ):
+def CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset,Features=None,Quantize=False ):
   '''
-  function CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset ):
+  function CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset,Features,Quantize ):
   This function computes NDVI (Normalized Diff. Vegetation Index)
   as well as SAVI (Soil-Adjusted NDVI) for 10 different thresholds 
   L = 0.1,0.2,...1.0. To this end, this function takes in file 
-  pointers 
+  pointers. If a subset of variables was selected, only the selected
+  NDVI/SAVI imagery is written (NDVI is still returned as an array).
+  If Quantize is True, NDVI and SAVI are stored as scaled int16 
+  (see Misc.WriteGeotiff()) instead of float32.
 
   Args:
     FileArrayPointers (list): List of NumPy memory map objects
     OutputDirectory (str): Output directory to write NDVI,SAVI imagery.
     ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset for reference to write Geotiffs.
+    Features (list): Optional list[] of selected variable names (default None, all).
+    Quantize (bool): Store imagery as scaled int16 instead of float32 (default False).
   Returns:
     dict: Dictionary{} holding filename(s) of SAVI/SAVI imagery, used for veg. classifiaction. 
   '''
@@ -215,17 +502,27 @@ def CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset ):
   # (Normalized Difference Vegetation Index)
   # ----------------------------------------------
 
+  # All arithmetic is done in float32, re-using the sum and 
+  # difference of the NIR and Red bands for NDVI and every SAVI,
+  # so that no float64 temporaries are created.
+  # -------------------------------------------------------------
+  FilePointerNIR = np.asarray( FilePointerNIR, dtype=np.float32 )
+  FilePointerRed = np.asarray( FilePointerRed, dtype=np.float32 )
+  DifferenceNIRRed = np.subtract( FilePointerNIR, FilePointerRed, dtype=np.float32 )
+  SumNIRRed        = np.add( FilePointerNIR, FilePointerRed, dtype=np.float32 )
+
   with warn.catch_warnings():
     warn.filterwarnings('ignore',category=RuntimeWarning)
     nrows,ncols = ReferenceDataset.RasterYSize,ReferenceDataset.RasterXSize
-    FilePointerNDVI  = ( FilePointerNIR - FilePointerRed ) / \
-      ( FilePointerNIR + FilePointerRed )
+    FilePointerNDVI  = np.divide( DifferenceNIRRed, SumNIRRed, dtype=np.float32 )
     FilePointerNDVI[np.isnan(FilePointerNDVI)]=-1.0
 
     OutnameNDVI = os.path.join( OutputDirectory, 'NDVI.tif' )
     if os.path.isfile( OutnameNDVI ) : os.remove( OutnameNDVI) 
-    WriteGeotiff( ReferenceDataset, OutnameNDVI, FilePointerNDVI )
-    NDVI_Imagery_Dict['ndvi'] = OutnameNDVI
+    if IsFeatureSelected( Features,'NDVI' ):
+      WriteGeotiff( ReferenceDataset, OutnameNDVI, FilePointerNDVI,
+        QuantizationIndex if Quantize else None )
+      NDVI_Imagery_Dict['ndvi'] = OutnameNDVI
 
   # compute soil-adjusted NDVI (SAVI) for L = 0.1, 0.2 ... 1.0
   # formula: 
@@ -235,22 +532,22 @@ def CreateImageryNDVI( FileArrayPointers,OutputDirectory,ReferenceDataset ):
   Threshes = [ 0.1 ,0.2, 0.3 , 0.4 , 0.5, 0.6, 0.7, 0.8, 0.9, 1.0   ]
   Labels   = [ '01','02','03','04' ,'05','06','07', '08','09', '10' ]
 
-  #L = 0.1
-  #while(L<1.0):
+  savi = np.empty_like( SumNIRRed )
   for L,Label in zip( Threshes,Labels ):
 
+    if not IsFeatureSelected( Features,'SAVI'+Label ): continue
     with warn.catch_warnings():
       warn.filterwarnings('ignore',category=RuntimeWarning)
-      savi = ((FilePointerNIR - FilePointerRed )/(FilePointerNIR + FilePointerRed + L )) * (1+L)
+      np.add( SumNIRRed, L, out=savi )
+      np.divide( DifferenceNIRRed, savi, out=savi )
+      savi *= (1+L)
 
-    #thresholdStringSAVI = '%02d'%int(str(L).replace('.',''))
     thresholdStringSAVI  = Label
     outnameSAVI = os.path.join( OutputDirectory , 'SAVI_' +thresholdStringSAVI+'.tif')
     if os.path.isfile(outnameSAVI): os.remove(outnameSAVI)
-    WriteGeotiff( ReferenceDataset , outnameSAVI , savi )
+    WriteGeotiff( ReferenceDataset , outnameSAVI , savi , QuantizationIndex if Quantize else None )
     NDVI_Imagery_Dict['savi'+thresholdStringSAVI] = outnameSAVI 
-    del savi
-    L+=0.1
+  del savi,SumNIRRed,DifferenceNIRRed
   return ( NDVI_Imagery_Dict , FilePointerNDVI )
 
 def ComputeSimulatedPanchromaticBand( FileArrayPointers,OutDir,ReferenceDataset ):
@@ -289,10 +586,13 @@ def ComputeSimulatedPanchromaticBand( FileArrayPointers,OutDir,ReferenceDataset
 
   # Create simulated Panchromatic Image: 
   #   ( Red + Green + Blue + NIR ) / 4.0
-  # as a NumPy MemoryMap object.
+  # as a float32 NumPy array, summed in-place.
   # ----------------------------------------
 
-  FilePointerPan = ( FilePointerRed + FilePointerGreen + FilePointerBlue + FilePointerNIR ) / 4.0
+  FilePointerPan  = np.add( FilePointerRed, FilePointerGreen, dtype=np.float32 )
+  FilePointerPan += FilePointerBlue
+  FilePointerPan += FilePointerNIR
+  FilePointerPan /= 4.0
   OutnamePanGeotiff = os.path.join( OutDir ,'Pan.tif')
   
   # If panchromatic image file already exists, then remove it.
@@ -1,121 +1,48 @@
 import sys
 import re
 import os
+import json
+import hashlib
 import numpy as np
 import shapefile
 from osgeo import osr,gdal,ogr
 from pyproj import Proj,transform
 from distutils.spawn import find_executable
-from Misc import RunProcess
+from Misc import RunProcess,GetFeatureImageryKeys,ReadBandArray
 
-def GetPixelValuesAllImagery(Row,Column,FileNameDict):
-  '''function GetPixelValuesAllImagery(Row,Column,FileNameDict):
+def GetPixelValuesAllImagery(Row,Column,FileNameDict,Features=None):
+  '''function GetPixelValuesAllImagery(Row,Column,FileNameDict,Features):
   This function takes in integer column (X) and row (Y) 
   values, and opens up all imagery (SAVI,NDVI,Pan,RGB,...)
   and retrieves the spectral pixel values at that (row,column)
   point. It returns these pixel values as a comma-delimited or
   comma-separated string. This string will later be written
   to a CSV containing "training data" in which to classify 
-  vegetation in the set of satellite imagery.
+  vegetation in the set of satellite imagery. Pixel values 
+  are returned in the column order of FeatureImageryKeys; if 
+  a subset of variables was selected, only those are returned.
+  Quantized imagery is read as its original values (see 
+  Misc.ReadBandArray()).
 
   Args:
     Row (int): Row of pixel in imagery.
     Column (int): Column of pixel in imagery.
     FileNameDict (dict): Dictionary holding all filenames of imagery set.
+    Features (list): Optional list[] of selected variable names (default None, all).
   Returns: 
     str: A string holding pixel values from all imagery for input point (Row,Column)
   '''
 
-  # Open up NDVI, Panchromatic, Red, Green, Blue,
-  # as well as NIR bands as GDAL raster datasets.
-  # ----------------------------------------------
-  DatasetNDVI  = gdal.Open( FileNameDict['ndvi'] )
-  DatasetPan   = gdal.Open( FileNameDict['pan'] )
-  DatasetRed   = gdal.Open( FileNameDict['red'] )
-  DatasetGreen = gdal.Open( FileNameDict['green'] )
-  DatasetBlue  = gdal.Open( FileNameDict['blue'] )
-  DatasetNIR   = gdal.Open( FileNameDict['nir'] )
-
-  # Open up SAVI (Soil-Adjusted NDVI) Geotiffs 
-  # as GDAL raster image datasets.
-  # ------------------------------------------
-
-  DatasetSAVI01 = gdal.Open( FileNameDict['savi01'] )
-  DatasetSAVI02 = gdal.Open( FileNameDict['savi02'] )
-  DatasetSAVI03 = gdal.Open( FileNameDict['savi03'] )
-  DatasetSAVI04 = gdal.Open( FileNameDict['savi04'] )
-  DatasetSAVI05 = gdal.Open( FileNameDict['savi05'] )
-  DatasetSAVI06 = gdal.Open( FileNameDict['savi06'] )
-  DatasetSAVI07 = gdal.Open( FileNameDict['savi07'] )
-  DatasetSAVI08 = gdal.Open( FileNameDict['savi08'] )
-  DatasetSAVI09 = gdal.Open( FileNameDict['savi09'] )
-  DatasetSAVI10 = gdal.Open( FileNameDict['savi10'] )
-
-  # Open up "Background" imagery (Gaussian-filtered)
-  # for Red,Green,Blue,NIR,Panchromatic band, as well
-  # as NDVI band.
-  # --------------------------------------------------
-  DatasetBackgroundRed   = gdal.Open( FileNameDict['bg_red'] )
-  DatasetBackgroundGreen = gdal.Open( FileNameDict['bg_green'] )
-  DatasetBackgroundBlue  = gdal.Open( FileNameDict['bg_blue'] )
-  DatasetBackgroundNIR   = gdal.Open( FileNameDict['bg_nir'] )
-  DatasetBackgroundPan   = gdal.Open( FileNameDict['bg_pan'] )
-  DatasetBackgroundNDVI  = gdal.Open( FileNameDict['bg_ndvi'] )
-
-  # Get Pixel values at point (Row,Column) for the following:
-  #   (1) NDVI Geotiff
-  #   (2) Panchromatic Image
-  #   (3) Red,Green,Blue,NIR channels
-  # ---------------------------------------------------------
-  NDVI_Value = DatasetNDVI.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  PanchromaticValue = DatasetPan.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-
-  RedValue    = DatasetRed.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  GreenValue  = DatasetGreen.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BlueValue   = DatasetBlue.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  NIRValue    = DatasetNIR.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
- 
-  # Get pixel values at (Row,Column) location for 
-  #  Soil-Adjusted NDVI (SAVI) imagery in imagery set.
-  # --------------------------------------------------
-  SAVI01Value = DatasetSAVI01.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI02Value = DatasetSAVI02.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI03Value = DatasetSAVI03.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI04Value = DatasetSAVI04.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI05Value = DatasetSAVI05.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI06Value = DatasetSAVI06.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI07Value = DatasetSAVI07.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI08Value = DatasetSAVI08.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI09Value = DatasetSAVI09.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  SAVI10Value = DatasetSAVI10.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-
-  # Get Pixel value(s) at Row,Column location for: 
-  #   Background Red,Green,Blue,NIR,Panchromatic,and NDVI channels
-  #   i.e. "background" means image was "gaussian filtered"
-  # --------------------------------------------------------------
-  BackgroundValueRed   = DatasetBackgroundRed.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BackgroundValueGreen = DatasetBackgroundGreen.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BackgroundValueBlue  = DatasetBackgroundBlue.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BackgroundValueNIR   = DatasetBackgroundNIR.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BackgroundValuePan   = DatasetBackgroundPan.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-  BackgroundValueNDVI  = DatasetBackgroundNDVI.GetRasterBand(1).ReadAsArray(Column,Row,1,1)[0,0]
-
-  # Close all Image Raster datasets ... we set them to None 
-  # -------------------------------------------------------
-  DatasetNDVI,DatasetPan = None, None
-  DatasetRed,DatasetGreen,DatasetBlue,DatasetNIR = None,None,None,None
-  DatasetSAVI01,DatasetSAVI02,DatasetSAVI03,DatasetSAVI04,DatasetSAVI05 = None,None,None,None,None
-  DatasetSAVI06,DatasetSAVI07,DatasetSAVI08,DatasetSAVI09,DatasetSAVI10 = None,None,None,None,None
-  DatasetBackgroundRed,DatasetBackgroundGreen,DatasetBackgroundBlue = None,None,None
-  DatasetBackgroundNIR,DatasetBackgroundPan,DatasetBackgroundNDVI = None,None,None
-
-  # Store all pixel values in a list[] 
-  # ----------------------------------
-  PixelValues = [ NDVI_Value,PanchromaticValue,RedValue,GreenValue,BlueValue,NIRValue,\
-    SAVI01Value,SAVI02Value,SAVI03Value,SAVI04Value,SAVI05Value,
-    SAVI06Value,SAVI07Value,SAVI08Value,SAVI09Value,SAVI10Value,
-    BackgroundValueRed,BackgroundValueGreen,BackgroundValueBlue,
-    BackgroundValueNIR,BackgroundValuePan,BackgroundValueNDVI ]
+  # Open up each of the imagery (NDVI, Panchromatic, 
+  # Red, Green, Blue, NIR, SAVI and "Background" imagery) 
+  # as GDAL raster datasets, get the pixel value at 
+  # point (Row,Column), and close the dataset again.
+  # -----------------------------------------------------
+  PixelValues = []
+  for VariableName,ImageryKey in GetFeatureImageryKeys( FileNameDict,Features ):
+    Dataset = gdal.Open( FileNameDict[ImageryKey] )
+    PixelValues.append( ReadBandArray( Dataset.GetRasterBand(1),Column,Row,1,1 )[0,0] )
+    Dataset = None
  
   # Join all pixel values in list to comma-separated string
   # -------------------------------------------------------
@@ -132,6 +59,81 @@ def GetPixelValuesAllImagery(Row,Column,FileNameDict):
   else:
     return OutPixelValueString
 
+def GetSceneFingerprint(ImgDict,Features=None):
+  '''function GetSceneFingerprint(ImgDict,Features):
+  This function computes a fingerprint (SHA-1 hex digest) for the set of
+  satellite imagery used to sample training data. For every raster in 
+  the input dictionary (sorted by key), the dimensions, geotransform, 
+  projection and the GDAL checksum of each band go into the digest. 
+  If any of the imagery (NDVI,SAVI,RGB,...) changes, the fingerprint 
+  changes, and cached training samples must no longer be used. The 
+  selected variables go into the digest too, since they decide the 
+  columns of the cached samples.
+
+  Args:
+    ImgDict (dict): Dictionary{} holding names of all raster imagery used for vegetation classification.
+    Features (list): Optional list[] of selected variable names (default None, all).
+  Returns:
+    str: Hex digest fingerprint of imagery set.
+  '''
+  Digest = hashlib.sha1()
+  Digest.update(','.join([ VariableName for VariableName,ImageryKey in 
+    GetFeatureImageryKeys(ImgDict,Features) ]).encode('utf-8'))
+  for Key in sorted(ImgDict.keys()):
+    Dataset = gdal.Open(ImgDict[Key])
+    if Dataset is None: continue
+    Digest.update(Key.encode('utf-8'))
+    Digest.update(str((Dataset.RasterXSize,Dataset.RasterYSize,Dataset.RasterCount)).encode('utf-8'))
+    Digest.update(str(Dataset.GetGeoTransform()).encode('utf-8'))
+    Digest.update(Dataset.GetProjectionRef().encode('utf-8'))
+    for Band in range(Dataset.RasterCount):
+      Digest.update(str(Dataset.GetRasterBand(Band+1).Checksum()).encode('utf-8'))
+    Dataset=None
+  return Digest.hexdigest()
+
+def ReadTrainingSampleCache(CacheFileName,Fingerprint):
+  '''function ReadTrainingSampleCache(CacheFileName,Fingerprint):
+  This function reads the cache of sampled training pixel values 
+  (a JSON file) written by a previous run. The cache is keyed by 
+  point geometry and label. If the cache does not exist, cannot be 
+  read, or was written for a different imagery set (fingerprint), 
+  an empty cache is returned.
+
+  Args:
+    CacheFileName (str): Name of JSON cache file.
+    Fingerprint (str): Fingerprint of current imagery set (see GetSceneFingerprint()).
+  Returns:
+    dict: Dictionary{} mapping point keys to CSV pixel value strings (or None).
+  '''
+  if not os.path.isfile(CacheFileName): 
+    return {}
+  try:
+    with open(CacheFileName,'r') as CacheFile:
+      Cache = json.load(CacheFile)
+  except Exception as e: 
+    print('WARNING: unable to read training sample cache: ' , str(e))
+    return {}
+  if Cache.get('fingerprint') != Fingerprint:
+    return {}
+  return Cache.get('samples',{})
+
+def WriteTrainingSampleCache(CacheFileName,Fingerprint,Samples):
+  '''function WriteTrainingSampleCache(CacheFileName,Fingerprint,Samples):
+  This function writes the cache of sampled training pixel values to 
+  a JSON file. The file is first written under a temporary name and 
+  then moved into place, so an interrupted run never leaves a 
+  half-written cache behind.
+
+  Args:
+    CacheFileName (str): Name of JSON cache file.
+    Fingerprint (str): Fingerprint of current imagery set (see GetSceneFingerprint()).
+    Samples (dict): Dictionary{} mapping point keys to CSV pixel value strings (or None).
+  '''
+  TempCacheFileName = CacheFileName+'.tmp'
+  with open(TempCacheFileName,'w') as CacheFile:
+    json.dump({ 'fingerprint' : Fingerprint, 'samples' : Samples },CacheFile)
+  os.replace(TempCacheFileName,CacheFileName)
+
 def ReadShapeFilePoints(ShapeFileName,ProjStr):
   '''function ReadShapeFilePoints( ShapeFileName, ProjStr ):
   This function reads the points in a shapefile (should be a POINTS 
@@ -218,14 +220,306 @@ def ReadShapeFilePoints(ShapeFileName,ProjStr):
     'Longitudes': Lons
   }
 
-def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackground ):
+def ShapeFileHasPolygons(ShapeFileName):
+  '''function ShapeFileHasPolygons(ShapeFileName):
+  This function checks whether a shapefile holds POLYGON 
+  (training area) geometries, rather than POINT geometries.
+
+  Args:
+    ShapeFileName (str): Name of shapefile. Should have .shp extension.
+  Returns:
+    bool: True if shapefile holds polygons.
+  '''
+  ShapeFileObject = ogr.Open(ShapeFileName)
+  if ShapeFileObject is None: return False
+  GeometryType = ogr.GT_Flatten(ShapeFileObject.GetLayer().GetGeomType())
+  return GeometryType in (ogr.wkbPolygon,ogr.wkbMultiPolygon)
+
+def RasterizeShapeFilePolygons(ShapeFileName,ReferenceDataset):
+  '''function RasterizeShapeFilePolygons(ShapeFileName,ReferenceDataset):
+  This function rasterizes (burns) the polygons in a shapefile onto 
+  the grid of the imagery (an in-memory raster with the dimensions,
+  geotransform and projection of ReferenceDataset). Polygons are 
+  reprojected to the projection of the imagery if needed. A pixel 
+  is covered if its center falls inside a polygon.
+
+  Args:
+    ShapeFileName (str): Name of POLYGON shapefile.
+    ReferenceDataset (osgeo.gdal.Dataset): GDAL dataset of imagery (i.e. Panchromatic band).
+  Returns:
+    numpy.ndarray: 2D array of 1s (covered by polygons) and 0s, or None on failure.
+  '''
+  ShapeFileObject = ogr.Open(ShapeFileName)
+  if ShapeFileObject is None: return None
+  MaskDataset = gdal.GetDriverByName('MEM').Create('',
+    ReferenceDataset.RasterXSize,ReferenceDataset.RasterYSize,1,gdal.GDT_Byte)
+  MaskDataset.SetGeoTransform(ReferenceDataset.GetGeoTransform())
+  MaskDataset.SetProjection(ReferenceDataset.GetProjectionRef())
+  if gdal.RasterizeLayer(MaskDataset,[1],ShapeFileObject.GetLayer(),burn_values=[1]) != 0:
+    return None
+  return MaskDataset.GetRasterBand(1).ReadAsArray()
+
+def GetPixelValuesAllImageryBlocks(Rows,Columns,FileNameDict,Features=None,BlockRows=512):
+  '''function GetPixelValuesAllImageryBlocks(Rows,Columns,FileNameDict,Features,BlockRows):
+  This function retrieves the pixel values from all imagery (SAVI,
+  NDVI,Pan,RGB,...) for many pixels at once. Rather than reading 
+  pixel by pixel (see GetPixelValuesAllImagery()), the image is 
+  processed in blocks of BlockRows rows: for each block, the window 
+  spanning the pixels in it is read once from each image, and the 
+  pixel values are picked out of it by (vectorized) indexing.
+
+  Args:
+    Rows (numpy.ndarray): Rows of pixels (sorted).
+    Columns (numpy.ndarray): Columns of pixels.
+    FileNameDict (dict): Dictionary holding all filenames of imagery set.
+    Features (list): Optional list[] of selected variable names (default None, all).
+    BlockRows (int): Number of image rows per block (default 512).
+  Returns:
+    list: List[] of 1D arrays of pixel values, one per variable (in column order).
+  '''
+  FeatureKeys = GetFeatureImageryKeys(FileNameDict,Features)
+  Datasets    = [ gdal.Open(FileNameDict[ImageryKey]) for VariableName,ImageryKey in FeatureKeys ]
+  PixelValues = [ [] for Dataset in Datasets ]
+  for StartRow in range(int(Rows.min()),int(Rows.max())+1,BlockRows):
+    InBlock = (Rows>=StartRow) & (Rows<StartRow+BlockRows)
+    if not np.any(InBlock): continue
+    BlockRowIndices,BlockColumnIndices = Rows[InBlock],Columns[InBlock]
+    FirstRow,LastRow = int(BlockRowIndices.min()),int(BlockRowIndices.max())
+    FirstColumn,LastColumn = int(BlockColumnIndices.min()),int(BlockColumnIndices.max())
+    for Index,Dataset in enumerate(Datasets):
+      Window = ReadBandArray(Dataset.GetRasterBand(1),FirstColumn,FirstRow,
+        LastColumn-FirstColumn+1,LastRow-FirstRow+1)
+      PixelValues[Index].append(Window[BlockRowIndices-FirstRow,BlockColumnIndices-FirstColumn])
+  Datasets = None
+  return [ np.concatenate(Values) for Values in PixelValues ]
+
+def CreateSampleReservoir(Quotas=None,ThinningSize=None,RandomSeed=0):
+  '''function CreateSampleReservoir(Quotas,ThinningSize,RandomSeed):
+  This function creates an (empty) stratified sample reservoir: a 
+  dictionary{} holding, for each class (label), a uniform random 
+  sample of at most Quotas[label] of the training pixels offered to
+  it (see AddReservoirSamples()). Pixels are offered while they are
+  found in the shapefiles, before their pixel values are read, so 
+  that only the sampled ones are ever read and held in memory. Each 
+  offered pixel is given a random key, and the pixels with the 
+  smallest keys are kept (a reservoir sample), so that the sample is
+  reproducible given RandomSeed. With spatial thinning, each
+  ThinningSize x ThinningSize block of pixels holds at most one pixel
+  per class: the one with the smallest key of all pixels offered in
+  that block (a uniform choice, whatever the order in which pixels
+  are found), and the quota applies to these pixels.
+
+  Args:
+    Quotas (dict): Optional dict{} of maximum number of samples per label (1 or 0).
+    ThinningSize (int): Optional size (pixels) of blocks for spatial thinning.
+    RandomSeed (int): Seed for random keys (default 0).
+  Returns:
+    dict: Dictionary{} holding sample reservoir.
+  '''
+  return {
+    'quotas'   : dict(Quotas) if Quotas is not None else {},
+    'thinning' : ThinningSize,
+    'random'   : np.random.RandomState(RandomSeed),
+    'classes'  : {}
+  }
+
+def AddReservoirSamples(Reservoir,Label,Rows,Columns,PointKeys=None):
+  '''function AddReservoirSamples(Reservoir,Label,Rows,Columns,PointKeys):
+  This function offers a batch of training pixels (rows and columns
+  in the imagery) of one class to a sample reservoir (see 
+  CreateSampleReservoir()). Each pixel is given a random key. With 
+  spatial thinning, a pixel only replaces the sample of its block if
+  its key is the smallest offered in that block so far (the smallest
+  key per block is remembered, also for blocks whose sample was later
+  dropped by the quota). Then only the pixels with the smallest keys,
+  up to the quota of the class, are kept.
+
+  Args:
+    Reservoir (dict): Dictionary{} holding sample reservoir.
+    Label (int): Label of class (1 or 0).
+    Rows (numpy.ndarray): Rows of pixels.
+    Columns (numpy.ndarray): Columns of pixels.
+    PointKeys (list): Optional keys of points (for incremental cache), one per pixel.
+  '''
+  Rows,Columns = np.asarray(Rows,dtype=np.int64),np.asarray(Columns,dtype=np.int64)
+  if PointKeys is None: PointKeys = [None]*Rows.size
+  PointKeys = np.asarray(PointKeys,dtype=object)
+  Class = Reservoir['classes'].setdefault(Label,{ 
+    'keys':np.zeros(0), 'rows':np.zeros(0,np.int64), 'columns':np.zeros(0,np.int64),
+    'points':np.zeros(0,dtype=object), 'cells':{}, 'offered':0 })
+  Keys = Reservoir['random'].random_sample(Rows.size)
+
+  # Spatial thinning: keep the pixel with the smallest key per 
+  # block (within the batch), if it is smaller than any key 
+  # offered before in that block, and drop the sample it replaces
+  # -------------------------------------------------------------
+  ThinningSize = Reservoir['thinning']
+  if ThinningSize is not None and Rows.size>0:
+    Cells = (Rows//ThinningSize)*(2**31)+(Columns//ThinningSize)
+    Order = np.lexsort((Keys,Cells))
+    _,First = np.unique(Cells[Order],return_index=True)
+    Smallest = Order[First]
+    Smallest = Smallest[ np.array([ Keys[Index] < Class['cells'].get(int(Cells[Index]),np.inf)
+      for Index in Smallest ],dtype=bool) ]
+    Class['cells'].update( ( int(Cells[Index]),Keys[Index] ) for Index in Smallest )
+    KeptCells = (Class['rows']//ThinningSize)*(2**31)+(Class['columns']//ThinningSize)
+    Replaced = np.isin(KeptCells,Cells[Smallest])
+    for Field in ( 'keys','rows','columns','points' ):
+      Class[Field] = Class[Field][~Replaced]
+    Rows,Columns,PointKeys,Keys = Rows[Smallest],Columns[Smallest],PointKeys[Smallest],Keys[Smallest]
+    Class['offered'] = len(Class['cells'])
+  else:
+    Class['offered'] += Rows.size
+
+  # Keep the pixels with the smallest keys (up to quota)
+  # ----------------------------------------------------
+  Keys    = np.concatenate([ Class['keys'],Keys ])
+  Rows    = np.concatenate([ Class['rows'],Rows ])
+  Columns = np.concatenate([ Class['columns'],Columns ])
+  PointKeys = np.concatenate([ Class['points'],PointKeys ])
+  Quota = Reservoir['quotas'].get(Label)
+  if Quota is not None and Keys.size>Quota:
+    Kept = np.argpartition(Keys,Quota-1)[:Quota]
+    Keys,Rows,Columns,PointKeys = Keys[Kept],Rows[Kept],Columns[Kept],PointKeys[Kept]
+  Class['keys'],Class['rows'],Class['columns'],Class['points'] = Keys,Rows,Columns,PointKeys
+
+def WriteReservoirSamplesCSV(Reservoir,ImgDict,CSVWriter,SampleCache=None,NewSampleCache=None,Features=None):
+  '''function WriteReservoirSamplesCSV(Reservoir,ImgDict,CSVWriter,SampleCache,NewSampleCache,Features):
+  This function reads the pixel values of all training pixels kept 
+  in a sample reservoir (see CreateSampleReservoir()), block-wise 
+  (see GetPixelValuesAllImageryBlocks()), and writes one line per 
+  pixel to the training data CSV (CSVWriter object), class by class 
+  in the order the classes were offered. Pixel values of points 
+  found in the incremental cache are taken from it instead. Pixels
+  with any NaN value are skipped.
+
+  Args:
+    Reservoir (dict): Dictionary{} holding sample reservoir.
+    ImgDict (dict): Dictionary{} holding names of all raster imagery used for vegetation classification.
+    CSVWriter (file): CSV text file object. Open for writing.
+    SampleCache (dict): Optional cache{} of pixel values sampled in a previous run (incremental mode).
+    NewSampleCache (dict): Optional cache{} to which pixel values of kept points are added.
+    Features (list): Optional list[] of selected variable names (default None, all).
+  Returns:
+    int: Number of points whose pixel values were read (i.e. not found in the cache).
+  '''
+  NumSampled = 0
+  for Label,Class in Reservoir['classes'].items():
+    print( 'training samples kept for label ' , str(Label) , ': ' , 
+      str(Class['rows'].size) , ' of ' , str(Class['offered']) )
+    if Class['rows'].size<1: continue
+
+    # Order kept pixels by row and column, then read the 
+    # pixel values of those not found in the cache
+    # ---------------------------------------------------
+    Order = np.lexsort((Class['columns'],Class['rows']))
+    Rows,Columns,PointKeys = Class['rows'][Order],Class['columns'][Order],Class['points'][Order]
+    OutStrings = [ None ]*Rows.size
+    ToRead = []
+    for Index,PointKey in enumerate(PointKeys):
+      if PointKey is not None and NewSampleCache is not None and PointKey in NewSampleCache:
+        OutStrings[Index] = NewSampleCache[PointKey]
+      elif PointKey is not None and SampleCache is not None and PointKey in SampleCache:
+        OutStrings[Index] = SampleCache[PointKey]
+      else:
+        ToRead.append(Index)
+    if len(ToRead)>0:
+      ToRead = np.array(ToRead)
+      PixelValues = GetPixelValuesAllImageryBlocks( Rows[ToRead],Columns[ToRead],ImgDict,Features )
+      for Position,Index in enumerate(ToRead):
+        OutPixelValueString = ','.join([ str(Values[Position]) for Values in PixelValues ])
+        OutStrings[Index] = None if 'nan' in OutPixelValueString else OutPixelValueString
+      NumSampled += int(sum( 1 for Index in ToRead if PointKeys[Index] is not None ))
+
+    for PointKey,OutString in zip(PointKeys,OutStrings):
+      if PointKey is not None and NewSampleCache is not None:
+        NewSampleCache[PointKey] = OutString
+      if OutString is not None:
+        CSVWriter.write('%s\n'%(OutString+','+str(Label)))
+  return NumSampled
+
+def WriteTrainingPolygonsCSV( ImgDict,Shpfile,CSVWriter,IsBackground,MaxSamples=None,RandomSeed=0,Features=None,
+    Reservoir=None ):
+  '''function WriteTrainingPolygonsCSV( ImgDict,Shpfile,CSVWriter,IsBackground,MaxSamples,RandomSeed,Features,
+    Reservoir ):
+  This function writes the pixel values of all pixels covered by 
+  the polygons (training areas) in a shapefile to the training data
+  CSV (CSVWriter object), one line per pixel, just as for points (see
+  WriteTrainingPointsCSV()). The polygons are rasterized onto the 
+  imagery grid in memory. If they cover more than MaxSamples pixels,
+  a random subset of MaxSamples pixels (without replacement, seeded
+  by RandomSeed) is used, so that huge polygons do not blow up 
+  training time. Pixels with any NaN value are skipped.
+
+  If a sample reservoir is given (see CreateSampleReservoir()), the 
+  covered pixels are offered to it block by block instead, and are
+  written later (see WriteReservoirSamplesCSV()). MaxSamples is then
+  the quota of the class, unless the reservoir has one.
+
+  Args:
+    ImgDict (dict): Dictionary{} holding names of all raster imagery used for vegetation classification.
+    Shpfile (str): Shapefile containing polygons whose covered pixel values will be written to CSV.
+    CSVWriter (file): CSV text file object. Open for writing.
+    IsBackground (int): 1 or 0 , for vegetation and non-vegeation. Flag for final "Label" column in CSV.
+    MaxSamples (int): Optional maximum number of pixels sampled for this class (default None, all).
+    RandomSeed (int): Seed for random subsampling (default 0).
+    Features (list): Optional list[] of selected variable names (default None, all).
+    Reservoir (dict): Optional sample reservoir to offer pixels to (default None).
+  Returns:
+    int: Number of pixels whose pixel values were sampled (0 with a reservoir).
+  '''
+  LabelColumnValue = 0 if IsBackground else 1
+
+  # Rasterize polygons onto grid of imagery (panchromatic band),
+  # and get rows/columns of all covered pixels.
+  # -------------------------------------------------------------
+  Mask = RasterizeShapeFilePolygons( Shpfile, gdal.Open(ImgDict['pan']) )
+  if Mask is None:
+    print('  \n    Failure to rasterize following shapefile: '+Shpfile+'. Exiting ...')
+    sys.exit(1)
+  if Reservoir is not None:
+    if MaxSamples is not None: 
+      Reservoir['quotas'].setdefault(LabelColumnValue,MaxSamples)
+    for StartRow in range(0,Mask.shape[0],512):
+      Rows,Columns = np.nonzero(Mask[StartRow:StartRow+512,:])
+      AddReservoirSamples( Reservoir,LabelColumnValue,Rows+StartRow,Columns )
+    return 0
+  Rows,Columns = np.nonzero(Mask)
+  Mask = None
+  if Rows.size<1:
+    print('  \n    Unable to find any valid training data within geographic domain of input imagery.')
+    sys.exit(1)
+
+  # Randomly subsample pixels covered by polygons
+  # if there are more than MaxSamples of them.
+  # ---------------------------------------------
+  NumCovered = Rows.size
+  if MaxSamples is not None and NumCovered>MaxSamples:
+    Sample = np.sort( np.random.RandomState(RandomSeed).choice(NumCovered,MaxSamples,replace=False) )
+    Rows,Columns = Rows[Sample],Columns[Sample]
+  print( 'training pixels in polygons: ' , str(NumCovered) , ' (sampled: ' , str(Rows.size) , ')' )
+
+  # Read pixel values block-wise, and write one line
+  # per pixel (skipping pixels with any NaN value)
+  # -------------------------------------------------
+  PixelValues = GetPixelValuesAllImageryBlocks( Rows,Columns,ImgDict,Features )
+  for Pixel in range(Rows.size):
+    OutPixelValueString = ','.join([ str(Values[Pixel]) for Values in PixelValues ])
+    if 'nan' in OutPixelValueString: continue
+    CSVWriter.write('%s\n'%(OutPixelValueString+','+str(LabelColumnValue)))
+  return Rows.size
+
+def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackground,SampleCache=None,NewSampleCache=None,Features=None,
+    Reservoir=None ):
   '''fucntion WriteTRainingPointsToCSV( OutDIr,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackground ):
   This function takes in a shapefile, reads it set of Latitude and Longitude
   points, then converts those points from Latitude/Longitude (projected) 
   coordinate space to Row/Column space of the input imagery (in ImgDict). 
   For each point in the shapefile, a new line is written to the training data
   CSV dataset (CSVWriter object) containing all pixel values for all 
-  of the input satellite imagery dataset (NDVI,SAVI,RGB,...).
+  of the input satellite imagery dataset (NDVI,SAVI,RGB,...). If a sample
+  reservoir is given (see CreateSampleReservoir()), the points are offered 
+  to it instead, and are written later (see WriteReservoirSamplesCSV()).
 
   Args:
     OutDir (str): Output directory where "training" points CSV will be located.
@@ -234,7 +528,12 @@ def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackgroun
     CSVWriter (file): CSV text file object. Open for writing.
     ProjStr (str): Projection string for output projection.
     IsBackground (int): 1 or 0 , for vegetation and non-vegeation. Flag for final "Label" column in CSV.
-
+    SampleCache (dict): Optional cache{} of pixel values sampled in a previous run (incremental mode).
+    NewSampleCache (dict): Optional cache{} to which all pixel values for this shapefile are added.
+    Features (list): Optional list[] of selected variable names (default None, all).
+    Reservoir (dict): Optional sample reservoir to offer points to (default None).
+  Returns:
+    int: Number of points whose pixel values were sampled (i.e. not found in the cache).
   '''
   # Get path of gdaltransform GDAL command-line tool.
   # If it does not exist (NONE), then exit. 
@@ -280,8 +579,11 @@ def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackgroun
   # Read set of Rows and Columns corresponding to 
   # points in input shapefile as a NROWSx2 array 
   # ---------------------------------------------
-  RowsAndColumns = np.rint(np.loadtxt(RowsColsCSV)[:,0:2])
-  RowsAndColumns = RowsAndColumns[RowsAndColumns.min(axis=1)>-1,:] 
+  RowsAndColumns = np.rint(np.loadtxt(RowsColsCSV,ndmin=2)[:,0:2])
+  ValidPoints    = RowsAndColumns.min(axis=1)>-1
+  RowsAndColumns = RowsAndColumns[ValidPoints,:] 
+  Lons = [ Lon for Lon,Valid in zip(Lons,ValidPoints) if Valid ]
+  Lats = [ Lat for Lat,Valid in zip(Lats,ValidPoints) if Valid ]
   if RowsAndColumns.shape[0]<1:
     print('  \n    Unable to find any valid training data within geographic domain of input imagery.')
     sys.exit(1)
@@ -310,8 +612,23 @@ def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackgroun
   DatasetPanchromatic=None
   del DatasetPanchromatic
 
-  # write pixel values representing points in shapefile to CSV
+  # With a sample reservoir, offer all points within the 
+  # imagery to it, keyed as for the incremental cache.
+  # ----------------------------------------------------
+  if Reservoir is not None:
+    InImage = (RowsAndColumns[:,0]<=NumCols-1) & (RowsAndColumns[:,1]<=NumRows-1)
+    AddReservoirSamples( Reservoir,LabelColumnValue,
+      RowsAndColumns[InImage,1],RowsAndColumns[InImage,0],
+      [ '%d:%r:%r' % (LabelColumnValue,Lons[Point],Lats[Point]) 
+        for Point in np.nonzero(InImage)[0] ] )
+    return 0
+
+  # write pixel values representing points in shapefile to CSV.
+  # In incremental mode, pixel values of points (keyed by label 
+  # and projected point geometry) that were already sampled in 
+  # a previous run are taken from the cache instead.
   # ----------------------------------------------------------
+  NumSampled = 0
   for Point in range(RowsAndColumns.shape[0]):
    
     # get current column,row ~ (X,Y)
@@ -322,13 +639,23 @@ def WriteTrainingPointsCSV( OutDir,ImgDict,Shpfile,CSVWriter,ProjStr,IsBackgroun
     try:
       LonValue        = Lons[Point]
       LatValue        = Lats[Point]
-      OutString  = GetPixelValuesAllImagery(Row,Column,ImgDict)
+      PointKey        = '%d:%r:%r' % (LabelColumnValue,LonValue,LatValue)
+      if NewSampleCache is not None and PointKey in NewSampleCache:
+        OutString  = NewSampleCache[PointKey]
+      elif SampleCache is not None and PointKey in SampleCache:
+        OutString  = SampleCache[PointKey]
+      else:
+        OutString  = GetPixelValuesAllImagery(Row,Column,ImgDict,Features)
+        NumSampled += 1
+      if NewSampleCache is not None:
+        NewSampleCache[PointKey] = OutString
       if OutString is not None:
-        OutString += ','+str(LabelColumnValue)
-        CSVWriter.write('%s\n'%OutString)
+        CSVWriter.write('%s\n'%(OutString+','+str(LabelColumnValue)))
     except Exception as e: print('WARNING: ' , str(e))
+  return NumSampled
 
-def CreateTrainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir,NoDataVal):
+def CreateTrainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir,NoDataVal,Incremental=False,Features=None,
+    MaxPolygonSamples=None,RandomSeed=0,ClassQuotas=None,ThinningSize=None):
   '''function CreateTRainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir,NoDataVal):
   This is the "main" function for producing a CSV file that will hold 
   our "Training Data" used for classification (woods/forest) in the set of 
@@ -339,12 +666,36 @@ def CreateTrainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir
   shapefiles BackgroundPtsShpfile and TargetPtsShpfile. The final column 
   "label" will mark those rows that are a "tree" and 0s that are "not tree".
 
+  In incremental mode, sampled pixel values are kept in a cache 
+  (TrainingPointsCache.json) keyed by a fingerprint of the imagery set
+  and by point geometry. Only new or moved points are sampled again, 
+  points removed from the shapefiles are dropped from the cache, and 
+  the CSV is identical to the one written by a full rebuild.
+
+  If a subset of variables was selected (see --features), only
+  those columns are written to the CSV.
+
+  Either shapefile may hold POLYGONS (training areas) instead of 
+  points. Then all pixels covered by its polygons (at most 
+  MaxPolygonSamples, randomly subsampled) are written to the CSV. 
+  These are not cached in incremental mode.
+
+  With per-class quotas or spatial thinning, points and pixels are 
+  subsampled while they are found (see CreateSampleReservoir()), and
+  only the pixel values of the kept ones are read.
+
   Args:
     BackgroundPtsShpfile (str): Shapefile with POINTS for non-tree (non-vegetation).
     TargetPtsShapefile (str): Shapefile with POINTS for tree (vegetation/woods).
     ImgDict (dict): Python dictionary{} with all satellite imagery (NDVI,RGB,Pan,SAVI,...)
     OutDir (str): Output directory.
     NoDataVal (float): No Data value. Usually 0 or -9999.
+    Incremental (bool): Re-use pixel values sampled in a previous run (default False).
+    Features (list): Optional list[] of selected variable names (default None, all).
+    MaxPolygonSamples (int): Maximum number of pixels sampled per class from polygons (default None, all).
+    RandomSeed (int): Seed for random subsampling (default 0).
+    ClassQuotas (dict): Optional dict{} of maximum number of samples per label (1 or 0).
+    ThinningSize (int): Optional size (pixels) of blocks holding at most one sample per class.
   Returns:
     str: Name of CSV containing all pixel value training data.
   '''
@@ -364,11 +715,8 @@ def CreateTrainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir
   # header.
   # ----------------------------------------------
   CSV = open(OutnameCSV,'w')
-  HeaderStringCSV = 'NDVI,Pan,R,G,B,NIR,SAVI01,SAVI02,\
-    SAVI03,SAVI04,SAVI05,SAVI06,SAVI07,SAVI08,SAVI09,SAVI10,\
-    Background_Red,Background_Green,Background_Blue,Background_NIR,Background_Pan,\
-    Background_NDVI,Label'
-  HeaderStringCSV=HeaderStringCSV.replace(' ','')
+  HeaderStringCSV = ','.join( [ VariableName for VariableName,ImageryKey in 
+    GetFeatureImageryKeys( ImgDict,Features ) ] + [ 'Label' ] )
   CSV.write('%s\n'%HeaderStringCSV)
 
   # use panchromatic image file (i.e. JPEG/Geotiff) to read 
@@ -387,22 +735,63 @@ def CreateTrainingPointsCSV(BackgroundPtsShpfile,TargetPtsShpfile,ImgDict,OutDir
     print('  \n    Please pass in filenames for Red,Green,Blue,NIR bands (JPEG/Geotiff).')
     return None
 
+  # In incremental mode, read cached pixel values that were 
+  # sampled from the SAME imagery set in a previous run. The new
+  # cache only holds points that are still in the shapefiles.
+  # -------------------------------------------------------------
+  SampleCache,NewSampleCache = None,None
+  if Incremental:
+    CacheFileName  = os.path.join( OutDir, 'TrainingPointsCache.json' )
+    Fingerprint    = GetSceneFingerprint( ImgDict,Features )
+    SampleCache    = ReadTrainingSampleCache( CacheFileName, Fingerprint )
+    NewSampleCache = {}
+
   # Use full satellite imagery set and shapefile for TARGET points
   # (i.e. points marking vegetation/trees/woods/forest)
   # to append/write CSV with corresponding training data with all
   # pixel values (as well as a value of "1" for the "Label" column
   # ---------------------------------------------------------------
-  WriteTrainingPointsCSV(
-    OutDir,ImgDict, 
-    TargetPtsShpfile,CSV,ProjStr,False
-  )
+  Reservoir = None
+  if ClassQuotas is not None or ThinningSize is not None:
+    Reservoir = CreateSampleReservoir( ClassQuotas,ThinningSize,RandomSeed )
+
+  NumSampled = 0
+  if ShapeFileHasPolygons( TargetPtsShpfile ):
+    WriteTrainingPolygonsCSV(
+      ImgDict,TargetPtsShpfile,CSV,False,
+      MaxPolygonSamples,RandomSeed,Features,Reservoir
+    )
+  else:
+    NumSampled += WriteTrainingPointsCSV(
+      OutDir,ImgDict, 
+      TargetPtsShpfile,CSV,ProjStr,False,
+      SampleCache,NewSampleCache,Features,Reservoir
+    )
 
   # use satellite imagery and shapefile for background (i.e. not-trees)
   # to append/write CSV with training data for background
   # --------------------------------------------------------------------
-  WriteTrainingPointsCSV(
-    OutDir,ImgDict, 
-    BackgroundPtsShpfile,CSV,ProjStr,True
-  )
+  if ShapeFileHasPolygons( BackgroundPtsShpfile ):
+    WriteTrainingPolygonsCSV(
+      ImgDict,BackgroundPtsShpfile,CSV,True,
+      MaxPolygonSamples,RandomSeed,Features,Reservoir
+    )
+  else:
+    NumSampled += WriteTrainingPointsCSV(
+      OutDir,ImgDict, 
+      BackgroundPtsShpfile,CSV,ProjStr,True,
+      SampleCache,NewSampleCache,Features,Reservoir
+    )
+
+  # Read and write pixel values of samples kept in reservoir
+  # ---------------------------------------------------------
+  if Reservoir is not None:
+    NumSampled += WriteReservoirSamplesCSV( Reservoir,ImgDict,CSV,
+      SampleCache,NewSampleCache,Features )
   CSV.close()
+
+  if Incremental:
+    WriteTrainingSampleCache( CacheFileName, Fingerprint, NewSampleCache )
+    print( 'number of training points sampled: ' , str(NumSampled) ,
+      ' (re-used from cache: ' , str(len(NewSampleCache)-NumSampled) , ')' )
   return OutnameCSV
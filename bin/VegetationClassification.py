@@ -10,8 +10,13 @@ from osgeo import gdalconst
 from distutils.spawn import find_executable
 from TrainingImagery import *
 from TrainingPoints import CreateTrainingPointsCSV
-from ImageClassification import RandomForestClassification
-from Misc import RunProcess,ResampleImage
+from ImageClassification import RandomForestClassification,RunTileWorker,MergeTileOutputs,CompareClassifications
+from Checkpoint import OpenCheckpoint,GetCompletedStage,RecordStage
+from Misc import RunProcess,ResampleImage,CreateVirtualDataset,TrackAllocations,PrintAllocationReport,ReadFeatureList
+from Misc import WriteProfiles,SetWriteProfile,GetCreationOptions,BenchmarkWriteProfiles,ReadBandArray
+from Misc import ReadSceneList,CreateMosaic,SensorProfiles,OpenSensorInput,CreateSensorStack
+from Misc import CreateSensorBandDatasets,ReadSensorStack
+from TimeSeries import ClassifyTimeSeries
 
 def usage(message=None):
 
@@ -64,11 +69,182 @@ def usage(message=None):
           { --nir, -n           }
             Image Filename for "NIR" or Near-Infrared Band or Channel (required)
           { -z, --background, --nontrees, --nonvegetation }
-            Shapefile (.shp extension) for points marking NOT trees/vegetation (required)
+            Shapefile (.shp extension) for points (or polygons) marking NOT trees/vegetation (required)
           { -t, --targets, --trees, --vegetation           }
-            Shapefile (.shp extension) for points marking trees/vegetation (woods) (required)
+            Shapefile (.shp extension) for points (or polygons) marking trees/vegetation (woods) (required)
           { -i, --ignore, --nodata                         }
             Imagery pixel value to ignore. NoData value. Usually 0 or -9999 (optional).
+          { --incremental }
+            Re-use training pixel values sampled in a previous run for the same 
+            imagery, and only sample new or moved points (optional).
+          { --tune }
+            Choose number of trees (and tree depth) using OOB and k-fold 
+            cross-validation scores: the fastest model within a tolerance of 
+            the best accuracy is used (optional). --ntrees is then ignored.
+          { --tune-ntrees }
+            Comma-separated numbers of trees to evaluate (default 3,5,10,25,50,100).
+          { --tune-depths }
+            Comma-separated maximum tree depths to evaluate, "none" for no limit (default none).
+          { --tune-folds }
+            Number of cross-validation folds (default 5).
+          { --tune-tolerance }
+            Accuracy tolerance below the best model (default 0.01).
+          { --memory-report }
+            Trace and print peak memory allocated per processing stage (optional).
+          { --export-tiles }
+            Fit the classifier and export a tile job plan (tiles.json) to the 
+            output directory instead of classifying (optional).
+          { --tile-size }
+            Number of rows/columns of each tile in the tile job plan (default 2048).
+          { --tile-worker }
+            Tile job plan (tiles.json): classify tiles of the plan until none are 
+            left. Run any number of workers, on any host with shared storage.
+          { --merge-tiles }
+            Tile job plan (tiles.json): assemble classified tiles into final output.
+          { --change-aware }
+            Classify in tiles (of --tile-size), and copy tiles whose input features 
+            and classifier did not change from the output of the previous run (optional).
+          { --previous-run }
+            Output directory of previous change-aware run (default: output directory).
+          { --early-exit }
+            Early-exit ensemble voting: stop evaluating trees for a pixel once its 
+            class can no longer change. Same output as evaluating all trees (optional).
+          { --select-features }
+            Rank variables (NDVI,SAVI,...) by feature importance and fit the model on
+            the smallest subset whose cross-validation accuracy is within a tolerance 
+            of all variables. The subset is written to SelectedFeatures.txt (optional).
+          { --select-tolerance }
+            Accuracy tolerance below all variables for --select-features (default 0.01).
+          { --features }
+            SelectedFeatures.txt (or comma-separated variable names): only compute, 
+            store and read imagery for these variables (optional).
+          { --pipeline-depth }
+            Number of strips read ahead (and written behind) on I/O threads while 
+            a strip is classified; 0 for no I/O threads (default 1).
+          { --rgb }
+            Create an RGB composite in the background while classifying: "vrt" 
+            (RGB.vrt) or "tiff" (tiled, compressed RGB.tif) (optional, default none).
+          { --max-polygon-samples }
+            Maximum number of pixels sampled (at random) per class from polygon
+            shapefiles (training areas) (optional, default 10000).
+          { --class-quotas }
+            Maximum number of training samples for trees and non-trees, i.e. "5000,5000"
+            (one number for both). Samples are drawn at random (reservoir sampling)
+            while points/polygons are read, and only kept samples are read (optional).
+          { --thinning }
+            Spatial thinning: keep at most one training sample per class in each
+            block of N x N pixels (optional).
+          { --seed }
+            Seed for random subsampling of training samples (optional, default 0).
+          { --train-chunk-rows }
+            Out-of-core training: split training data into random chunks of about N
+            rows, fit a subset of the trees on each chunk in worker processes, and
+            merge them into one ensemble (at least one tree per chunk). Not used with
+            --tune or --select-features (optional).
+          { --train-jobs }
+            Number of worker processes for out-of-core training (default -1, all cores).
+          { --stats-grid }
+            Forest statistics per grid cell of N x N pixels: tree pixels, tree area
+            (map units) and tree fraction, accumulated while classifying and written
+            to ForestStatisticsGrid.csv (optional).
+          { --zones }
+            Forest statistics per zone (i.e. administrative units): raster of integer
+            zone ids, or POLYGON shapefile (see --zone-field). Written to
+            ForestStatisticsZones.csv (optional).
+          { --zone-field }
+            Integer attribute of --zones shapefile holding zone ids.
+          { --pyramid-block }
+            Coarse-to-fine classification: classify averages of blocks of N x N pixels
+            first, and only classify pixels of mixed or boundary blocks at full
+            resolution. Reports fraction of pixels skipped and agreement with full
+            resolution (of randomly checked pixels) (optional).
+          { --pyramid-confidence }
+            Minimum fraction of trees voting for the class of a uniform block
+            for --pyramid-block (default 0.95).
+          { --quantize }
+            Store NDVI and SAVI as int16 (scale 1/10000) and "background" imagery in
+            the bit depth of the input bands, instead of float32. Values are 
+            restored when read (optional).
+          { --background-sigmas }
+            Sigmas (pixels) of "background" (Gaussian-filtered) imagery, i.e. 
+            "5,10,20,40". Sigmas other than 5 add variables Background_Red_S10,...
+            and are computed by cascaded filtering on a decimated (pyramid) grid
+            (padded by 4 sigma at the image borders), within 0.6% of the local 
+            contrast of full filtering, up to the borders (optional, default 5).
+          { --measure-backgrounds }
+            Report time and error of pyramid "background" imagery (--background-sigmas)
+            against full-resolution filtering, for the Panchromatic band (optional).
+          { --background-mode }
+            "exact" (Gaussian filters) or "fast" (3 box filters computed with 
+            running sums, whose cost does not depend on sigma) "background" 
+            imagery (optional, default exact).
+          { --compare-with }
+            Classification Geotiff of a previous run (i.e. with --background-mode 
+            exact) to report agreement (and kappa) of this run's classification 
+            with (optional).
+          { --scenes }
+            Text file listing the scenes of a multi-scene area, one scene per 
+            line: Red,Green,Blue,NIR[,Pan] filenames separated by commas. The 
+            scenes are combined into one virtual mosaic, classified with one 
+            model into one seamless output in the directory of the list 
+            (replaces --red, --green, --blue, --nir and --pan; optional).
+          { --overlap-rule }
+            "first" or "last" scene in --scenes wins where scenes overlap 
+            (optional, default last).
+          { --sensor }
+            Sensor profile of --input: "stack" (bands 1,2,3,4 are Red,Green,
+            Blue,NIR), "sentinel2", "landsat8" or "landsat7" (bands found by
+            name or index in a multi-band image, or by filename in a product 
+            directory, with the Landsat Panchromatic band). Replaces --red, 
+            --green, --blue and --nir; the four bands are read at once 
+            (optional).
+          { --input }
+            Multi-band image or product directory (i.e. Sentinel-2 .SAFE) for 
+            --sensor. Output is written to its directory (optional).
+          { --dates }
+            Text file listing the dates of a time series of the same area, one
+            date per line (as --scenes). After the run, all dates are 
+            classified with its model in one tiled pass, computing their 
+            variables on-the-fly (with the --background-sigmas, --background-mode
+            and --quantize of the run), into TimeSeriesClassification.tif (one 
+            band per date; optional).
+          { --date-tile-size }
+            Number of rows and columns of tiles of --dates (optional, default 512).
+          { --memoize }
+            Run the classifier once per distinct pixel (feature vector) of a 
+            strip or tile, and re-use results of recently seen vectors (i.e. 
+            water, NoData, saturated areas). Same output; the hit rate is 
+            reported (optional).
+          { --memoize-entries }
+            Number of recent feature vectors kept by --memoize (optional, 
+            default 100000, 0 for per-strip deduplication only).
+          { --write-profile }
+            Tiling, compression and GDAL cache for all Geotiffs written: "speed" 
+            (512 x 512 tiles, ZSTD level 1), "balanced" (256 x 256 tiles, ZSTD 
+            level 9, predictor) or "small" (256 x 256 tiles, DEFLATE level 9, 
+            predictor). ZSTD falls back to DEFLATE where unavailable (optional, 
+            default: untiled, uncompressed).
+          { --benchmark-write-profiles }
+            Once the imagery is created, write NDVI (or Panchromatic band) with
+            every write profile, report write time and size of each, and exit.
+          { --copy-inputs }
+            Copy input bands to Geotiffs in the output directory, instead of 
+            referring to them by means of virtual datasets (Red.vrt,...) (optional).
+          { --pan-resampling }
+            Method to resample Panchromatic band to multispectral grid: nearest, 
+            average or mode (optional, default nearest).
+          { --checkpoint }
+            Record a checkpoint (checkpoint.json in output directory) of this 
+            run, with checksums of the output of every stage and strip, so that 
+            it can be continued with --resume. Checksums read every file written,
+            so runs without --checkpoint or --resume do not record them (optional).
+          { --resume }
+            Continue an interrupted run (same arguments) from its checkpoint 
+            (checkpoint.json in output directory): completed stages and output 
+            strips whose checksums still match are not computed again. A stage
+            whose input images or shapefiles were replaced (changed size or 
+            modification time) is computed again, with all stages after it. The
+            run keeps recording its checkpoint (optional).
     EXAMPLE USAGE:
 
       This example shows how to use this program on the 
@@ -97,6 +273,284 @@ def usage(message=None):
   ''')
   sys.exit(1)
 
+def CreateClassificationImagery( DatasetRed,DatasetGreen,DatasetBlue,DatasetNIR,
+    RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName,
+    PanchromaticImageFileName,OutputDirectory,AllocationReport=None,Features=None,CopyInputs=False,
+    PanResampling=gdalconst.GRA_NearestNeighbour,Quantize=False,BackgroundSigmas=None,FastBackground=False,
+    SensorStackFileName='' ):
+  '''function CreateClassificationImagery( DatasetRed,DatasetGreen,DatasetBlue,DatasetNIR,
+    RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName,
+    PanchromaticImageFileName,OutputDirectory,AllocationReport,Features,CopyInputs,PanResampling,
+    Quantize,BackgroundSigmas,FastBackground,SensorStackFileName ):
+  This function creates all imagery used for vegetation classification
+  in the output directory: virtual datasets (VRTs) referring to the 
+  Red,Green,Blue,NIR bands, the Panchromatic band (a VRT, resampled to
+  the multispectral grid if needed, or simulated), NDVI, SAVI 
+  for L = 0.1,0.2,...,1.0 and "background" (Gaussian-filtered) 
+  imagery. The (optional) RGB composite is created separately (see 
+  StartImageRGB() in TrainingImagery.py). If CopyInputs is True, the bands (and the 
+  Panchromatic band) are copied to Geotiffs instead. If a subset of variables was selected, only 
+  the NDVI, SAVI and "background" imagery of those is created (the 
+  bands and Panchromatic band are always needed). If Quantize is 
+  True, NDVI and SAVI are stored as scaled int16, and "background" 
+  imagery in the bit depth of the input bands. If several sigmas are 
+  given, "background" imagery is created at each of them (see 
+  CreateImageGaussianPyramid() in TrainingImagery.py). In fast mode,
+  Gaussian filters are approximated by box filters. If the bands come
+  from a sensor stack (see --sensor), they are read in a single read,
+  and copied (if requested) as one pixel-interleaved Geotiff.
+
+  Args:
+    DatasetRed (osgeo.gdal.Dataset): GDAL dataset for "Red" band.
+    DatasetGreen (osgeo.gdal.Dataset): GDAL dataset for "Green" band.
+    DatasetBlue (osgeo.gdal.Dataset): GDAL dataset for "Blue" band.
+    DatasetNIR (osgeo.gdal.Dataset): GDAL dataset for "NIR" band.
+    RedImageFileName (str): Image filename for "Red" band.
+    GreenImageFileName (str): Image filename for "Green" band.
+    BlueImageFileName (str): Image filename for "Blue" band.
+    NIRImageFileName (str): Image filename for "NIR" band.
+    PanchromaticImageFileName (str): Image filename for Panchromatic band, or empty string.
+    OutputDirectory (str): Output directory.
+    AllocationReport (dict): Optional dict{} to hold peak allocation per stage.
+    Features (list): Optional list[] of selected variable names (default None, all).
+    CopyInputs (bool): Copy input bands to Geotiffs instead of referring to them (default False).
+    PanResampling (int): GDAL method to resample Panchromatic band (default GRA_NearestNeighbour).
+    Quantize (bool): Store derived imagery as integers instead of float32 (default False).
+    BackgroundSigmas (list): Optional list[] of sigmas of "background" imagery (default None, 5 only).
+    FastBackground (bool): Approximate Gaussian filters by box filters (default False).
+    SensorStackFileName (str): Optional 4-band sensor stack (Red,Green,Blue,NIR) of the bands (default '').
+  Returns:
+    dict: Dictionary{} holding filenames of all imagery used for classification.
+  '''
+  # Read multspectral image files (RGB,NIR) as NumPy arrays.
+  # GDAL converts pixel values to float32 while reading, so 
+  # all derived imagery (Pan,NDVI,SAVI,background) is computed 
+  # in float32, as it is written to Geotiffs.
+  # -------------------------------------------------------
+  nrows,ncols = DatasetRed.RasterYSize, DatasetRed.RasterXSize
+  with TrackAllocations( 'read bands', AllocationReport ):
+    if SensorStackFileName != '':
+      SensorBands = ReadSensorStack( gdal.Open( SensorStackFileName ),BufferType=gdal.GDT_Float32 )
+      FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR = [ 
+        SensorBands[Key] for Key in [ 'red','green','blue','nir' ] ]
+      SensorBands = None
+    else:
+      FilePointerRed   = DatasetRed.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+      FilePointerNIR   = DatasetNIR.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+      FilePointerBlue  = DatasetBlue.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+      FilePointerGreen = DatasetGreen.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+
+  # if panchromatic (gray-scale) image file (Geotiff/JPEG) was NOT 
+  # passed-in at command-line, then compute a simulated panchromatic
+  # band by taking an average of the Red,Green,Blue,NIR bands.
+  # ----------------------------------------------------------------
+  if PanchromaticImageFileName == '':
+
+    # if panchromatic image filename was not passed-in at command-line,
+    # then create it
+    # ------------------------------------------------------------------
+
+    with TrackAllocations( 'panchromatic', AllocationReport ):
+      ( PanchromaticImageFileName, FilePointerPan ) = ComputeSimulatedPanchromaticBand(
+        [ FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR ],
+        OutputDirectory,
+        DatasetRed
+      )
+
+  else: 
+
+    # make sure the panchromatic image filename passed-in 
+    # actually exists, and is a vaild GDAL dataset 
+    # (osgeo.gdal.Dataset)
+    # ---------------------------------------------------------
+    if not os.path.isfile( PanchromaticImageFileName ):
+      usage('  \n    Not an existing file: '+PanchromaticImageFileName)
+    PanchromaticDataset = gdal.Open( PanchromaticImageFileName )
+    if 'none' in str(type(PanchromaticDataset)):
+      usage('  \n    Not a valid GDAL raster dataset: '+PanchromaticImageFileName)
+    PanDims = (PanchromaticDataset.RasterYSize,PanchromaticDataset.RasterXSize)
+    MSDims  = FilePointerRed.shape
+    
+    with TrackAllocations( 'panchromatic', AllocationReport ):
+      if ( MSDims[0] != PanDims[0] ) or ( MSDims[1] != PanDims[1] ): 
+
+        # if panchromatic image file passed-in DOES NOT have the same 
+        # dimension as multispectral imagery passed-in (i.e. the 
+        # low-res. RGB,NIR imagery), then resample the panchromatic 
+        # image file to same dimensions as multispectral imagery 
+        # (Pan.tif), using GDAL's multi-threaded warper. It is 
+        # resampled once, since all later stages read it.
+        # --------------------------------------------------------------
+        ( PanchromaticImageFileName, ResampledPanDataset ) = ResampleImage( 
+          PanchromaticImageFileName,
+          PanchromaticDataset,
+          DatasetRed, 
+          os.path.join( OutputDirectory,'Pan.tif' ),
+          PanResampling
+        )
+        if PanchromaticImageFileName is None:
+          usage('  \n    Unable to resample panchromatic band.')
+        FilePointerPan = ResampledPanDataset.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+        ResampledPanDataset = None
+
+      elif not CopyInputs:
+
+        # refer to the panchromatic image file by means of a 
+        # VRT (Pan.vrt) in the output directory.
+        # ------------------------------------------------------
+        PanchromaticImageFileName = CreateVirtualDataset( 
+          PanchromaticImageFileName,
+          os.path.join( OutputDirectory,'Pan.vrt' )
+        )
+        if PanchromaticImageFileName is None:
+          usage('  \n    Unable to create virtual dataset for panchromatic band.')
+        FilePointerPan = PanchromaticDataset.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+
+      else:
+
+        # COPY the panchromatic image file to the output directory
+        # with the name "Pan.tif".
+        # --------------------------------------------------------------
+        OutFileNamePan = os.path.join( 
+          OutputDirectory, 'Pan.tif')
+        shutil.copyfile( PanchromaticImageFileName, OutFileNamePan )
+        PanchromaticImageFileName = OutFileNamePan
+        FilePointerPan = PanchromaticDataset.GetRasterBand(1).ReadAsArray(buf_type=gdal.GDT_Float32)
+    PanchromaticDataset = None
+
+  # Refer to the Red,Green,Blue,NIR image files (that were REQUIRED
+  # to be passed-in at the command-line) by means of VRTs in the 
+  # output directory: Red.vrt,Green.vrt,Blue.vrt,NIR.vrt. The 
+  # input pixel data is read directly, and not duplicated. If 
+  # copies were requested, COPY them to the output directory 
+  # with file-names Red.tif,Green.tif,Blue.tif,NIR.tif instead.
+  # -------------------------------------------------------------
+  if not CopyInputs:
+    for BandName in [ 'NIR','Red','Green','Blue' ]:
+      InputFileName = { 'NIR':NIRImageFileName,'Red':RedImageFileName,
+        'Green':GreenImageFileName,'Blue':BlueImageFileName }[BandName]
+      if CreateVirtualDataset( InputFileName,os.path.join( OutputDirectory,BandName+'.vrt' ) ) is None:
+        usage('  \n    Unable to create virtual dataset for: '+InputFileName)
+    NIRImageFileName   = os.path.join( OutputDirectory,'NIR.vrt' )
+    RedImageFileName   = os.path.join( OutputDirectory,'Red.vrt' )
+    GreenImageFileName = os.path.join( OutputDirectory,'Green.vrt' )
+    BlueImageFileName  = os.path.join( OutputDirectory,'Blue.vrt' )
+
+  elif SensorStackFileName != '':
+
+    # COPY the sensor stack once, as a pixel-interleaved Geotiff
+    # (Stack.tif), and refer to its bands by means of VRTs: 
+    # Red.vrt,Green.vrt,Blue.vrt,NIR.vrt.
+    # ----------------------------------------------------------
+    StackDataset = gdal.Open( SensorStackFileName )
+    OutFileNameStack = os.path.join( OutputDirectory,'Stack.tif' )
+    if gdal.Translate( OutFileNameStack,StackDataset,format='GTiff',
+        creationOptions=GetCreationOptions( StackDataset.GetRasterBand(1).DataType )+[ 'INTERLEAVE=PIXEL' ] ) is None:
+      usage('  \n    Unable to copy sensor stack: '+SensorStackFileName)
+    StackDataset = None
+    SensorStackFileName = OutFileNameStack
+    BandFileNames = CreateSensorBandDatasets( SensorStackFileName,OutputDirectory,'' )
+    if BandFileNames is None:
+      usage('  \n    Unable to create virtual datasets for: '+SensorStackFileName)
+    RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName = BandFileNames
+
+  else:
+
+    # Make sure the computer in which this program is run 
+    # has gdal_translate installed (command-line tool from GDAL)
+    # ----------------------------------------------------------
+
+    GDAL_Translate_Path = find_executable( 'gdal_translate' )
+    if GDAL_Translate_Path is None:
+      usage('  \n    Unable to find gdal_translate command-line tool. Exiting ... ')
+  
+    # Creation options of the active write profile (see 
+    # Misc.SetWriteProfile()) for the data type of each band
+    # -----------------------------------------------------
+    CreationOptionsNIR,CreationOptionsRed,CreationOptionsGreen,CreationOptionsBlue = [ 
+      ''.join( [ '-co '+Option+' ' for Option in GetCreationOptions( Dataset.GetRasterBand(1).DataType ) ] )
+      for Dataset in [ DatasetNIR,DatasetRed,DatasetGreen,DatasetBlue ] ]
+
+    OutFileNameNIR    = os.path.join( 
+      OutputDirectory, 'NIR.tif' )
+    OutFileNameRed    = os.path.join( 
+      OutputDirectory, 'Red.tif' )
+    OutFileNameGreen  = os.path.join( 
+      OutputDirectory, 'Green.tif' )
+    OutFileNameBlue   = os.path.join( 
+      OutputDirectory, 'Blue.tif' )
+
+    RunProcess( GDAL_Translate_Path+' -q -of GTiff '+CreationOptionsNIR+NIRImageFileName+' '+OutFileNameNIR )
+    NIRImageFileName = OutFileNameNIR
+
+    RunProcess( GDAL_Translate_Path+' -q -of GTiff '+CreationOptionsRed+RedImageFileName+' '+OutFileNameRed )
+    RedImageFileName = OutFileNameRed
+  
+    RunProcess( GDAL_Translate_Path+' -q -of GTiff '+CreationOptionsGreen+GreenImageFileName+' '+OutFileNameGreen )
+    GreenImageFileName = OutFileNameGreen
+
+    RunProcess( GDAL_Translate_Path+' -q -of GTiff '+CreationOptionsBlue+BlueImageFileName+' '+OutFileNameBlue )
+    BlueImageFileName = OutFileNameBlue
+
+  # store the following into a dictionary: 
+  #  (1) Red band filename
+  #  (2) Green band filename
+  #  (3) Blue band filename
+  #  (4) NIR band filename
+  #  (5) Panchromatic (Pan) band filename
+  #  (6) sensor stack filename (if any)
+  # ----------------------------------------
+
+  ClassificationImageryDict={}
+  ClassificationImageryDict['pan']   = PanchromaticImageFileName
+  ClassificationImageryDict['red']   = RedImageFileName
+  ClassificationImageryDict['green'] = GreenImageFileName
+  ClassificationImageryDict['blue']  = BlueImageFileName
+  ClassificationImageryDict['nir']   = NIRImageFileName
+  if SensorStackFileName != '':
+    ClassificationImageryDict['stack'] = SensorStackFileName
+
+  # compute Normalized Difference Vegetation Index (NDVI), 
+  # as well as Soil-Adjusted NDVI (SAVI). Write these to Geotiffs
+  # and store the filenames into a dictionary{} to be appended
+  # to the dictionary{} imageryDict above
+  # ----------------------------------------------------------------
+
+  with TrackAllocations( 'ndvi/savi', AllocationReport ):
+    ( NDVI_FileName_Dict, FilePointerNDVI ) = CreateImageryNDVI( 
+      [ FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR ],
+      OutputDirectory,
+      DatasetRed,
+      Features,
+      Quantize
+    )
+  ClassificationImageryDict.update( NDVI_FileName_Dict )
+
+  # compute Gaussian-filtered "background" imagery for the 
+  # following bands: 
+  #   (1) Panchormatic band
+  #   (2) Red band
+  #   (3) Green band
+  #   (4) Blue band 
+  #   (5) NIR band
+  #   (6) NDVI
+  # Then update our master dict{} holding all filename 
+  # strings for imagery that will be used in final 
+  # forest/vegetation image classification
+  # --------------------------------------------------------
+  with TrackAllocations( 'background', AllocationReport ):
+    ClassificationImageryDict.update(CreateImageryBackground(
+      [FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR,FilePointerPan,FilePointerNDVI],
+      OutputDirectory,
+      DatasetRed,
+      Features,
+      Quantize,
+      BackgroundSigmas,
+      FastBackground
+    ))
+
+  return ClassificationImageryDict
+
 def main(): 
  
   # ---------------------------------------------------------------------
@@ -110,10 +564,36 @@ def main():
   #   (5) "Blue" Visible Channel Input Filename
   #   (6) Near-Infrared or "NIR" Input Filename
   #   (7) Panchromatic Input Filename
-  #   (8) Name of POINTS shapefile that defines "background" 
+  #   (8) Name of POINTS (or POLYGONS) shapefile that defines "background" 
   #       or non-trees (non-woods/forest)
-  #   (9) Name of POINTS shapefile that defines "trees" (woods/forest)
+  #   (9) Name of POINTS (or POLYGONS) shapefile that defines "trees" (woods/forest)
   #   (10) NoData value 
+  #   (11) Incremental training-set update flag
+  #   (12) Tuning mode flag, grids, folds and tolerance
+  #   (13) Memory (peak allocation per stage) report flag
+  #   (14) Tile job plan export flag, tile size, and tile job
+  #        plan for tile worker or merge of tiles
+  #   (15) Resume (from checkpoint) flag, and checkpoint flag
+  #   (16) Change-aware mode flag and previous run directory
+  #   (17) Early-exit ensemble voting flag
+  #   (18) Feature selection flag and tolerance, and selected features
+  #   (19) Pipeline depth (strips read ahead and written behind)
+  #   (20) Copy inputs (instead of virtual datasets) flag
+  #   (21) RGB composite format
+  #   (22) Panchromatic resampling method
+  #   (23) Maximum number of pixels sampled per class from polygons
+  #   (24) Per-class quotas, spatial thinning and seed for subsampling
+  #   (25) Out-of-core training chunk size and number of worker processes
+  #   (26) Forest statistics grid cell size, zone layer and zone field
+  #   (27) Coarse-to-fine (pyramid) block size and confidence
+  #   (28) Quantized (integer) storage of derived imagery flag
+  #   (29) Geotiff write profile, and write profile benchmark flag
+  #   (30) Sigmas of "background" imagery, and pyramid error report flag
+  #   (31) "Background" mode, and reference classification to compare with
+  #   (32) Scene list (mosaic mode) and overlap rule
+  #   (33) Sensor profile and multi-band image or product directory
+  #   (34) Time series (dates) list and its tile size
+  #   (35) Prediction memoization flag and its cache size
   # ----------------------------------------------------------------------
   args = [
     'help',
@@ -126,7 +606,32 @@ def main():
     'pan=',
     'background=','nontrees=','nonvegetation=',
     'targets=','trees=','vegetation=',
-    'ignore=','nodata='
+    'ignore=','nodata=',
+    'incremental',
+    'tune','tune-ntrees=','tune-depths=','tune-folds=','tune-tolerance=',
+    'memory-report',
+    'export-tiles','tile-size=','tile-worker=','merge-tiles=',
+    'resume','checkpoint',
+    'change-aware','previous-run=',
+    'early-exit',
+    'select-features','select-tolerance=','features=',
+    'pipeline-depth=',
+    'copy-inputs',
+    'rgb=',
+    'pan-resampling=',
+    'max-polygon-samples=',
+    'class-quotas=','thinning=','seed=',
+    'train-chunk-rows=','train-jobs=',
+    'stats-grid=','zones=','zone-field=',
+    'pyramid-block=','pyramid-confidence=',
+    'quantize',
+    'write-profile=','benchmark-write-profiles',
+    'background-sigmas=','measure-backgrounds',
+    'background-mode=','compare-with=',
+    'scenes=','overlap-rule=',
+    'sensor=','input=',
+    'dates=','date-tile-size=',
+    'memoize','memoize-entries='
   ]
 
   # Initialize Image Filenames (i.e. JPEG,Geotiff) for 
@@ -149,6 +654,55 @@ def main():
   NumberTreesForClassification = 3
   NoDataString = ''
   NoDataValue  = 0
+  IncrementalTrainingPoints = False
+  TuneModel          = False
+  TuneNTreesString   = '3,5,10,25,50,100'
+  TuneDepthsString   = 'none'
+  TuneFoldsString    = '5'
+  TuneToleranceString = '0.01'
+  AllocationReport   = None
+  ExportTiles        = False
+  TileSizeString     = '2048'
+  TileWorkerPlan     = ''
+  MergeTilesPlan     = ''
+  ResumeRun          = False
+  CheckpointRun      = False
+  ChangeAware        = False
+  PreviousRunDirectory = None
+  EarlyExitVoting    = False
+  SelectFeatures     = False
+  SelectToleranceString = '0.01'
+  FeaturesString     = ''
+  PipelineDepthString = '1'
+  CopyInputs         = False
+  RGBFormatString    = 'none'
+  PanResamplingString = 'nearest'
+  MaxPolygonSamplesString = '10000'
+  ClassQuotasString  = ''
+  ThinningString     = ''
+  SeedString         = '0'
+  TrainChunkRowsString = ''
+  TrainJobsString    = '-1'
+  StatsGridString    = ''
+  ZoneFileName       = ''
+  ZoneField          = None
+  PyramidBlockString = ''
+  PyramidConfidenceString = '0.95'
+  QuantizeImagery    = False
+  WriteProfileString = ''
+  BenchmarkWrites    = False
+  BackgroundSigmasString = ''
+  MeasureBackgrounds = False
+  BackgroundModeString = 'exact'
+  CompareWithFileName = ''
+  SceneListFileName  = ''
+  OverlapRuleString  = 'last'
+  SensorProfileName  = ''
+  SensorInputName    = ''
+  DateListFileName   = ''
+  DateTileSizeString = '512'
+  MemoizePredictions = False
+  MemoizeEntriesString = '100000'
 
   try:
     Options,Arguments = getopt.getopt(
@@ -180,8 +734,173 @@ def main():
       NumberTreesForClassification = Argument
     elif Option in ('-i','--ignore','--nodata'):
       NoDataString                 = Argument
+    elif Option == '--incremental':
+      IncrementalTrainingPoints    = True
+    elif Option == '--tune':
+      TuneModel                    = True
+    elif Option == '--tune-ntrees':
+      TuneNTreesString             = Argument
+    elif Option == '--tune-depths':
+      TuneDepthsString             = Argument
+    elif Option == '--tune-folds':
+      TuneFoldsString              = Argument
+    elif Option == '--tune-tolerance':
+      TuneToleranceString          = Argument
+    elif Option == '--memory-report':
+      AllocationReport             = {}
+    elif Option == '--export-tiles':
+      ExportTiles                  = True
+    elif Option == '--tile-size':
+      TileSizeString               = Argument
+    elif Option == '--tile-worker':
+      TileWorkerPlan               = Argument
+    elif Option == '--merge-tiles':
+      MergeTilesPlan               = Argument
+    elif Option == '--resume':
+      ResumeRun                    = True
+    elif Option == '--checkpoint':
+      CheckpointRun                = True
+    elif Option == '--change-aware':
+      ChangeAware                  = True
+    elif Option == '--previous-run':
+      PreviousRunDirectory         = Argument
+    elif Option == '--early-exit':
+      EarlyExitVoting              = True
+    elif Option == '--select-features':
+      SelectFeatures               = True
+    elif Option == '--select-tolerance':
+      SelectToleranceString        = Argument
+    elif Option == '--features':
+      FeaturesString               = Argument
+    elif Option == '--pipeline-depth':
+      PipelineDepthString          = Argument
+    elif Option == '--copy-inputs':
+      CopyInputs                   = True
+    elif Option == '--rgb':
+      RGBFormatString              = Argument
+    elif Option == '--pan-resampling':
+      PanResamplingString          = Argument
+    elif Option == '--max-polygon-samples':
+      MaxPolygonSamplesString      = Argument
+    elif Option == '--class-quotas':
+      ClassQuotasString            = Argument
+    elif Option == '--thinning':
+      ThinningString               = Argument
+    elif Option == '--seed':
+      SeedString                   = Argument
+    elif Option == '--train-chunk-rows':
+      TrainChunkRowsString         = Argument
+    elif Option == '--train-jobs':
+      TrainJobsString              = Argument
+    elif Option == '--stats-grid':
+      StatsGridString              = Argument
+    elif Option == '--zones':
+      ZoneFileName                 = Argument
+    elif Option == '--zone-field':
+      ZoneField                    = Argument
+    elif Option == '--pyramid-block':
+      PyramidBlockString           = Argument
+    elif Option == '--pyramid-confidence':
+      PyramidConfidenceString      = Argument
+    elif Option == '--quantize':
+      QuantizeImagery              = True
+    elif Option == '--write-profile':
+      WriteProfileString           = Argument
+    elif Option == '--benchmark-write-profiles':
+      BenchmarkWrites              = True
+    elif Option == '--background-sigmas':
+      BackgroundSigmasString       = Argument
+    elif Option == '--measure-backgrounds':
+      MeasureBackgrounds           = True
+    elif Option == '--background-mode':
+      BackgroundModeString         = Argument
+    elif Option == '--compare-with':
+      CompareWithFileName          = Argument
+    elif Option == '--scenes':
+      SceneListFileName            = Argument
+    elif Option == '--overlap-rule':
+      OverlapRuleString            = Argument
+    elif Option == '--sensor':
+      SensorProfileName            = Argument
+    elif Option == '--input':
+      SensorInputName              = Argument
+    elif Option == '--dates':
+      DateListFileName             = Argument
+    elif Option == '--date-tile-size':
+      DateTileSizeString           = Argument
+    elif Option == '--memoize':
+      MemoizePredictions           = True
+    elif Option == '--memoize-entries':
+      MemoizeEntriesString         = Argument
     else: pass
 
+  # make sure sigmas of "background" imagery are 
+  # positive integers (without duplicates)
+  # ---------------------------------------------
+  BackgroundSigmas = None
+  if BackgroundSigmasString != '':
+    try:
+      BackgroundSigmas = sorted( set( int(Value) for Value in BackgroundSigmasString.split(',') ) )
+      if BackgroundSigmas[0]<1: raise ValueError
+    except:
+      usage('  \n    Background sigmas should be positive integers, i.e. 5,10,20,40.')
+
+  # make sure size of prediction cache (for --memoize)
+  # is a non-negative integer
+  # ---------------------------------------------------
+  MemoizeEntries = None
+  if MemoizePredictions:
+    try:
+      MemoizeEntries = int( MemoizeEntriesString )
+      if MemoizeEntries<0: raise ValueError
+    except:
+      usage('  \n    Memoize entries should be a non-negative integer, i.e. 100000.')
+
+  # make sure "background" mode is "exact" or "fast", and
+  # reference classification (if any) an existing file
+  # -------------------------------------------------------
+  if BackgroundModeString.lower() not in [ 'exact','fast' ]:
+    usage('  \n    Background mode should be exact or fast.')
+  FastBackground = BackgroundModeString.lower() == 'fast'
+  if CompareWithFileName != '' and not os.path.isfile( CompareWithFileName ):
+    usage('  \n    Not an existing file: '+CompareWithFileName)
+
+  # make sure write profile is one of "speed", "balanced"
+  # or "small", and select it for all Geotiffs written
+  # ------------------------------------------------------
+  if WriteProfileString != '':
+    if WriteProfileString.lower() not in WriteProfiles:
+      usage('  \n    Write profile should be one of: '+','.join(sorted(WriteProfiles.keys())))
+    SetWriteProfile( WriteProfileString.lower() )
+
+  # A tile worker or a merge of tiles only needs the tile 
+  # job plan (imagery, classifier and tiles are in the plan)
+  # ---------------------------------------------------------
+  if TileWorkerPlan != '':
+    if not os.path.isfile( TileWorkerPlan ):
+      usage('  \n    Not an existing file: '+TileWorkerPlan)
+    RunTileWorker( TileWorkerPlan )
+    sys.exit(0)
+  if MergeTilesPlan != '':
+    if not os.path.isfile( MergeTilesPlan ):
+      usage('  \n    Not an existing file: '+MergeTilesPlan)
+    sys.exit( 0 if MergeTileOutputs( MergeTilesPlan ) is not None else 1 )
+
+  # make sure tile size is a positive integer. It is used
+  # for the tile job plan, or for change-aware mode.
+  # -----------------------------------------------------
+  TileSize,ChangeTileSize = None,None
+  if ExportTiles or ChangeAware:
+    try:
+      TileSizeValue = int(TileSizeString)
+      if TileSizeValue<1: raise ValueError
+    except:
+      usage('  \n    Tile size should be a positive integer.')
+    if ExportTiles: TileSize = TileSizeValue
+    if ChangeAware: ChangeTileSize = TileSizeValue
+  if PreviousRunDirectory is not None and not os.path.isdir( PreviousRunDirectory ):
+    usage('  \n  Not an existing directory: '+PreviousRunDirectory )
+
   # if user did not pass-in NoData value (usually 0 or -999)
   # then it will remain as  0 (zero) as a default
   # --------------------------------------------------------
@@ -205,6 +924,134 @@ def main():
     usage('  \n    Number of trees should be an integer.')
   np.random.seed(NumberTreesForClassification)
 
+  # if tuning mode was requested, make sure the grid of 
+  # number of trees, tree depths, number of folds and 
+  # tolerance are valid
+  # ----------------------------------------------------
+  TuningGrid = None
+  if TuneModel:
+    try:
+      TuningGrid = {
+        'ntrees'    : [ int(Value) for Value in TuneNTreesString.split(',') ],
+        'max_depth' : [ None if Value.strip().lower() == 'none' else int(Value)
+                        for Value in TuneDepthsString.split(',') ],
+        'folds'     : int(TuneFoldsString),
+        'tolerance' : float(TuneToleranceString)
+      }
+    except:
+      usage('  \n    Invalid tuning grid, number of folds or tolerance.')
+
+  # if feature selection was requested, make sure the tolerance 
+  # is valid. If a subset of variables was passed-in, make sure 
+  # all of them are known variables.
+  # ------------------------------------------------------------
+  SelectFeaturesTolerance = None
+  if SelectFeatures:
+    try:
+      SelectFeaturesTolerance = float(SelectToleranceString)
+    except:
+      usage('  \n    Invalid feature selection tolerance.')
+  Features = None
+  if FeaturesString != '':
+    Features = ReadFeatureList( FeaturesString )
+    if Features is None:
+      usage('  \n    Invalid selected features: '+FeaturesString)
+
+  # make sure pipeline depth is a non-negative integer
+  # --------------------------------------------------
+  try:
+    PipelineDepth = int(PipelineDepthString)
+    if PipelineDepth<0: raise ValueError
+  except:
+    usage('  \n    Pipeline depth should be a non-negative integer.')
+
+  # make sure RGB composite format is one of
+  # "none", "vrt" or "tiff"
+  # ----------------------------------------
+  RGBFormats = { 'none':None,'vrt':'VRT','tiff':'GTiff','tif':'GTiff' }
+  if RGBFormatString.lower() not in RGBFormats:
+    usage('  \n    RGB composite format should be none, vrt or tiff.')
+  RGBFormat = RGBFormats[RGBFormatString.lower()]
+
+  # make sure Panchromatic resampling method is one of
+  # "nearest", "average" or "mode"
+  # ---------------------------------------------------
+  PanResamplingMethods = { 'nearest':gdalconst.GRA_NearestNeighbour,
+    'average':gdalconst.GRA_Average,'mode':gdalconst.GRA_Mode }
+  if PanResamplingString.lower() not in PanResamplingMethods:
+    usage('  \n    Panchromatic resampling method should be nearest, average or mode.')
+  PanResampling = PanResamplingMethods[PanResamplingString.lower()]
+
+  # make sure maximum number of pixels sampled per 
+  # class from polygons is a positive integer
+  # -----------------------------------------------
+  try:
+    MaxPolygonSamples = int(MaxPolygonSamplesString)
+    if MaxPolygonSamples<1: raise ValueError
+  except:
+    usage('  \n    Maximum number of polygon samples should be a positive integer.')
+
+  # make sure per-class quotas (trees,non-trees), spatial
+  # thinning block size and seed are valid integers
+  # ------------------------------------------------------
+  ClassQuotas,ThinningSize = None,None
+  try:
+    if ClassQuotasString != '':
+      Quotas = [ int(Value) for Value in ClassQuotasString.split(',') ]
+      if len(Quotas) == 1: Quotas = Quotas*2
+      if len(Quotas) != 2 or min(Quotas)<1: raise ValueError
+      ClassQuotas = { 1:Quotas[0],0:Quotas[1] }
+    if ThinningString != '':
+      ThinningSize = int(ThinningString)
+      if ThinningSize<1: raise ValueError
+    RandomSeed = int(SeedString)
+  except:
+    usage('  \n    Invalid class quotas, thinning block size or seed.')
+
+  # make sure out-of-core training chunk size is a positive
+  # integer, and number of worker processes an integer
+  # --------------------------------------------------------
+  TrainChunkRows = None
+  try:
+    if TrainChunkRowsString != '':
+      TrainChunkRows = int(TrainChunkRowsString)
+      if TrainChunkRows<1: raise ValueError
+    TrainJobs = int(TrainJobsString)
+  except:
+    usage('  \n    Invalid training chunk size or number of training jobs.')
+
+  # make sure forest statistics grid cell size is a positive
+  # integer, and zone layer an existing file (shapefiles 
+  # need an attribute holding zone ids)
+  # ---------------------------------------------------------
+  StatisticsOptions = None
+  if StatsGridString != '' or ZoneFileName != '':
+    StatisticsOptions = { 'grid':None,'zones':None,'zone_field':ZoneField }
+    if StatsGridString != '':
+      try:
+        StatisticsOptions['grid'] = int(StatsGridString)
+        if StatisticsOptions['grid']<1: raise ValueError
+      except:
+        usage('  \n    Statistics grid cell size should be a positive integer.')
+    if ZoneFileName != '':
+      if not os.path.isfile( ZoneFileName ):
+        usage('  \n    Not an existing file: '+ZoneFileName)
+      if ZoneFileName.endswith('.shp') and ZoneField is None:
+        usage('  \n    Pass-in --zone-field with zone shapefile: '+ZoneFileName)
+      StatisticsOptions['zones'] = os.path.abspath( ZoneFileName )
+
+  # make sure coarse-to-fine block size is an integer greater 
+  # than 1, and confidence a fraction between 0.5 and 1
+  # ----------------------------------------------------------
+  Pyramid = None
+  if PyramidBlockString != '':
+    try:
+      Pyramid = { 'block_size':int(PyramidBlockString),
+        'confidence':float(PyramidConfidenceString),'check_pixels':1000 }
+      if Pyramid['block_size']<2 or not 0.5<Pyramid['confidence']<=1.0: raise ValueError
+    except:
+      usage('  \n    Pyramid block size should be an integer > 1, and confidence in (0.5,1].')
+
   # make sure user passed-in valid shapefile(s) 
   # for target points (i.e. trees/vegetation)
   # and background (i.e. non-trees or non-vegetation)
@@ -219,6 +1066,78 @@ def main():
     ' (i.e. non-trees). Use -b or other listed flags. ')
     usage()
 
+  # ---------------------------------------------------
+  # mosaic mode: combine each band of all scenes into 
+  # one virtual mosaic (in the directory of the scene
+  # list), which is then classified as a single image
+  # ---------------------------------------------------
+  if SceneListFileName != '':
+    if not os.path.isfile( SceneListFileName ):
+      usage('  \n    Not an existing file: '+SceneListFileName)
+    if OverlapRuleString.lower() not in [ 'first','last' ]:
+      usage('  \n    Overlap rule should be first or last.')
+    Scenes = ReadSceneList( SceneListFileName )
+    if Scenes is None:
+      usage('  \n    Invalid scene list: '+SceneListFileName)
+    MosaicDirectory = os.path.dirname( os.path.abspath( SceneListFileName ) )
+    MosaicFileNames = []
+    for BandIndex,BandName in enumerate( [ 'Red','Green','Blue','NIR','Pan' ][:len(Scenes[0])] ):
+      MosaicFileName = CreateMosaic( [ Scene[BandIndex] for Scene in Scenes ],
+        os.path.join( MosaicDirectory,'Mosaic'+BandName+'.vrt' ),
+        OverlapRuleString.lower(),NoDataValue if NoDataString != '' else None )
+      if MosaicFileName is None:
+        usage('  \n    Unable to create mosaic of '+BandName+' bands.')
+      MosaicFileNames.append( MosaicFileName )
+    RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName = MosaicFileNames[:4]
+    PanchromaticImageFileName = MosaicFileNames[4] if len(MosaicFileNames)==5 else ''
+    print( 'mosaic scenes: ' , len(Scenes) )
+
+  # ---------------------------------------------------
+  # sensor mode: find the Red,Green,Blue,NIR bands of a
+  # multi-band image or product directory, and refer to
+  # them by one virtual 4-band stack (and by one VRT 
+  # per band) in the directory of the input
+  # ---------------------------------------------------
+  SensorStackFileName = ''
+  if SensorProfileName != '' or SensorInputName != '':
+    if SensorProfileName not in SensorProfiles:
+      usage('  \n    Sensor profile should be one of: '+','.join(sorted(SensorProfiles.keys())))
+    if not os.path.exists( SensorInputName ):
+      usage('  \n    Not an existing file or directory: '+SensorInputName)
+    if SceneListFileName != '':
+      usage('  \n    Use either --scenes or --sensor, not both.')
+    SensorInput = OpenSensorInput( SensorInputName,SensorProfileName )
+    if SensorInput is None:
+      usage('  \n    Unable to find bands of '+SensorProfileName+' input: '+SensorInputName)
+    SensorDirectory = os.path.abspath( SensorInputName ) if os.path.isdir( SensorInputName ) else \
+      os.path.dirname( os.path.abspath( SensorInputName ) )
+    SensorStackFileName = CreateSensorStack( SensorInput,os.path.join( SensorDirectory,'SensorStack.vrt' ) )
+    BandFileNames = CreateSensorBandDatasets( SensorStackFileName,SensorDirectory ) \
+      if SensorStackFileName is not None else None
+    if BandFileNames is None:
+      usage('  \n    Unable to create sensor stack for: '+SensorInputName)
+    RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName = BandFileNames
+    if PanchromaticImageFileName == '':
+      PanchromaticImageFileName = SensorInput['pan']
+    print( 'sensor stack: ' , SensorStackFileName )
+
+  # ---------------------------------------------------
+  # time series: read list of dates (classified after
+  # the run with its model), and their tile size
+  # ---------------------------------------------------
+  Dates = None
+  if DateListFileName != '':
+    if not os.path.isfile( DateListFileName ):
+      usage('  \n    Not an existing file: '+DateListFileName)
+    Dates = ReadSceneList( DateListFileName )
+    if Dates is None:
+      usage('  \n    Invalid list of dates: '+DateListFileName)
+    try:
+      DateTileSize = int( DateTileSizeString )
+      if DateTileSize<1: raise ValueError
+    except:
+      usage('  \n    Date tile size should be a positive integer, i.e. 512.')
+
   # --------------------------------------------------
   # define output directory as same as input directory
   # --------------------------------------------------
@@ -247,6 +1166,20 @@ def main():
   if not os.path.isfile( NIRImageFileName ):
     usage('  \n    Not an existing file: '+NIRImageFileName)
   
+  # Open checkpoint of this run (with --checkpoint or --resume 
+  # only). Completed stages (and output strips) are recorded 
+  # with checksums, so that --resume can continue a run with 
+  # the same arguments after interruption.
+  # ----------------------------------------------------------
+  Checkpoint = None
+  if CheckpointRun or ResumeRun:
+    Checkpoint = OpenCheckpoint( OutputDirectory,
+      ' '.join( [ Arg for Arg in sys.argv[1:] if Arg not in [ '--resume','--checkpoint' ] ] ), ResumeRun )
+  if GetCompletedStage( Checkpoint,'classification' ) is not None:
+    print( 'classification already completed: ' , 
+      list(Checkpoint['stages']['classification']['files'].keys())[0] )
+    return
+
   # ----------------------------------------------------------------
   # open up red,green,blue,nir image files ... store their arrays
   # ----------------------------------------------------------------
@@ -287,161 +1220,65 @@ def main():
   if np.unique( InputRowDimensions ).size>1:
     usage('  \n    All multispectral input imagery (RGB,NIR) should have same y dimension. Exiting ... ')
 
-  # Read multspectral image files (RGB,NIR) as NumPy arrays 
-  # -------------------------------------------------------
-  nrows,ncols = DatasetRed.RasterYSize, DatasetRed.RasterXSize
-  FilePointerRed   = DatasetRed.GetRasterBand(1).ReadAsArray().astype(float)
-  FilePointerNIR   = DatasetNIR.GetRasterBand(1).ReadAsArray()
-  FilePointerBlue  = DatasetBlue.GetRasterBand(1).ReadAsArray()
-  FilePointerGreen = DatasetGreen.GetRasterBand(1).ReadAsArray()
-
-  # if panchromatic (gray-scale) image file (Geotiff/JPEG) was NOT 
-  # passed-in at command-line, then compute a simulated panchromatic
-  # band by taking an average of the Red,Green,Blue,NIR bands.
-  # ----------------------------------------------------------------
-  if PanchromaticImageFileName == '':
-
-    # if panchromatic image filename was not passed-in at command-line,
-    # then create it
-    # ------------------------------------------------------------------
-
-    ( PanchromaticImageFileName, FilePointerPan ) = ComputeSimulatedPanchromaticBand(
-      [ FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR ],
+  # Create all imagery used for classification (NDVI,SAVI,
+  # background,...). When resuming, the imagery written by a 
+  # previous run is re-used, if its checksums still match.
+  # --------------------------------------------------------
+  ImageryStage = GetCompletedStage( Checkpoint,'imagery' )
+  if ImageryStage is not None:
+    ClassificationImageryDict = ImageryStage['result']
+  else:
+    ClassificationImageryDict = CreateClassificationImagery(
+      DatasetRed,DatasetGreen,DatasetBlue,DatasetNIR,
+      RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName,
+      PanchromaticImageFileName,
       OutputDirectory,
-      DatasetRed
+      AllocationReport,
+      Features,
+      CopyInputs,
+      PanResampling,
+      QuantizeImagery,
+      BackgroundSigmas,
+      FastBackground,
+      SensorStackFileName
     )
+    RecordStage( Checkpoint,'imagery',
+      list(ClassificationImageryDict.values()),ClassificationImageryDict,
+      [ FileName for FileName in [ RedImageFileName,GreenImageFileName,BlueImageFileName,NIRImageFileName,
+        PanchromaticImageFileName ] if FileName ] )
 
-  else: 
-
-    # if the user DID pass-in the panchromatic image filename at the 
-    # the command-line, then COPY IT to the output directory with 
-    # the name "Pan.tif" , but make sure the file actually exists 
-    # first 
-    # --------------------------------------------------------------
-    if not os.path.isfile( PanchromaticImageFileName ):
-      usage('  \n    Not an existing file: '+PanchromaticImageFileName)
-    
-    # make sure panchromatic image filename passed-in is vaild 
-    # GDAL dataset (osgeo.gdal.Dataset)
-    # ---------------------------------------------------------
-    TempPanDataset = gdal.Open( PanchromaticImageFileName )
-    if 'none' in str(type(TempPanDataset)):
-      usage('  \n    Not a valid GDAL raster dataset: '+PanchromaticImageFileName)
-    TempPanDataset = None
-
-    OutFileNamePan = os.path.join( 
-      OutputDirectory, 'Pan.tif')
-    shutil.copyfile( PanchromaticImageFileName, OutFileNamePan )
-    PanchromaticImageFileName = OutFileNamePan
- 
-    # if panchromatic image file passed-in DOES NOT have the same 
-    # dimension as multispectral imagery passed-in (i.e. the 
-    # low-res. RGB,NIR imagery), then resample the panchromatic 
-    # image file to same dimensions as multispectral imagery 
-    # --------------------------------------------------------------
-    PanchromaticDataset = gdal.Open( PanchromaticImageFileName )
-    PanDims = (PanchromaticDataset.RasterYSize,PanchromaticDataset.RasterXSize)
-    MSDims = FilePointerRed.shape
-    
-    if ( MSDims[0] != PanDims[0] ) or ( MSDims[1] != PanDims[1] ): 
-      ( PanchromaticFileName, FilePointerPan ) = ResampleImage( 
-        PanchromaticImageFileName,
-        PanchromaticDataset,
-        DatasetRed, 
-        PanchromaticImageFileName, 
-        gdalconst.GRA_NearestNeighbour
-      )
-
-  # Make sure the computer in which this program is run 
-  # has gdal_translate installed (command-line tool from GDAL)
-  # ----------------------------------------------------------
+  # If requested, report time and error of pyramid "background" 
+  # imagery against full-resolution filtering (Panchromatic band)
+  # --------------------------------------------------------------
+  if MeasureBackgrounds:
+    MeasureGaussianPyramidError( 
+      ReadBandArray( gdal.Open( ClassificationImageryDict['pan'] ).GetRasterBand(1) ),
+      BackgroundSigmas if BackgroundSigmas is not None else [ 5,10,20,40 ],
+      Fast=FastBackground )
 
-  GDAL_Translate_Path = find_executable( 'gdal_translate' )
-  if GDAL_Translate_Path is None:
-    usage('  \n    Unable to find gdal_translate command-line tool. Exiting ... ')
-  
-  # copy the Red,Green,Blue,NIR image files (that were REQUIRED
-  # to be passed-in at the command-line to the output directory
-  # with file-names Red.tif,Green.tif,Blue.tif,NIR.tif
-  # -------------------------------------------------------------
-  OutFileNameNIR    = os.path.join( 
-    OutputDirectory, 'NIR.tif' )
-  OutFileNameRed    = os.path.join( 
-    OutputDirectory, 'Red.tif' )
-  OutFileNameGreen  = os.path.join( 
-    OutputDirectory, 'Green.tif' )
-  OutFileNameBlue   = os.path.join( 
-    OutputDirectory, 'Blue.tif' )
-
-  RunProcess( GDAL_Translate_Path+' -q -of GTiff '+NIRImageFileName+' '+OutFileNameNIR     )
-  NIRImageFileName = OutFileNameNIR
-
-  RunProcess( GDAL_Translate_Path+' -q -of GTiff '+RedImageFileName+' '+OutFileNameRed     )
-  RedImageFileName = OutFileNameRed
-  
-  RunProcess( GDAL_Translate_Path+' -q -of GTiff '+GreenImageFileName+' '+OutFileNameGreen )
-  GreenImageFileName = OutFileNameGreen
-
-  RunProcess( GDAL_Translate_Path+' -q -of GTiff '+BlueImageFileName+' '+OutFileNameBlue   )
-  BlueImageFileName = OutFileNameBlue
-
-  # store the following into a dictionary: 
-  #  (1) Red band filename
-  #  (2) Green band filename
-  #  (3) Blue band filename
-  #  (4) NIR band filename
-  #  (5) Panchromatic (Pan) band filename
-  # ----------------------------------------
-
-  ClassificationImageryDict={}
-  ClassificationImageryDict['pan']   = PanchromaticImageFileName
-  ClassificationImageryDict['red']   = RedImageFileName
-  ClassificationImageryDict['green'] = GreenImageFileName
-  ClassificationImageryDict['blue']  = BlueImageFileName
-  ClassificationImageryDict['nir']   = NIRImageFileName
-
-  # compute Normalized Difference Vegetation Index (NDVI), 
-  # as well as Soil-Adjusted NDVI (SAVI). Write these to Geotiffs
-  # and store the filenames into a dictionary{} to be appended
-  # to the dictionary{} imageryDict above
-  # ----------------------------------------------------------------
-
-  ( NDVI_FileName_Dict, FilePointerNDVI ) = CreateImageryNDVI( 
-    [ FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR ],
-    OutputDirectory,
-    DatasetRed
-  )
-  ClassificationImageryDict.update( NDVI_FileName_Dict )
-
-  # compute Gaussian-filtered "background" imagery for the 
-  # following bands: 
-  #   (1) Panchormatic band
-  #   (2) Red band
-  #   (3) Green band
-  #   (4) Blue band 
-  #   (5) NIR band
-  #   (6) NDVI
-  # Then update our master dict{} holding all filename 
-  # strings for imagery that will be used in final 
-  # forest/vegetation image classification
-  # --------------------------------------------------------
-  ClassificationImageryDict.update(CreateImageryBackground(
-    [FilePointerRed,FilePointerGreen,FilePointerBlue,FilePointerNIR,FilePointerPan,FilePointerNDVI],
-    OutputDirectory,
-    DatasetRed
-  ))
-
-  # Create output dataset  holding RGB bands 
-  # ----------------------------------------
-  ImageFileNameRGB = CreateImageRGB(
-    ClassificationImageryDict['red'],
-    ClassificationImageryDict['green'],
-    ClassificationImageryDict['blue'],
-    OutputDirectory
-  )
+  # If requested, benchmark the write profiles on the
+  # NDVI (or Panchromatic) imagery, then exit.
+  # ---------------------------------------------------
+  if BenchmarkWrites:
+    BenchmarkKey = 'ndvi' if 'ndvi' in ClassificationImageryDict else 'pan'
+    BenchmarkDataset = gdal.Open( ClassificationImageryDict[BenchmarkKey] )
+    BenchmarkWriteProfiles( BenchmarkDataset,
+      ReadBandArray( BenchmarkDataset.GetRasterBand(1) ),OutputDirectory )
+    return
 
-  if ImageFileNameRGB is None: usage()
-  ClassificationImageryDict['rgb'] = ImageFileNameRGB 
+  # If requested, create RGB composite on a background 
+  # thread while training points are sampled and the 
+  # imagery is classified.
+  # --------------------------------------------------
+  FutureRGB = None
+  if RGBFormat is not None:
+    FutureRGB = StartImageRGB(
+      ClassificationImageryDict['red'],
+      ClassificationImageryDict['green'],
+      ClassificationImageryDict['blue'],
+      OutputDirectory,
+      RGBFormat
+    )
 
   # use the following to create a CSV holding satellite pixel value 
   # training data: 
@@ -454,27 +1291,84 @@ def main():
   #       (i.e. NDVI,SAVI,Red,Green,Blue,Background Red,
   #        Background NDVI,Panchromatic band, ... )
   #   (4) Output directory string
+  # In incremental mode, only points not sampled in a previous run
+  # (for the same imagery) have their pixel values read.
   # ------------------------------------------------------------------
-  Classification_CSV_FileName = CreateTrainingPointsCSV(
-    BackgroundPointsShapefile,
-    TargetPointsShapefile,
-    ClassificationImageryDict, 
-    OutputDirectory,
-    NoDataValue
-  )
-
-  if Classification_CSV_FileName is None:
-    usage()
+  TrainingStage = GetCompletedStage( Checkpoint,'training points' )
+  if TrainingStage is not None:
+    Classification_CSV_FileName = TrainingStage['result']
+  else:
+    with TrackAllocations( 'training points', AllocationReport ):
+      Classification_CSV_FileName = CreateTrainingPointsCSV(
+        BackgroundPointsShapefile,
+        TargetPointsShapefile,
+        ClassificationImageryDict, 
+        OutputDirectory,
+        NoDataValue,
+        IncrementalTrainingPoints,
+        Features,
+        MaxPolygonSamples,
+        RandomSeed,
+        ClassQuotas,
+        ThinningSize
+      )
+
+    if Classification_CSV_FileName is None:
+      usage()
+    RecordStage( Checkpoint,'training points',
+      [Classification_CSV_FileName],Classification_CSV_FileName,
+      [ BackgroundPointsShapefile,TargetPointsShapefile ] )
 
   # use CSV to write out an image classification to the 
   # output directory
   # ---------------------------------------------------
-  RandomForestClassification(
-    ClassificationImageryDict,
-    Classification_CSV_FileName,
-    OutputDirectory,
-    NumberTreesForClassification
-  ) 
+  with TrackAllocations( 'classification', AllocationReport ):
+    OutNameClassification = RandomForestClassification(
+      ClassificationImageryDict,
+      Classification_CSV_FileName,
+      OutputDirectory,
+      NumberTreesForClassification,
+      TuningGrid,
+      TileSize,
+      Checkpoint,
+      ChangeTileSize,
+      PreviousRunDirectory,
+      EarlyExitVoting,
+      SelectFeaturesTolerance,
+      PipelineDepth,
+      TrainChunkRows=TrainChunkRows,
+      TrainJobs=TrainJobs,
+      StatisticsOptions=StatisticsOptions,
+      Pyramid=Pyramid,
+      MemoizeEntries=MemoizeEntries,
+      SaveModel=Dates is not None
+    ) 
+  PrintAllocationReport( AllocationReport )
+
+  # If requested, report agreement of this classification 
+  # with a reference classification (i.e. exact "background")
+  # ----------------------------------------------------------
+  if CompareWithFileName != '' and OutNameClassification is not None and \
+      OutNameClassification.endswith('.tif'):
+    CompareClassifications( OutNameClassification,CompareWithFileName )
+
+  # Classify all dates of a time series with the model of 
+  # this run, in one tiled pass (one output band per date)
+  # -------------------------------------------------------
+  if Dates is not None and OutNameClassification is not None:
+    ClassifyTimeSeries( Dates,
+      ClassificationImageryDict,
+      os.path.join( OutputDirectory,'ExtraTreesClassifier.pkl' ),
+      OutputDirectory,
+      TileSize=DateTileSize,
+      EarlyExit=EarlyExitVoting,
+      Fast=FastBackground,
+      PanResampling=PanResampling,
+      MemoizeEntries=MemoizeEntries,
+      Sigmas=BackgroundSigmas
+    )
+  if FutureRGB is not None:
+    print( 'RGB composite: ' , str(FutureRGB.result()) )
 
 if __name__ == '__main__':
   main()
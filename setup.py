@@ -2,7 +2,7 @@ from distutils.core import setup
 setup(
     name='VegetationClassification',
     version='1.0.0',
-    scripts=['bin/VegetationClassification.py','bin/ImageClassification.py','bin/Misc.py','bin/TrainingPoints.py','bin/TrainingImagery.py',], 
+    scripts=['bin/VegetationClassification.py','bin/ImageClassification.py','bin/Misc.py','bin/TrainingPoints.py','bin/TrainingImagery.py','bin/TileQueue.py','bin/Checkpoint.py','bin/ForestStatistics.py','bin/TimeSeries.py',], 
     license='MIT',
     include_package_data=True, 
     long_description=open('README.md').read(),
@@ -0,0 +1,44 @@
+import os
+import sys
+import types
+import importlib.util
+import pytest
+
+sys.path.insert( 0,os.path.join( os.path.dirname( os.path.abspath(__file__) ),os.pardir,'bin' ) )
+
+# The modules of bin/ import GDAL (osgeo) at the top, but most of
+# their NumPy code does not need it. Where GDAL is not installed,
+# a placeholder osgeo package (whose names are plain strings, i.e.
+# gdal.GDT_Float32 == 'GDT_Float32') lets them import, so that the
+# tests of that code still run; tests marked "gdal" are skipped.
+# ----------------------------------------------------------------
+HasGDAL = importlib.util.find_spec('osgeo') is not None
+
+def CreatePlaceholderModule( ModuleName ):
+  '''function CreatePlaceholderModule( ModuleName ):
+  This function creates a module whose every attribute is its name.
+
+  Args:
+    ModuleName (str): Name of module (i.e. "osgeo.gdal").
+  Returns:
+    types.ModuleType: Placeholder module.
+  '''
+  Module = types.ModuleType( ModuleName )
+  Module.__getattr__ = lambda Name: Name
+  return Module
+
+if not HasGDAL:
+  sys.modules['osgeo'] = CreatePlaceholderModule( 'osgeo' )
+  for SubmoduleName in [ 'gdal','osr','ogr','gdalconst','gdal_array','gdalnumeric' ]:
+    Submodule = CreatePlaceholderModule( 'osgeo.'+SubmoduleName )
+    sys.modules['osgeo.'+SubmoduleName] = Submodule
+    setattr( sys.modules['osgeo'],SubmoduleName,Submodule )
+
+def pytest_configure( config ):
+  config.addinivalue_line( 'markers','gdal: test needs GDAL (osgeo) installed' )
+
+def pytest_collection_modifyitems( config,items ):
+  if HasGDAL: return
+  for item in items:
+    if 'gdal' in item.keywords:
+      item.add_marker( pytest.mark.skip( reason='GDAL (osgeo) is not installed' ) )
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from TrainingImagery import CreateImageGaussianPyramid,CreateImageGaussianFiltered
+
+@pytest.fixture
+def Band():
+  '''function Band():
+  This fixture returns a synthetic band (odd number of columns)
+  with strong edges along its last rows and columns.
+  '''
+  Random = np.random.default_rng( 0 )
+  Band = Random.uniform( 0.0,1000.0,( 384,381 ) ).astype(np.float32)
+  Band[:,-3:] = 5000.0
+  Band[-2:,:] = -3000.0
+  return Band
+
+def test_pyramid_within_bound_up_to_borders( Band ):
+  Levels = list( CreateImageGaussianPyramid( Band,[ 5,10,20,40 ] ) )
+  assert [ Sigma for Sigma,Level in Levels ] == [ 5,10,20,40 ]
+  np.testing.assert_array_equal( Levels[0][1],CreateImageGaussianFiltered( Band,5 ) )
+  for Sigma,Level in Levels:
+    FullLevel = gaussian_filter( Band,Sigma,mode='nearest' )
+    assert Level.shape == Band.shape and Level.dtype == np.float32
+    assert np.abs( Level-FullLevel ).max() <= 0.006*( FullLevel.max()-FullLevel.min() )
@@ -0,0 +1,82 @@
+import os
+
+from Checkpoint import OpenCheckpoint,RecordStage,RecordStrip,GetCompletedStage,GetVirtualDatasetSources
+
+def WriteFile( FileName,Data ):
+  with open( FileName,'w' ) as OutputFile: OutputFile.write( Data )
+  return FileName
+
+def WriteVirtualDataset( FileName,SourceFileName ):
+  '''function WriteVirtualDataset( FileName,SourceFileName ):
+  This function writes a minimal VRT referring to a source file
+  relative to the VRT (as CreateVirtualDataset() does).
+  '''
+  return WriteFile( FileName,'<VRTDataset rasterXSize="2" rasterYSize="2">\n'
+    ' <VRTRasterBand dataType="Float32" band="1">\n'
+    '  <SimpleSource>\n'
+    '   <SourceFilename relativeToVRT="1">%s</SourceFilename>\n'
+    '  </SimpleSource>\n'
+    ' </VRTRasterBand>\n'
+    '</VRTDataset>\n' % os.path.relpath( SourceFileName,os.path.dirname( FileName ) ) )
+
+def CreateRun( tmp_path ):
+  '''function CreateRun( tmp_path ):
+  This function records a run with an input band (behind a
+  VRT), an "imagery" stage and a "classification" stage.
+  '''
+  ( tmp_path/'input' ).mkdir()
+  InputFileName = WriteFile( str(tmp_path/'input'/'Red.tif'),'red v1' )
+  OutDir = str(tmp_path/'out')
+  os.mkdir( OutDir )
+  BandFileName = WriteVirtualDataset( os.path.join( OutDir,'Red.vrt' ),InputFileName )
+  NDVIFileName = WriteFile( os.path.join( OutDir,'NDVI.tif' ),'ndvi' )
+  Checkpoint = OpenCheckpoint( OutDir,'--red Red.tif',False )
+  ImgDict = { 'red':BandFileName,'ndvi':NDVIFileName }
+  RecordStage( Checkpoint,'imagery',list(ImgDict.values()),ImgDict )
+  ClassificationFileName = WriteFile( os.path.join( OutDir,'classification.tif' ),'1010' )
+  RecordStrip( Checkpoint,'0:2:0:2','checksum' )
+  RecordStage( Checkpoint,'classification',[ClassificationFileName] )
+  return ( OutDir,InputFileName,NDVIFileName )
+
+def test_GetVirtualDatasetSources( tmp_path ):
+  InputFileName = WriteFile( str(tmp_path/'Red.tif'),'red' )
+  BandFileName  = WriteVirtualDataset( str(tmp_path/'Red.vrt'),InputFileName )
+  MosaicFileName = WriteVirtualDataset( str(tmp_path/'Mosaic.vrt'),BandFileName )
+  assert GetVirtualDatasetSources( MosaicFileName ) == [ BandFileName,InputFileName ]
+  assert GetVirtualDatasetSources( InputFileName ) == []
+
+def test_GetCompletedStage_on_resume( tmp_path ):
+  OutDir,InputFileName,NDVIFileName = CreateRun( tmp_path )
+  Checkpoint = OpenCheckpoint( OutDir,'--red Red.tif',True )
+  assert GetCompletedStage( Checkpoint,'classification' ) is not None
+  assert GetCompletedStage( Checkpoint,'imagery' )['result']['ndvi'] == NDVIFileName
+  assert Checkpoint['strips'] == { '0:2:0:2':'checksum' }
+  assert GetCompletedStage( None,'imagery' ) is None
+  assert GetCompletedStage( OpenCheckpoint( OutDir,'--red Other.tif',True ),'imagery' ) is None
+
+def test_GetCompletedStage_input_replaced( tmp_path ):
+  OutDir,InputFileName,NDVIFileName = CreateRun( tmp_path )
+  WriteFile( InputFileName,'red version 2' )
+  Checkpoint = OpenCheckpoint( OutDir,'--red Red.tif',True )
+
+  # The changed input invalidates the "imagery" stage and the
+  # later "classification" stage (and its strips) with it
+  # ---------------------------------------------------------
+  assert GetCompletedStage( Checkpoint,'classification' ) is None
+  assert Checkpoint['stages'] == {} and Checkpoint['strips'] == {}
+  assert OpenCheckpoint( OutDir,'--red Red.tif',True )['stages'] == {}
+
+def test_GetCompletedStage_output_changed( tmp_path ):
+  OutDir,InputFileName,NDVIFileName = CreateRun( tmp_path )
+  WriteFile( NDVIFileName,'ndvx' )
+  Checkpoint = OpenCheckpoint( OutDir,'--red Red.tif',True )
+  assert GetCompletedStage( Checkpoint,'imagery' ) is None
+  assert GetCompletedStage( Checkpoint,'classification' ) is None
+
+def test_GetCompletedStage_later_stage_only( tmp_path ):
+  OutDir,InputFileName,NDVIFileName = CreateRun( tmp_path )
+  os.remove( os.path.join( OutDir,'classification.tif' ) )
+  Checkpoint = OpenCheckpoint( OutDir,'--red Red.tif',True )
+  assert GetCompletedStage( Checkpoint,'classification' ) is None
+  assert list(Checkpoint['stages']) == [ 'imagery' ]
+  assert GetCompletedStage( Checkpoint,'imagery' ) is not None
@@ -0,0 +1,93 @@
+import os
+import types
+import numpy as np
+import pytest
+
+import TrainingImagery
+from Misc import TrackAllocations
+from TrainingImagery import ComputeSimulatedPanchromaticBand,CreateImageryNDVI,CreateImageryBackground
+
+NRows,NCols = 256,256
+NPixels = NRows*NCols
+
+# Bytes per pixel of one float64 array: the peak of a stage that
+# promotes to float64 is at least this times the number of
+# arrays it holds at once
+# ---------------------------------------------------------------
+Float64Bytes = np.dtype(np.float64).itemsize
+
+@pytest.fixture
+def Bands():
+  '''function Bands():
+  This fixture returns synthetic float32 Red,Green,Blue,NIR bands.
+  '''
+  Random = np.random.default_rng( 0 )
+  return [ Random.uniform( 0.0,1000.0,( NRows,NCols ) ).astype(np.float32) for Band in range(4) ]
+
+@pytest.fixture
+def WrittenArrays( monkeypatch ):
+  '''function WrittenArrays( monkeypatch ):
+  This fixture replaces WriteGeotiff() in TrainingImagery by a
+  function that records the data type of each array "written".
+  '''
+  Written = {}
+  def RecordGeotiff( ReferenceDataset,OutFileName,OutDataArray,Quantization=None ):
+    Written[ os.path.basename(OutFileName) ] = OutDataArray.dtype
+  monkeypatch.setattr( TrainingImagery,'WriteGeotiff',RecordGeotiff )
+  return Written
+
+@pytest.fixture
+def ReferenceDataset():
+  return types.SimpleNamespace( RasterXSize=NCols,RasterYSize=NRows )
+
+def test_TrackAllocations_is_context_manager():
+  AllocationReport = {}
+  with TrackAllocations( 'allocate',AllocationReport ):
+    Array = np.ones( NPixels,dtype=np.float64 )
+  assert AllocationReport['allocate'] >= Array.nbytes
+  with TrackAllocations( 'untraced',None ):
+    pass
+  assert list(AllocationReport) == [ 'allocate' ]
+
+def test_float32_stages_below_float64_baseline( tmp_path,Bands,WrittenArrays,ReferenceDataset ):
+  AllocationReport = {}
+  OutDir = str(tmp_path)
+
+  with TrackAllocations( 'Pan',AllocationReport ):
+    OutnamePan,PanArray = ComputeSimulatedPanchromaticBand( Bands,OutDir,ReferenceDataset )
+  assert PanArray.dtype == np.float32
+  np.testing.assert_allclose( PanArray,( Bands[0]+Bands[1]+Bands[2]+Bands[3] )/4.0,rtol=1e-5 )
+
+  with TrackAllocations( 'NDVI/SAVI',AllocationReport ):
+    NDVIDict,NDVIArray = CreateImageryNDVI( Bands,OutDir,ReferenceDataset )
+  assert NDVIArray.dtype == np.float32
+  assert 'ndvi' in NDVIDict and 'savi10' in NDVIDict
+  np.testing.assert_allclose( NDVIArray,( Bands[3]-Bands[0] )/( Bands[3]+Bands[0] ),rtol=1e-5 )
+
+  with TrackAllocations( 'Background',AllocationReport ):
+    BackgroundDict = CreateImageryBackground( Bands+[ PanArray,NDVIArray ],OutDir,ReferenceDataset )
+  assert sorted(BackgroundDict) == [ 'bg_blue','bg_green','bg_ndvi','bg_nir','bg_pan','bg_red' ]
+
+  assert len(WrittenArrays) == 1+1+10+6
+  assert set( WrittenArrays.values() ) == { np.dtype(np.float32) }
+
+  # Promoted to float64, the simulated Panchromatic band is one
+  # float64 array, NDVI/SAVI hold (at least) the difference, sum,
+  # NDVI and SAVI arrays, and each "background" band holds a
+  # float64 copy of its input besides the filtered array
+  # -------------------------------------------------------------
+  assert AllocationReport['Pan']        < 1*NPixels*Float64Bytes
+  assert AllocationReport['NDVI/SAVI']  < 4*NPixels*Float64Bytes
+  assert AllocationReport['Background'] < 2*NPixels*Float64Bytes
+
+@pytest.mark.gdal
+def test_float32_geotiffs( tmp_path,Bands ):
+  from osgeo import gdal
+  Reference = gdal.GetDriverByName('GTiff').Create( str(tmp_path/'Reference.tif'),NCols,NRows,1,gdal.GDT_Float32 )
+  Reference.SetGeoTransform( [ 500000.0,1.0,0.0,4000000.0,0.0,-1.0 ] )
+  OutDir = str(tmp_path)
+  OutnamePan,PanArray = ComputeSimulatedPanchromaticBand( Bands,OutDir,Reference )
+  NDVIDict,NDVIArray = CreateImageryNDVI( Bands,OutDir,Reference )
+  BackgroundDict = CreateImageryBackground( Bands+[ PanArray,NDVIArray ],OutDir,Reference )
+  for FileName in [ OutnamePan ]+list(NDVIDict.values())+list(BackgroundDict.values()):
+    assert gdal.Open( FileName ).GetRasterBand(1).DataType == gdal.GDT_Float32
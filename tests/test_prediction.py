@@ -0,0 +1,74 @@
+import numpy as np
+import pandas
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier
+
+from ImageClassification import PredictEarlyExit,PredictMemoized,CreatePredictionCache
+
+def CreateFeatures( NumRows,Seed ):
+  '''function CreateFeatures( NumRows,Seed ):
+  This function returns a synthetic dataframe of pixel values (with
+  runs of identical rows, as water or NoData fill give) and labels.
+  '''
+  Random = np.random.default_rng( Seed )
+  DataFrame = pandas.DataFrame( Random.normal( 0.0,1.0,( NumRows,3 ) ),columns=[ 'NDVI','Pan','NIR' ] )
+  DataFrame.iloc[ :NumRows//4 ] = DataFrame.iloc[0].values
+  Labels = ( DataFrame['NDVI']+0.5*DataFrame['Pan']+Random.normal( 0.0,0.5,NumRows ) > 0 ).astype(int)
+  return ( DataFrame,Labels.values )
+
+@pytest.fixture( scope='module' )
+def Features():
+  return CreateFeatures( 400,0 )
+
+@pytest.mark.parametrize( 'NTrees',[ 1,3,16,101 ] )
+def test_PredictEarlyExit_matches_predict( Features,NTrees ):
+  DataFrame,Labels = Features
+  Classifier = ExtraTreesClassifier( n_estimators=NTrees,random_state=0 ).fit( DataFrame,Labels )
+  Pixels,_ = CreateFeatures( 2000,1 )
+  np.testing.assert_array_equal( PredictEarlyExit( Classifier,Pixels ),Classifier.predict( Pixels ) )
+  np.testing.assert_array_equal( PredictEarlyExit( Classifier,Pixels,BatchSize=1 ),Classifier.predict( Pixels ) )
+
+def test_PredictEarlyExit_non_binary_fallback( Features ):
+  DataFrame,Labels = Features
+  Classes = np.digitize( DataFrame['NDVI'].values,[ -0.5,0.5 ] )
+  Classifier = ExtraTreesClassifier( n_estimators=16,random_state=0 ).fit( DataFrame,Classes )
+  Pixels,_ = CreateFeatures( 500,2 )
+  np.testing.assert_array_equal( PredictEarlyExit( Classifier,Pixels ),Classifier.predict( Pixels ) )
+  Cache = CreatePredictionCache( 50 )
+  np.testing.assert_array_equal( PredictMemoized( Classifier,Pixels,Cache,EarlyExit=True ),Classifier.predict( Pixels ) )
+
+@pytest.mark.parametrize( 'EarlyExit',[ False,True ] )
+def test_PredictMemoized_matches_predict( Features,EarlyExit ):
+  DataFrame,Labels = Features
+  Classifier = ExtraTreesClassifier( n_estimators=16,random_state=0 ).fit( DataFrame,Labels )
+  Cache = CreatePredictionCache( 100000 )
+  for Seed in [ 3,4,3 ]:
+    Pixels,_ = CreateFeatures( 1000,Seed )
+    np.testing.assert_array_equal( PredictMemoized( Classifier,Pixels,Cache,EarlyExit ),Classifier.predict( Pixels ) )
+
+  # Each strip has 750 distinct rows plus a run of 250 identical
+  # rows; the third strip repeats the first, all from the cache
+  # -------------------------------------------------------------
+  assert Cache['rows'] == 3000 and Cache['unique'] == 3*751
+  assert Cache['predicted'] == 2*751 and Cache['hits'] == 751
+  assert len(Cache['entries']) == 2*751
+
+def test_PredictMemoized_eviction( Features ):
+  DataFrame,Labels = Features
+  Classifier = ExtraTreesClassifier( n_estimators=16,random_state=0 ).fit( DataFrame,Labels )
+  Cache = CreatePredictionCache( 100 )
+  for Seed in [ 5,6,5 ]:
+    Pixels,_ = CreateFeatures( 300,Seed )
+    np.testing.assert_array_equal( PredictMemoized( Classifier,Pixels,Cache ),Classifier.predict( Pixels ) )
+    assert len(Cache['entries']) == 100
+
+  # With 100 entries, the 226 unique rows of the first strip are
+  # evicted by the second, so the third strip is predicted again
+  # -------------------------------------------------------------
+  assert Cache['hits'] == 0 and Cache['predicted'] == 3*226
+
+  Cache = CreatePredictionCache( 0 )
+  Pixels,_ = CreateFeatures( 300,5 )
+  for Repeat in range(2):
+    np.testing.assert_array_equal( PredictMemoized( Classifier,Pixels,Cache ),Classifier.predict( Pixels ) )
+  assert len(Cache['entries']) == 0 and Cache['hits'] == 0
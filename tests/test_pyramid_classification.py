@@ -0,0 +1,42 @@
+import numpy as np
+import pandas
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier
+
+from ImageClassification import ClassifyFeatures,GetClassification
+
+NRows,NCols = 64,72
+
+@pytest.fixture
+def Strip():
+  '''function Strip():
+  This fixture returns a synthetic strip (a disc of trees on
+  bare ground) as dataframe of pixel values, its tree mask, and
+  an ExtraTreesClassifier fitted on it.
+  '''
+  Random = np.random.default_rng( 0 )
+  Rows,Columns = np.mgrid[0:NRows,0:NCols]
+  Trees = ( ( Rows-30 )**2+( Columns-40 )**2 < 20**2 ).astype(np.int8)
+  DataFrame = pandas.DataFrame( {
+    'NDVI' : np.where( Trees,0.7,-0.1 ).ravel()+Random.normal( 0.0,0.02,Trees.size ),
+    'Pan'  : np.where( Trees,300.0,900.0 ).ravel()+Random.normal( 0.0,10.0,Trees.size ) } ).astype(np.float32)
+  Classifier = ExtraTreesClassifier( n_estimators=16,random_state=0 ).fit( DataFrame,Trees.ravel() )
+  return ( DataFrame,Trees,Classifier )
+
+def test_ClassifyFeatures_full_resolution( Strip ):
+  DataFrame,Trees,Classifier = Strip
+  ( ClassifiedData,Report ) = ClassifyFeatures( DataFrame,Classifier,(NRows,NCols) )
+  assert Report is None
+  np.testing.assert_array_equal( ClassifiedData,GetClassification( DataFrame,Classifier,(NRows,NCols) ) )
+
+@pytest.mark.parametrize( 'EarlyExit',[ False,True ] )
+def test_ClassifyFeatures_pyramid( Strip,EarlyExit ):
+  DataFrame,Trees,Classifier = Strip
+  Pyramid = { 'block_size':8,'confidence':0.95,'check_pixels':500 }
+  ( ClassifiedData,Report ) = ClassifyFeatures( DataFrame,Classifier,(NRows,NCols),EarlyExit,None,Pyramid )
+  FullResolution = GetClassification( DataFrame,Classifier,(NRows,NCols) )
+  np.testing.assert_array_equal( FullResolution,Trees )
+  np.testing.assert_array_equal( ClassifiedData,FullResolution )
+  assert Report['pixels'] == NRows*NCols
+  assert 0 < Report['skipped'] < NRows*NCols
+  assert Report['checked'] == 500 and Report['agreed'] == Report['checked']
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from TrainingPoints import CreateSampleReservoir,AddReservoirSamples
+
+def CreatePixels( NumPixels,Seed ):
+  '''function CreatePixels( NumPixels,Seed ):
+  This function returns rows and columns of random training pixels
+  (with repeated blocks) and the random keys the reservoir gives
+  them with RandomSeed Seed (drawn in offer order).
+  '''
+  Random = np.random.default_rng( Seed )
+  Rows,Columns = Random.integers( 0,200,NumPixels ),Random.integers( 0,300,NumPixels )
+  return ( Rows,Columns,np.random.RandomState( Seed ).random_sample( NumPixels ) )
+
+def OfferInBatches( Rows,Columns,Quota,ThinningSize,Seed,BatchSize ):
+  Reservoir = CreateSampleReservoir( { 1:Quota },ThinningSize,Seed )
+  for Start in range( 0,Rows.size,BatchSize ):
+    AddReservoirSamples( Reservoir,1,Rows[Start:Start+BatchSize],Columns[Start:Start+BatchSize],
+      list( range( Start,min( Start+BatchSize,Rows.size ) ) ) )
+  return Reservoir['classes'][1]
+
+@pytest.mark.parametrize( 'BatchSize',[ 1,37,5000 ] )
+def test_quota_keeps_smallest_keys( BatchSize ):
+  Rows,Columns,Keys = CreatePixels( 5000,7 )
+  Class = OfferInBatches( Rows,Columns,300,None,7,BatchSize )
+  assert Class['offered'] == 5000
+  assert sorted( Class['points'] ) == sorted( np.argsort( Keys )[:300] )
+
+@pytest.mark.parametrize( 'BatchSize',[ 1,37,5000 ] )
+def test_thinning_keeps_smallest_key_per_block( BatchSize ):
+  Rows,Columns,Keys = CreatePixels( 5000,11 )
+  Class = OfferInBatches( Rows,Columns,300,8,11,BatchSize )
+
+  # Expected: the pixel with the smallest key of each block,
+  # then the 300 blocks with the smallest of these keys
+  # ----------------------------------------------------------
+  Cells = ( Rows//8 )*1000+Columns//8
+  Smallest = {}
+  for Index in np.argsort( Keys )[::-1]:
+    Smallest[Cells[Index]] = Index
+  Expected = sorted( Smallest.values(),key=lambda Index: Keys[Index] )[:300]
+  assert Class['offered'] == len(Smallest) > 300
+  assert sorted( Class['points'] ) == sorted( Expected )
+  assert len( set( Cells[ list(Class['points']) ] ) ) == 300
+  np.testing.assert_array_equal( Class['rows'],Rows[ list(Class['points']) ] )
+
+def test_thinning_evicted_block_reopens():
+  # The first pixel found in block (50,50) is dropped by the quota;
+  # a later pixel of that block with a smaller key is kept
+  # ---------------------------------------------------------------
+  Reservoir = CreateSampleReservoir( { 1:1 },10,0 )
+  Keys = np.random.RandomState( 0 ).random_sample( 4 )
+  assert Keys[3] < Keys[0] < Keys[2] < Keys[1]
+  for Row,Column,PointKey in [ ( 0,0,'a' ),( 50,50,'b' ),( 90,90,'c' ),( 55,55,'d' ) ]:
+    AddReservoirSamples( Reservoir,1,[ Row ],[ Column ],[ PointKey ] )
+  assert list( Reservoir['classes'][1]['points'] ) == [ 'd' ]
+  assert Reservoir['classes'][1]['offered'] == 3
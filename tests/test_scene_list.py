@@ -0,0 +1,30 @@
+import numpy as np
+
+from Misc import ReadSceneList,TrackAllocations
+
+def WriteSceneFiles( Directory,Scenes ):
+  '''function WriteSceneFiles( Directory,Scenes ):
+  This function creates empty band files and a scene list naming them.
+  '''
+  for Scene in Scenes:
+    for FileName in Scene: ( Directory/FileName ).write_text('')
+  SceneListFileName = Directory/'scenes.txt'
+  SceneListFileName.write_text( '# scenes\n\n'+''.join( ','.join(Scene)+'\n' for Scene in Scenes ) )
+  return str(SceneListFileName)
+
+def test_ReadSceneList( tmp_path ):
+  Scenes = [ [ 'r1.tif','g1.tif','b1.tif','n1.tif' ],[ 'r2.tif','g2.tif','b2.tif','n2.tif' ] ]
+  SceneList = ReadSceneList( WriteSceneFiles( tmp_path,Scenes ) )
+  assert SceneList == [ [ str(tmp_path/FileName) for FileName in Scene ] for Scene in Scenes ]
+
+def test_ReadSceneList_invalid( tmp_path ):
+  assert ReadSceneList( WriteSceneFiles( tmp_path,[ [ 'r.tif','g.tif','b.tif' ] ] ) ) is None
+  assert ReadSceneList( WriteSceneFiles( tmp_path,
+    [ [ 'r1.tif','g1.tif','b1.tif','n1.tif' ],[ 'r2.tif','g2.tif','b2.tif','n2.tif','p2.tif' ] ] ) ) is None
+
+def test_TrackAllocations_after_scene_list( tmp_path ):
+  AllocationReport = {}
+  with TrackAllocations( 'scenes',AllocationReport ):
+    ReadSceneList( WriteSceneFiles( tmp_path,[ [ 'r.tif','g.tif','b.tif','n.tif' ] ] ) )
+    Array = np.zeros( 65536 )
+  assert AllocationReport['scenes'] >= Array.nbytes
@@ -0,0 +1,68 @@
+import os
+import time
+
+from TileQueue import ClaimTile,ReleaseTile,ReadTileLock
+
+def MakeStale( LockFileName,Seconds=7200.0 ):
+  '''function MakeStale( LockFileName,Seconds ):
+  This function sets the modification time of a lock file Seconds back.
+  '''
+  OldTime = time.time()-Seconds
+  os.utime( LockFileName,( OldTime,OldTime ) )
+
+def test_ClaimTile_fresh( tmp_path ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  Token = ClaimTile( LockFileName )
+  assert Token is not None
+  assert ReadTileLock( LockFileName ) == Token
+
+def test_ClaimTile_refused_while_held( tmp_path ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  Token = ClaimTile( LockFileName )
+  assert ClaimTile( LockFileName ) is None
+  assert ReadTileLock( LockFileName ) == Token
+
+def test_ClaimTile_takes_over_stale_lock( tmp_path ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  with open( LockFileName,'w' ) as LockFile: LockFile.write( 'deadhost 1 0.0\n' )
+  MakeStale( LockFileName )
+  Token = ClaimTile( LockFileName,StaleLockSeconds=3600.0 )
+  assert Token is not None
+  assert ReadTileLock( LockFileName ) == Token
+  assert sorted( os.listdir( str(tmp_path) ) ) == [ 'tile_000000.lock' ]
+
+def test_ClaimTile_keeps_lock_refreshed_during_takeover( tmp_path,monkeypatch ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  with open( LockFileName,'w' ) as LockFile: LockFile.write( 'deadhost 1 0.0\n' )
+  MakeStale( LockFileName )
+
+  # Another worker takes over the stale lock (with a fresh one)
+  # after this worker found it stale, but before it renames it
+  # -----------------------------------------------------------
+  Rename = os.rename
+  def RenameAfterTakeover( Source,Destination ):
+    os.remove( LockFileName )
+    with open( LockFileName,'w' ) as LockFile: LockFile.write( 'otherhost 2 1.0\n' )
+    Rename( Source,Destination )
+  monkeypatch.setattr( os,'rename',RenameAfterTakeover )
+  assert ClaimTile( LockFileName,StaleLockSeconds=3600.0 ) is None
+  monkeypatch.undo()
+  assert ReadTileLock( LockFileName ) == 'otherhost 2 1.0\n'
+  assert sorted( os.listdir( str(tmp_path) ) ) == [ 'tile_000000.lock' ]
+
+def test_ReleaseTile_by_token( tmp_path ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  Token = ClaimTile( LockFileName )
+  ReleaseTile( LockFileName,'otherhost 2 1.0\n' )
+  assert ReadTileLock( LockFileName ) == Token
+  ReleaseTile( LockFileName,Token )
+  assert not os.path.exists( LockFileName )
+
+def test_ReleaseTile_after_takeover( tmp_path ):
+  LockFileName = str(tmp_path/'tile_000000.lock')
+  OldToken = ClaimTile( LockFileName )
+  MakeStale( LockFileName )
+  NewToken = ClaimTile( LockFileName,StaleLockSeconds=3600.0 )
+  assert NewToken is not None and NewToken != OldToken
+  ReleaseTile( LockFileName,OldToken )
+  assert ReadTileLock( LockFileName ) == NewToken
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import Misc
+from Misc import QuantizationIndex
+from TrainingImagery import CreateImageGaussianPyramid,CreateImageGaussianFiltered
+from TimeSeries import GetTimeSeriesHalo,ReadTileFeatures
+
+NRows,NCols = 340,330
+
+class FakeBand:
+  '''class FakeBand:
+  This class reads windows of a 2D array as a GDAL raster band does.
+  '''
+  def __init__( self,DataArray ): self.DataArray = DataArray
+  def ReadAsArray( self,StartColumn,StartRow,NCols,NRows,buf_type=None ):
+    return self.DataArray[ StartRow:StartRow+NRows,StartColumn:StartColumn+NCols ].astype(np.float32)
+
+class FakeDataset:
+  '''class FakeDataset:
+  This class holds one FakeBand, with the size of a GDAL dataset.
+  '''
+  def __init__( self,DataArray ):
+    self.RasterYSize,self.RasterXSize = DataArray.shape
+    self.Band = FakeBand( DataArray )
+  def GetRasterBand( self,BandNumber ): return self.Band
+
+@pytest.fixture
+def Date():
+  '''function Date():
+  This fixture returns one date of 4 synthetic uint16 bands (no
+  Panchromatic band), with a dark (water) area of zeros.
+  '''
+  Random = np.random.default_rng( 0 )
+  Date = { 'label':'date', 'Pan':None }
+  for BandName in [ 'Red','Green','Blue','NIR' ]:
+    DataArray = Random.integers( 200,3000,( NRows,NCols ) ).astype(np.uint16)
+    DataArray[ 100:140,:60 ] = 0
+    Date[BandName] = FakeDataset( DataArray )
+  return Date
+
+@pytest.fixture
+def Quantizations( monkeypatch ):
+  '''function Quantizations( monkeypatch ):
+  This fixture returns quantizations as --quantize stores NDVI, SAVI
+  and "background" imagery (GDAL's type mapping is stubbed).
+  '''
+  monkeypatch.setattr( Misc.gdal_array,'GDALTypeCodeToNumericTypeCode',
+    lambda DataType: { QuantizationIndex[0]:np.int16,'GDT_UInt16':np.uint16 }[DataType],raising=False )
+  return { 'NDVI':QuantizationIndex,'SAVI05':QuantizationIndex,'Background_NDVI_S20':QuantizationIndex,
+    'Background_Pan':( 'GDT_UInt16',1.0,0.0 ),'Background_Red_S10':( 'GDT_UInt16',1.0,0.0 ) }
+
+FeatureNames = [ 'NDVI','Pan','R','SAVI05','Background_Pan','Background_NDVI_S20','Background_Red_S10' ]
+
+@pytest.mark.parametrize( 'Fast',[ False,True ] )
+def test_ReadTileFeatures_match_whole_image( Date,Quantizations,Fast ):
+  Sigmas = [ 5,10,20 ]
+  Halo,Alignment = GetTimeSeriesHalo( FeatureNames,Fast,Sigmas )
+  assert Alignment == 4 and Halo >= 4*20
+  WholeImage = ReadTileFeatures( Date,[ 0,NRows,0,NCols ],0,FeatureNames,Fast,Sigmas,Quantizations )
+  assert WholeImage['NDVI'].dtype == np.float32 and WholeImage['Background_Pan'].dtype == np.uint16
+
+  # The whole-image variables are those of the imagery of the run
+  # --------------------------------------------------------------
+  Red = Date['Red'].Band.DataArray.astype(np.float32)
+  Levels = dict( CreateImageGaussianPyramid( Red,Sigmas,Fast=Fast ) )
+  np.testing.assert_array_equal( WholeImage['Background_Red_S10'].values,
+    Misc.QuantizeArray( Levels[10],( 'GDT_UInt16',1.0,0.0 ) ).ravel() )
+
+  # Every tile (with its halo, from an aligned window) gives the
+  # same variables as the whole image, inside and at the borders
+  # -------------------------------------------------------------
+  for Window in [ [ 0,64,0,64 ],[ 150,214,140,204 ],[ 131,197,141,205 ],[ 320,340,256,330 ] ]:
+    StartRow,EndRow,StartColumn,EndColumn = Window
+    Tile = ReadTileFeatures( Date,Window,Halo,FeatureNames,Fast,Sigmas,Quantizations,Alignment )
+    Rows,Columns = np.mgrid[ StartRow:EndRow,StartColumn:EndColumn ]
+    Indices = ( Rows*NCols+Columns ).ravel()
+    for VariableName in FeatureNames:
+      np.testing.assert_array_equal( Tile[VariableName].values,WholeImage[VariableName].values[Indices] )
+
+def test_ReadTileFeatures_single_sigma( Date ):
+  Halo,Alignment = GetTimeSeriesHalo( [ 'NDVI','Background_Pan' ] )
+  assert ( Halo,Alignment ) == ( 20,1 )
+  assert GetTimeSeriesHalo( [ 'NDVI','Pan' ],False,[ 5,10 ] ) == ( 0,1 )
+  Tile = ReadTileFeatures( Date,[ 64,128,64,128 ],Halo,[ 'Background_Pan' ] )
+  Pan = sum( Date[BandName].Band.DataArray.astype(np.float32) for BandName in [ 'Red','Green','Blue','NIR' ] )/4.0
+  np.testing.assert_allclose( Tile['Background_Pan'].values,
+    CreateImageGaussianFiltered( Pan )[ 64:128,64:128 ].ravel(),rtol=1e-5 )